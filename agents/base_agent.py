@@ -1,6 +1,8 @@
 # agents/base_agent.py
 import networkx as nx
-import config
+import routing
+from belief import Belief
+from profiler import PROFILER
 
 
 class BaseAgent:
@@ -8,44 +10,135 @@ class BaseAgent:
         self.id = aid
         self.node = start
         self.env = env
+        self.cfg = env.cfg
         self.mode = mode  # walk or drive
         self.role = None
         self.alive = True
         self.reached = False
         self.exposure = 0.0
         self.steps = 0
-        self.belief = {}
+        self.belief = Belief(env, mode)
         self.path = []
         self.path_pos = 0
         self.edge_u = None
         self.edge_v = None
         self.edge_progress = 0.0
+        # compiled id of the edge being traversed, -1 at a node
+        self.edge_eid = -1
+        self._search = None
+        # set by metrics.MetricsRecorder.register
+        self.metrics = None
+        self.group = 0
 
     def graph(self):
         return self.env.G_walk if self.mode == "walk" else self.env.G_drive
 
     def update_belief(self):
-        obs = self.env.observe(self.node, self.mode)
-        self.belief.update(obs)
+        t0 = PROFILER.start()
+        eids, blocked = self.env.observe_ids(self.node, self.mode)
+        self.belief.observe(eids, blocked, self.env.t)
+        PROFILER.stop("observe", t0)
+
+    def _expose(self, amount):
+        self.exposure += amount
+        if self.metrics is not None:
+            self.metrics.add_exposure(self.group, amount)
+
+    def _arrive(self):
+        if not self.reached:
+            self.reached = True
+            if self.metrics is not None:
+                self.metrics.arrive(self.group, self.exposure)
 
     def _cost(self, u, v, data):
-        base = data.get("weight", 1.0)
-        snow = self.env.snow_depth_walk.get((u, v), 0.0) if self.mode == "walk" else self.env.snow_depth_drive.get((u, v), 0.0)
-        slope = data.get("slope", 0.0)
-        return base * (1.0 + config.EVAC_SNOW_ALPHA * snow + config.EVAC_SLOPE_ALPHA * slope)
+        return self.env.edge_cost(u, v, self.mode)
 
-    def plan(self, goal):
+    def _blocked_ids(self):
+        # compiled ids of believed-blocked edges
+        return self.belief.blocked_ids()
+
+    def _blocked_mask(self):
+        # believed-blocked edges as a per-edge-id mask
+        return self.belief.mask()
+
+    def _plan_astar(self, goal):
+        env = self.env
+        s = env.node_index.get(self.node)
+        t = env.node_index.get(goal)
+        if s is None or t is None:
+            return []
+        path = routing.astar(env.compiled(self.mode), env.xs, env.ys, s, t, self._blocked_mask())
+        return [env.node_ids[i] for i in path]
+
+    def _plan_tree(self, goal):
+        env = self.env
+        s = env.node_index.get(self.node)
+        t = env.node_index.get(goal)
+        if s is None or t is None:
+            return []
+        path = env.route_cache.path(
+            env.compiled(self.mode), self.mode, s, t, self._blocked_ids(), self.belief.fingerprint
+        )
+        return [env.node_ids[i] for i in path]
+
+    def _plan_incremental(self, goal):
+        env = self.env
+        s = env.node_index.get(self.node)
+        t = env.node_index.get(goal)
+        if s is None or t is None:
+            return []
+        cg = env.compiled(self.mode)
+        search = self._search
+        if search is None or search.goal != t or not env.refresh_search(search, self.mode):
+            self._search = routing.DStarLite(cg, env.xs, env.ys, t, self._blocked_ids().tolist())
+            path = self._search.plan(s)
+        else:
+            path = search.replan(s, self._blocked_ids().tolist())
+        return [env.node_ids[i] for i in path]
+
+    def _plan_ch(self, goal):
+        env = self.env
+        s = env.node_index.get(self.node)
+        t = env.node_index.get(goal)
+        if s is None or t is None:
+            return []
+        blocked = self._blocked_ids()
+        if len(blocked) > self.cfg.EVAC_CH_MAX_BLOCKED:
+            return self._plan_astar(goal)
+        path = env.ch_router(self.mode).route(env.compiled(self.mode), s, t, blocked, self.belief.fingerprint)
+        return [env.node_ids[i] for i in path]
+
+    def _plan_networkx(self, goal):
         G = self.graph().copy()
-        for (u, v), info in self.belief.items():
-            if info["blocked"] and G.has_edge(u, v):
+        cg = self.env.compiled(self.mode)
+        ids = self.env.node_ids
+        for eid in self._blocked_ids().tolist():
+            u, v = ids[int(cg.src[eid])], ids[int(cg.dst[eid])]
+            if G.has_edge(u, v):
                 G.remove_edge(u, v)
         try:
-            self.path = nx.shortest_path(G, self.node, goal, weight=self._cost)
+            return nx.shortest_path(G, self.node, goal, weight=self._cost)
         except Exception:
-            self.path = []
+            return []
+
+    def plan(self, goal):
+        t0 = PROFILER.start()
+        PROFILER.count("replans")
+        if self.cfg.EVAC_PLANNER == "networkx":
+            self.path = self._plan_networkx(goal)
+        elif self.cfg.EVAC_PLANNER == "tree":
+            self.path = self._plan_tree(goal)
+        elif self.cfg.EVAC_PLANNER == "incremental":
+            self.path = self._plan_incremental(goal)
+        elif self.cfg.EVAC_PLANNER == "ch":
+            self.path = self._plan_ch(goal)
+        else:
+            self.path = self._plan_astar(goal)
+        PROFILER.stop("plan", t0)
         self.path_pos = 0
         self.edge_u = None
         self.edge_v = None
+        self.edge_eid = -1
         self.edge_progress = 0.0
 
     def move_along_path(self, goal, speed, mark_reached=True):
@@ -55,15 +148,16 @@ class BaseAgent:
         self.update_belief()
         if self.node == goal:
             if mark_reached:
-                self.reached = True
+                self._arrive()
             return
 
         if not self.path or self.node not in self.path:
             self.plan(goal)
         if len(self.path) < 2:
-            self.exposure += 1.0
+            self._expose(1.0)
             return
 
+        cg = self.env.compiled(self.mode)
         remaining = speed
         while remaining > 0 and not self.reached:
             if self.path_pos >= len(self.path) or self.path[self.path_pos] != self.node:
@@ -72,25 +166,31 @@ class BaseAgent:
                 except ValueError:
                     self.plan(goal)
                     if not self.path or len(self.path) < 2:
-                        self.exposure += 1.0
+                        self._expose(1.0)
                         return
             if self.path_pos + 1 >= len(self.path):
                 if mark_reached:
-                    self.reached = True
+                    self._arrive()
                 break
             nxt = self.path[self.path_pos + 1]
-            if self.env.is_blocked(self.node, nxt, self.mode, self.belief):
+            eid = self.env.edge_id(self.node, nxt, self.mode)
+            if eid < 0:
+                raise KeyError((self.node, nxt))
+            if self.belief.is_blocked(eid):
                 self.plan(goal)
-                self.exposure += 1.0
+                self._expose(1.0)
                 break
 
-            edge_len = self.graph()[self.node][nxt]["weight"]
-            self.exposure += self.env.snow_depth_walk.get((self.node, nxt), 0.0) if self.mode == "walk" else self.env.snow_depth_drive.get((self.node, nxt), 0.0)
+            edge_len = float(cg.weight[eid])
+            self._expose(float(cg.snow[eid]))
 
             if self.edge_u != self.node or self.edge_v != nxt:
                 self.edge_u = self.node
                 self.edge_v = nxt
+                self.edge_eid = eid
                 self.edge_progress = 0.0
+            if self.cfg.EVAC_CONGESTION:
+                remaining *= float(self.env.congestion.factor[self.mode][eid])
             self.edge_progress += remaining
             remaining = 0
 
@@ -101,7 +201,8 @@ class BaseAgent:
                 self.edge_progress = self.edge_progress - edge_len
                 self.edge_u = None
                 self.edge_v = None
+                self.edge_eid = -1
                 if self.node == goal:
                     if mark_reached:
-                        self.reached = True
+                        self._arrive()
                     break
@@ -1,5 +1,4 @@
 # agents/car_agent.py
-import config
 from agents.base_agent import BaseAgent
 
 
@@ -8,4 +7,4 @@ class CarAgent(BaseAgent):
         super().__init__(aid, start, env, mode="drive")
 
     def step(self, goal):
-        self.move_along_path(goal, config.EVAC_SPEED_CAR)
+        self.move_along_path(goal, self.cfg.EVAC_SPEED_CAR)
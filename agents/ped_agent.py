@@ -1,5 +1,4 @@
 # agents/ped_agent.py
-import config
 from agents.base_agent import BaseAgent
 
 
@@ -8,4 +7,4 @@ class PedAgent(BaseAgent):
         super().__init__(aid, start, env, mode="walk")
 
     def step(self, goal):
-        self.move_along_path(goal, config.EVAC_SPEED_WALK)
+        self.move_along_path(goal, self.cfg.EVAC_SPEED_WALK)
@@ -1,17 +1,18 @@
 # agents/shuttle_agent.py
 import random
-import math
-import networkx as nx
-import config
-from bus_api import fetch_jsonp, extract_routes, extract_stops
+import numpy as np
+import map_match
+from bus_api import get_feed_client
+from geo import haversine_m
 from agents.base_agent import BaseAgent
 
 
 class ShuttleAgent(BaseAgent):
-    def __init__(self, aid, start, env, route, stop_nodes):
+    # route_idx: position of start in route, for buses starting mid-loop
+    def __init__(self, aid, start, env, route, stop_nodes, route_idx=0):
         super().__init__(aid, start, env, mode="drive")
         self.route = route
-        self.route_idx = 0
+        self.route_idx = route_idx
         self.stop_nodes = set(stop_nodes)
         self.dwell = 0
 
@@ -22,7 +23,7 @@ class ShuttleAgent(BaseAgent):
         if not self.route:
             return
         # Follow route nodes directly with smooth motion along edges.
-        remaining = config.EVAC_SPEED_BUS
+        remaining = self.cfg.EVAC_SPEED_BUS
         guard = 0
         while remaining > 0 and guard < len(self.route):
             guard += 1
@@ -31,11 +32,12 @@ class ShuttleAgent(BaseAgent):
                 self.route_idx = (self.route_idx + 1) % len(self.route)
                 continue
 
-            if not self.env.G_drive.has_edge(self.node, goal):
+            eid = self.env.edge_id(self.node, goal, "drive")
+            if eid < 0:
                 self.route_idx = (self.route_idx + 1) % len(self.route)
                 continue
 
-            edge_len = self.env.G_drive[self.node][goal]["weight"]
+            edge_len = float(self.env.compiled("drive").weight[eid])
             if self.edge_u != self.node or self.edge_v != goal:
                 self.edge_u = self.node
                 self.edge_v = goal
@@ -49,102 +51,76 @@ class ShuttleAgent(BaseAgent):
                 self.edge_u = None
                 self.edge_v = None
                 if self.node in self.stop_nodes:
-                    self.dwell = config.EVAC_SHUTTLE_DWELL_STEPS
+                    self.dwell = self.cfg.EVAC_SHUTTLE_DWELL_STEPS
                     break
                 self.route_idx = (self.route_idx + 1) % len(self.route)
 
 
-def _haversine_m(a, b, c, d):
-    r = 6371000.0
-    phi1 = math.radians(a)
-    phi2 = math.radians(c)
-    dphi = math.radians(c - a)
-    dl = math.radians(d - b)
-    h = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dl / 2) ** 2
-    return 2 * r * math.asin(math.sqrt(h))
-
-
 def build_shuttle_route(env):
-    if not config.EVAC_BUS_API_URL:
+    # (route, stop nodes): one contiguous drive loop shared by every bus,
+    # matched once per feed payload and graph
+    if not env.cfg.EVAC_BUS_API_URL:
         return [], []
-    try:
-        payload = fetch_jsonp(config.EVAC_BUS_API_URL)
-        polylines = extract_routes(payload)
-        stops = extract_stops(payload)
-    except Exception:
-        polylines = []
-        stops = []
+    feed = get_feed_client(env.cfg.EVAC_BUS_API_URL, cfg=env.cfg)
+    key = map_match.cache_key(env, feed.payload_hash())
+    hit = map_match.load(env, key)
+    if hit is None:
+        hit = _match_feed(env, feed, key)
+        map_match.save(env, key, *hit)
+    route, stops = hit
+    return list(route), list(stops)
 
-    route_nodes = []
-    stop_nodes = []
 
-    # route points
-    if polylines:
-        center_lat, center_lon = config.EVAC_FALLBACK_CENTER
-        route_radius = config.EVAC_BUS_ROUTE_RADIUS_M
-        max_snap = config.EVAC_BUS_SNAP_MAX_M
-        for route in polylines:
-            if not route:
-                continue
-            # filter to campus radius
-            route = [
-                (lat, lon)
-                for lat, lon in route
-                if _haversine_m(center_lat, center_lon, lat, lon) <= route_radius
-            ]
-            if not route:
-                continue
-            pts = route[:: max(1, config.EVAC_BUS_SAMPLE_EVERY)]
-            nodes = []
-            for lat, lon in pts:
-                n, dist, dist_is_m = env.nearest_node_with_dist(lat, lon)
-                if n is None:
-                    continue
-                if dist_is_m and dist > max_snap:
-                    continue
-                if not nodes or nodes[-1] != n:
-                    nodes.append(n)
-            if len(nodes) >= 2:
-                route_nodes = nodes
-                break
+def _match_feed(env, feed, key):
+    cfg = env.cfg
+    center_lat, center_lon = cfg.EVAC_FALLBACK_CENTER
+    route_radius = cfg.EVAC_BUS_ROUTE_RADIUS_M
+    matcher = map_match.Matcher(env)
+    ids = env.node_ids
 
-    # stop points
-    if stops:
-        center_lat, center_lon = config.EVAC_FALLBACK_CENTER
-        route_radius = config.EVAC_BUS_ROUTE_RADIUS_M
-        max_snap = config.EVAC_BUS_SNAP_MAX_M
-        for s in stops:
-            lat = s.get("lat")
-            lon = s.get("lon")
-            if lat is None or lon is None:
-                continue
-            if _haversine_m(center_lat, center_lon, lat, lon) > route_radius:
-                continue
-            n, dist, dist_is_m = env.nearest_node_with_dist(lat, lon)
-            if n is None:
-                continue
-            if dist_is_m and dist > max_snap:
-                continue
-            stop_nodes.append(n)
+    path = []
+    for line in feed.routes():
+        if not line:
+            continue
+        # filter to campus radius
+        pts = np.asarray(line, dtype=np.float64).reshape(-1, 2)
+        pts = pts[haversine_m(center_lat, center_lon, pts[:, 0], pts[:, 1]) <= route_radius]
+        if not len(pts):
+            continue
+        # an unclosable match is no loop; try the next line or fall back
+        path = matcher.close_loop(matcher.match(pts[:, 0], pts[:, 1]))
+        if len(path) >= 2:
+            break
 
-    if not route_nodes:
-        # fallback: synthetic loop over random stops
-        nodes = list(env.G_drive.nodes())
-        if len(nodes) < 2:
-            return [], []
-        stops = random.sample(nodes, min(config.EVAC_BUS_STOPS, len(nodes)))
-        route = []
-        for i in range(len(stops)):
-            a = stops[i]
-            b = stops[(i + 1) % len(stops)]
-            try:
-                path = nx.shortest_path(env.G_drive, a, b, weight="weight")
-                if route and route[-1] == path[0]:
-                    route.extend(path[1:])
-                else:
-                    route.extend(path)
-            except Exception:
-                continue
-        return route, stops
+    if len(path) >= 2:
+        pts = np.array(
+            [(s["lat"], s["lon"]) for s in feed.stops() if s.get("lat") is not None and s.get("lon") is not None],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        pts = pts[haversine_m(center_lat, center_lon, pts[:, 0], pts[:, 1]) <= route_radius]
+        # stops snap onto the matched loop so buses actually dwell there
+        stops = matcher.nearest_on(path, pts[:, 0], pts[:, 1], cfg.EVAC_BUS_SNAP_MAX_M)
+        return [ids[i] for i in path], list(dict.fromkeys(ids[i] for i in stops))
 
-    return route_nodes, stop_nodes
+    # fallback: synthetic loop over stops drawn from a stream seeded by the
+    # cache key, so every bus and every run get the same loop
+    nodes = env.compiled("drive").nodes.tolist()
+    if len(nodes) < 2:
+        return [], []
+    rng = random.Random(key)
+    stops = rng.sample(nodes, min(cfg.EVAC_BUS_STOPS, len(nodes)))
+    router = env.ch_router("drive")
+    cg = env.compiled("drive")
+    # legs chain from the last stop reached; unreachable stops are skipped
+    route = [stops[0]]
+    visited = [stops[0]]
+    for nxt in stops[1:] + stops[:1]:
+        leg = router.base_route(cg, route[-1], nxt)
+        if not leg:
+            continue
+        route.extend(leg[1:])
+        visited.append(nxt)
+    if len(route) < 3 or route[-1] != route[0]:
+        return [], []
+    route.pop()
+    return [ids[i] for i in route], [ids[i] for i in visited[:-1]]
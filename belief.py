@@ -0,0 +1,116 @@
+# belief.py
+from collections.abc import Mapping
+
+import numpy as np
+
+
+def _bits(packed, n):
+    return np.unpackbits(packed, count=n, bitorder="little")
+
+
+class Belief(Mapping):
+    # One agent's view of one mode's edges: packed known / believed-blocked
+    # bits and the step each edge was last observed, indexed by compiled edge
+    # id. Snow and slope are read from the env, not copied. Also readable as
+    # the legacy {(u, v): {"blocked", "snow", "slope"}} mapping.
+    def __init__(self, env, mode):
+        self.env = env
+        self.mode = mode
+        self.cg = env.compiled(mode)
+        n = self.cg.n_edges
+        self.n_edges = n
+        self.known = np.zeros((n + 7) // 8, dtype=np.uint8)
+        self.blocked = np.zeros((n + 7) // 8, dtype=np.uint8)
+        self.seen = np.full(n, -1, dtype=np.int32)
+        # XOR of zobrist keys of blocked edges, kept in step with the bits
+        self.fingerprint = 0
+        self._ids = None
+        self._mask = None
+
+    def observe(self, eids, flags, t=0):
+        # record observed blocked flags; returns the number of flips
+        eids = np.asarray(eids, dtype=np.int64)
+        if not len(eids):
+            return 0
+        flags = np.asarray(flags, dtype=bool)
+        byte = eids >> 3
+        bit = (1 << (eids & 7)).astype(np.uint8)
+        cur = (self.blocked[byte] & bit) != 0
+        flip = cur != flags
+        np.bitwise_or.at(self.known, byte, bit)
+        self.seen[eids] = t
+        if not flip.any():
+            return 0
+        fe = eids[flip]
+        np.bitwise_xor.at(self.blocked, byte[flip], bit[flip])
+        self.fingerprint ^= int(np.bitwise_xor.reduce(self.cg.zobrist[fe]))
+        self._ids = None
+        self._mask = None
+        return int(len(fe))
+
+    def update(self, obs):
+        # legacy: merge an env.observe() style dict
+        eids = []
+        flags = []
+        for (u, v), info in obs.items():
+            eid = self.env.edge_id(u, v, self.mode)
+            if eid >= 0:
+                eids.append(eid)
+                flags.append(bool(info["blocked"]))
+        self.observe(eids, flags, self.env.t)
+
+    def is_blocked(self, eid):
+        return bool(self.blocked[eid >> 3] & (1 << (eid & 7)))
+
+    def is_known(self, eid):
+        return bool(self.known[eid >> 3] & (1 << (eid & 7)))
+
+    def blocked_ids(self):
+        # sorted believed-blocked edge ids
+        if self._ids is None:
+            self._ids = np.flatnonzero(_bits(self.blocked, self.n_edges))
+        return self._ids
+
+    def mask(self):
+        # believed-blocked flags as bytes indexable by edge id (for planners)
+        if self._mask is None:
+            self._mask = _bits(self.blocked, self.n_edges).tobytes()
+        return self._mask
+
+    def known_ids(self):
+        return np.flatnonzero(_bits(self.known, self.n_edges))
+
+    def clear(self):
+        self.known[:] = 0
+        self.blocked[:] = 0
+        self.seen[:] = -1
+        self.fingerprint = 0
+        self._ids = None
+        self._mask = None
+
+    def _eid(self, key):
+        try:
+            u, v = key
+        except (TypeError, ValueError):
+            return -1
+        return self.env.edge_id(u, v, self.mode)
+
+    def __getitem__(self, key):
+        eid = self._eid(key)
+        if eid < 0 or not self.is_known(eid):
+            raise KeyError(key)
+        cg = self.cg
+        return {"blocked": self.is_blocked(eid), "snow": float(cg.snow[eid]), "slope": float(cg.slope[eid])}
+
+    def __contains__(self, key):
+        eid = self._eid(key)
+        return eid >= 0 and self.is_known(eid)
+
+    def __iter__(self):
+        ids = self.env.node_ids
+        cg = self.cg
+        for eid in self.known_ids().tolist():
+            yield (ids[int(cg.src[eid])], ids[int(cg.dst[eid])])
+
+    def __len__(self):
+        return int(_bits(self.known, self.n_edges).sum())
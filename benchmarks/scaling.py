@@ -0,0 +1,284 @@
+# benchmarks/scaling.py
+# Offline scaling suite on synthetic grids: environment startup, observation,
+# planning and stepping over graph size and agent count. Every case runs in
+# a fresh interpreter so startup time and peak RSS are its own.
+#
+#   python -m benchmarks.scaling --out logs/bench_baseline.json
+#   python -m benchmarks.scaling --compare logs/bench_baseline.json
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+EDGES = (10**2, 10**3, 10**4, 10**5, 10**6)
+AGENTS = (10, 10**2, 10**3, 10**4, 10**5)
+# the other axis is held here while one is swept
+BASE_EDGES = 10**4
+BASE_AGENTS = 10**2
+QUICK_MAX = {"edges": 10**4, "agents": 10**3}
+
+# metric -> +1 if larger is better, -1 if smaller is better
+METRICS = {
+    "startup_s": -1,
+    "observe_us": -1,
+    "plan_ms": -1,
+    "step_ms": -1,
+    "steps_per_s": 1,
+    "peak_rss_mb": -1,
+}
+
+
+def grid_size(edges):
+    # smallest n with 4 n (n - 1) >= edges
+    return max(2, math.ceil((1 + math.sqrt(1 + edges)) / 2))
+
+
+def cases(quick=False, edges=None, agents=None):
+    edges = EDGES if edges is None else edges
+    agents = AGENTS if agents is None else agents
+    if quick:
+        edges = [e for e in edges if e <= QUICK_MAX["edges"]]
+        agents = [a for a in agents if a <= QUICK_MAX["agents"]]
+    out = [(e, BASE_AGENTS) for e in edges]
+    out += [(BASE_EDGES, a) for a in agents if (BASE_EDGES, a) not in out]
+    return out
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def run_case(edges, agents, steps, engine, planner, seed=0, warmup=3):
+    import config
+
+    config.EVAC_USE_OSM = False
+    config.EVAC_GRID_SIZE = grid_size(edges)
+    config.EVAC_PLANNER = planner
+    config.EVAC_ENGINE = engine
+    config.EVAC_STEP_LIMIT = warmup + steps
+    n_ped = max(1, int(round(agents * 0.8)))
+    n_car = max(0, agents - n_ped)
+    config.EVAC_PED_COUNT = n_ped
+    config.EVAC_CAR_COUNT = n_car
+
+    from evac_env import EvacEnv
+    from profiler import PROFILER
+    from agents.ped_agent import PedAgent
+    import routing
+
+    random.seed(seed)
+    t0 = time.perf_counter()
+    env = EvacEnv()
+    startup = time.perf_counter() - t0
+    env.reset(seed)
+    rng = np.random.default_rng(seed)
+    walk = env.compiled("walk")
+
+    # observation around random nodes, first call builds the index
+    nodes = rng.choice(walk.nodes, min(2000, len(walk.nodes)))
+    env.observe_index(int(nodes[0]), "walk")
+    t0 = time.perf_counter()
+    for i in nodes.tolist():
+        env.observe_index(i, "walk")
+    observe_us = 1e6 * (time.perf_counter() - t0) / len(nodes)
+
+    # point-to-point queries through the configured planner, as an agent
+    # plans; the first query builds any index (CCH, trees) and is not timed
+    queries = 20 if walk.n_edges <= 10**5 else 5
+    pairs = rng.choice(walk.nodes, (queries + 1, 2))
+    ids = env.node_ids
+    planner_agent = PedAgent(0, ids[int(pairs[0, 0])], env)
+    planner_agent.plan(ids[int(pairs[0, 1])])
+    before = routing.stats["expansions"]
+    t0 = time.perf_counter()
+    for s, t in pairs[1:].tolist():
+        planner_agent.node = ids[s]
+        planner_agent.plan(ids[t])
+    plan_ms = 1e3 * (time.perf_counter() - t0) / queries
+    expansions = (routing.stats["expansions"] - before) / queries
+
+    # stepping, with phase timings from the profiler
+    t0 = time.perf_counter()
+    if engine == "objects":
+        from simulation import Simulation, spawn_agents
+
+        peds, cars = spawn_agents(env)
+        sim = Simulation(env, peds, cars)
+    else:
+        from simulation import shelter_goals
+        from vec_env import _Episode
+
+        episode = _Episode(env, seed, shelter_goals(env))
+        episode.reset()
+    spawn_s = time.perf_counter() - t0
+
+    def advance(step):
+        if engine == "objects":
+            sim.step()
+        else:
+            env.begin_step(step)
+            t1 = PROFILER.start()
+            episode.engine.step()
+            PROFILER.stop("move", t1)
+        PROFILER.end_step(step)
+
+    # untimed warm-up: on the first step every agent plans, which would
+    # dominate a short run; the timed steps are steady-state stepping
+    t0 = time.perf_counter()
+    for step in range(warmup):
+        advance(step)
+    warmup_s = time.perf_counter() - t0
+    PROFILER.reset()
+    PROFILER.enable()
+    t0 = time.perf_counter()
+    for step in range(warmup, warmup + steps):
+        advance(step)
+    wall = time.perf_counter() - t0
+    prof = PROFILER.summary()
+    PROFILER.enable(False)
+
+    return {
+        "edges": edges,
+        "agents": agents,
+        "grid_size": config.EVAC_GRID_SIZE,
+        "n_edges": walk.n_edges,
+        "n_nodes": walk.n_nodes,
+        "engine": engine,
+        "planner": planner,
+        "steps": steps,
+        "warmup": warmup,
+        "startup_s": startup,
+        "spawn_s": spawn_s,
+        "warmup_s": warmup_s,
+        "observe_us": observe_us,
+        "plan_ms": plan_ms,
+        "plan_expansions": expansions,
+        "step_ms": 1e3 * wall / steps if steps else 0.0,
+        "steps_per_s": steps / wall if wall else 0.0,
+        "phases_ms": {k: v["per_step_ms"] for k, v in prof["phases"].items()},
+        "counters": prof["counters"],
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _key(case):
+    return f"{case['engine']}/{case['planner']}/e{case['edges']}/a{case['agents']}"
+
+
+def _run_isolated(edges, agents, args):
+    cmd = [
+        sys.executable, "-m", "benchmarks.scaling", "--case", str(edges), str(agents),
+        "--steps", str(args.steps), "--engine", args.engine, "--planner", args.planner,
+        "--seed", str(args.seed), "--warmup", str(args.warmup),
+    ]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        proc = subprocess.run(cmd, cwd=root, capture_output=True, text=True, timeout=args.timeout)
+    except subprocess.TimeoutExpired:
+        return {"edges": edges, "agents": agents, "error": f"timeout after {args.timeout}s"}
+    if proc.returncode != 0:
+        return {"edges": edges, "agents": agents, "error": proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(current, baseline, threshold):
+    # regressions of current against baseline beyond threshold (relative)
+    base = {_key(c): c for c in baseline["cases"] if "error" not in c}
+    rows = []
+    for case in current["cases"]:
+        ref = base.get(_key(case)) if "error" not in case else None
+        if ref is None:
+            continue
+        for metric, sign in METRICS.items():
+            old, new = ref.get(metric), case.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            rows.append(
+                {
+                    "case": _key(case),
+                    "metric": metric,
+                    "baseline": old,
+                    "current": new,
+                    "change": change,
+                    "regression": -sign * change > threshold,
+                }
+            )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline scaling benchmarks on synthetic grids")
+    parser.add_argument("--quick", action="store_true", help=f"cap at {QUICK_MAX} (CI-sized)")
+    parser.add_argument("--edges", type=int, nargs="*", default=None)
+    parser.add_argument("--agents", type=int, nargs="*", default=None)
+    parser.add_argument("--steps", type=int, default=20, help="timed steps per case")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed steps before the timed ones")
+    parser.add_argument("--engine", choices=("arrays", "objects"), default="arrays")
+    parser.add_argument("--planner", default="astar")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=1800.0, help="per case, seconds")
+    parser.add_argument("--out", default=os.path.join("logs", "bench_scaling.json"))
+    parser.add_argument("--compare", default=None, help="baseline JSON to check against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change flagged as regression")
+    parser.add_argument("--case", type=int, nargs=2, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        print(
+            json.dumps(
+                run_case(args.case[0], args.case[1], args.steps, args.engine, args.planner, args.seed, args.warmup)
+            )
+        )
+        return 0
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "cases": [],
+    }
+    for edges, agents in cases(args.quick, args.edges, args.agents):
+        case = _run_isolated(edges, agents, args)
+        results["cases"].append(case)
+        if "error" in case:
+            print(f"[bench] edges={edges} agents={agents}: {case['error']}")
+        else:
+            print(
+                f"[bench] edges={case['n_edges']} agents={agents}: startup {case['startup_s']:.2f}s, "
+                f"observe {case['observe_us']:.1f}us, plan {case['plan_ms']:.2f}ms, "
+                f"{case['steps_per_s']:.1f} steps/s, rss {case['peak_rss_mb']:.0f}MB"
+            )
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[bench] {len(results['cases'])} cases -> {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold)
+        bad = [r for r in rows if r["regression"]]
+        for r in bad:
+            print(
+                f"[bench] REGRESSION {r['case']} {r['metric']}: "
+                f"{r['baseline']:.4g} -> {r['current']:.4g} ({100 * r['change']:+.1f}%)"
+            )
+        print(f"[bench] {len(rows)} metrics compared, {len(bad)} regressions beyond {100 * args.threshold:.0f}%")
+        return 1 if bad else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,20 @@
 # bus_api.py
+import hashlib
 import json
+import os
+import time
 import urllib.request
+import config
 
 
 def fetch_jsonp(url, timeout=10):
     with urllib.request.urlopen(url, timeout=timeout) as resp:
-        raw = resp.read().decode("utf-8", errors="ignore").strip()
+        raw = resp.read().decode("utf-8", errors="ignore")
+    return parse_jsonp(raw)
+
+
+def parse_jsonp(raw):
+    raw = raw.strip()
     # JSONP: callback({...})
     if raw.startswith("{") or raw.startswith("["):
         return json.loads(raw)
@@ -122,3 +131,104 @@ def extract_stops(payload):
             name = s.get("Name") or s.get("StopName") or s.get("Description") or ""
             stops.append({"lat": lat, "lon": lon, "name": name})
     return stops
+
+
+class FeedClient:
+    # fetches and parses one transit feed once per run; a TTL disk cache
+    # survives restarts and a fixture file replaces the network entirely
+    def __init__(self, url, timeout=10, ttl_s=None, cache_dir=None, fixture=None, cfg=None):
+        cfg = config if cfg is None else cfg
+        self.url = url
+        self.timeout = timeout
+        self.ttl_s = cfg.EVAC_BUS_FEED_TTL_S if ttl_s is None else ttl_s
+        self.cache_dir = cfg.EVAC_BUS_FEED_CACHE_DIR if cache_dir is None else cache_dir
+        self.fixture = cfg.EVAC_BUS_FEED_FIXTURE if fixture is None else fixture
+        self.source = None
+        self._loaded = False
+        self._raw = None
+        self._payload = None
+        self._routes = None
+        self._stops = None
+
+    def _cache_file(self):
+        name = hashlib.sha1(self.url.encode("utf-8")).hexdigest() + ".json"
+        return os.path.join(self.cache_dir, name)
+
+    def _read(self, path):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            return f.read()
+
+    def _load_raw(self):
+        if self.fixture:
+            self.source = "fixture"
+            return self._read(self.fixture)
+        path = self._cache_file() if self.cache_dir else None
+        if path and os.path.exists(path) and time.time() - os.path.getmtime(path) < self.ttl_s:
+            self.source = "disk"
+            return self._read(path)
+        try:
+            with urllib.request.urlopen(self.url, timeout=self.timeout) as resp:
+                raw = resp.read().decode("utf-8", errors="ignore")
+            self.source = "http"
+        except Exception:
+            # stale cache beats nothing when the service is down
+            if path and os.path.exists(path):
+                self.source = "stale"
+                return self._read(path)
+            raise
+        if path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp = path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(raw)
+                os.replace(tmp, path)
+            except OSError:
+                pass
+        return raw
+
+    def payload(self):
+        # parsed payload, or None if the feed could not be loaded
+        if not self._loaded:
+            self._loaded = True
+            try:
+                self._raw = self._load_raw()
+                self._payload = parse_jsonp(self._raw)
+            except Exception:
+                self._raw = None
+                self._payload = None
+        return self._payload
+
+    def payload_hash(self):
+        self.payload()
+        if self._raw is None:
+            return None
+        return hashlib.sha1(self._raw.strip().encode("utf-8")).hexdigest()
+
+    def routes(self):
+        if self._routes is None:
+            payload = self.payload()
+            self._routes = extract_routes(payload) if payload is not None else []
+        return self._routes
+
+    def stops(self):
+        if self._stops is None:
+            payload = self.payload()
+            self._stops = extract_stops(payload) if payload is not None else []
+        return self._stops
+
+
+# (url, ttl, cache dir, fixture) -> FeedClient
+_CLIENTS = {}
+
+
+def get_feed_client(url=None, timeout=10, cfg=None):
+    # one shared client per feed URL and feed settings for the whole process
+    cfg = config if cfg is None else cfg
+    url = cfg.EVAC_BUS_API_URL if url is None else url
+    key = (url, cfg.EVAC_BUS_FEED_TTL_S, cfg.EVAC_BUS_FEED_CACHE_DIR, cfg.EVAC_BUS_FEED_FIXTURE)
+    client = _CLIENTS.get(key)
+    if client is None:
+        client = FeedClient(url, timeout=timeout, cfg=cfg)
+        _CLIENTS[key] = client
+    return client
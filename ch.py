@@ -0,0 +1,436 @@
+# ch.py
+import heapq
+import math
+import os
+from collections import OrderedDict
+
+import numpy as np
+from profiler import PROFILER
+
+FORMAT_VERSION = 1
+INF = math.inf
+
+
+def _min_degree_order(n, src, dst):
+    # eliminate the lowest-degree node first; returns (rank, upper neighbours)
+    adj = [set() for _ in range(n)]
+    for u, v in zip(src.tolist(), dst.tolist()):
+        if u != v:
+            adj[u].add(v)
+            adj[v].add(u)
+    heap = [(len(a), v) for v, a in enumerate(adj)]
+    heapq.heapify(heap)
+    rank = [-1] * n
+    upper = [None] * n
+    r = 0
+    while heap:
+        d, v = heapq.heappop(heap)
+        if rank[v] >= 0 or d != len(adj[v]):
+            continue
+        rank[v] = r
+        r += 1
+        nb = adj[v]
+        upper[v] = list(nb)
+        for x in nb:
+            ax = adj[x]
+            ax.discard(v)
+            ax.update(nb)
+            ax.discard(x)
+            heapq.heappush(heap, (len(ax), x))
+        adj[v] = set()
+    return rank, upper
+
+
+def _levels(rank, up_ptr, arc_hi):
+    # level 0 has no lower neighbours; every arc points to a higher level
+    n = len(rank)
+    level = [0] * n
+    up = up_ptr.tolist()
+    hi = arc_hi.tolist()
+    for v in np.argsort(rank).tolist():
+        lv = level[v] + 1
+        for a in range(up[v], up[v + 1]):
+            w = hi[a]
+            if level[w] < lv:
+                level[w] = lv
+    return np.array(level, dtype=np.int64)
+
+
+def _gather(ptr, order, ids):
+    # concatenated order[ptr[i]:ptr[i + 1]] for i in ids, with owner positions
+    starts = ptr[ids]
+    lens = ptr[ids + 1] - starts
+    total = int(lens.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    owner = np.repeat(np.arange(len(ids)), lens)
+    offs = np.arange(total) - np.repeat(np.cumsum(lens) - lens, lens)
+    return order[starts[owner] + offs], owner
+
+
+class Metric:
+    # one customization: per-arc upward (lo -> hi) and downward (hi -> lo)
+    # costs and the triangle each came from (-1: an original edge)
+    def __init__(self, fwd, bwd, fmid, bmid):
+        self.fwd = fwd
+        self.bwd = bwd
+        self.fmid = fmid
+        self.bmid = bmid
+        self._lists = None
+
+    def lists(self):
+        if self._lists is None:
+            self._lists = (self.fwd.tolist(), self.bwd.tolist(), self.fmid.tolist(), self.bmid.tolist())
+        return self._lists
+
+
+class CCH:
+    # Customizable contraction hierarchy over one compiled graph. The node
+    # order and fill-in arcs depend only on the topology; costs are applied
+    # by customize() (all arcs, level by level) or recustomize() (only the
+    # arcs downstream of a few blocked edges).
+    def __init__(self, rank, parent, up_ptr, arc_lo, arc_hi, arc_fedge, arc_bedge, tri, level_ptr):
+        self.n_nodes = len(rank)
+        self.rank = rank
+        self.parent = parent
+        self.up_ptr = up_ptr
+        self.arc_lo = arc_lo
+        self.arc_hi = arc_hi
+        self.arc_fedge = arc_fedge
+        self.arc_bedge = arc_bedge
+        # triangles (vx, vy, xy) ordered by the level of their lowest node
+        self.tri = tri
+        self.level_ptr = level_ptr
+        self.n_arcs = len(arc_lo)
+        self._index()
+
+    def _index(self):
+        n_arcs = self.n_arcs
+        vx, vy, xy = self.tri
+        # triangles by target arc, and by the lower arcs they read
+        order = np.argsort(xy, kind="stable")
+        self._by_target = order
+        self._target_ptr = np.searchsorted(xy[order], np.arange(n_arcs + 1))
+        lower = np.concatenate([vx, vy])
+        order = np.argsort(lower, kind="stable")
+        self._by_lower = order % max(1, len(vx))
+        self._lower_ptr = np.searchsorted(lower[order], np.arange(n_arcs + 1))
+        self._arc_level = _levels(self.rank, self.up_ptr, self.arc_hi)[self.arc_lo]
+        self._arcs_by_level = np.argsort(self._arc_level, kind="stable")
+        self._arc_level_ptr = np.searchsorted(
+            self._arc_level[self._arcs_by_level], np.arange(int(self._arc_level.max(initial=0)) + 2)
+        )
+        self._rank = self.rank.tolist()
+        self._parent = self.parent.tolist()
+        self._up_ptr = self.up_ptr.tolist()
+        self._lo = self.arc_lo.tolist()
+        self._hi = self.arc_hi.tolist()
+        self._tri = (vx.tolist(), vy.tolist())
+        self._df = [INF] * self.n_nodes
+        self._db = [INF] * self.n_nodes
+        self._pf = [-1] * self.n_nodes
+        self._pb = [-1] * self.n_nodes
+
+    @classmethod
+    def build(cls, cg):
+        n = cg.n_nodes
+        rank, upper = _min_degree_order(n, cg.src, cg.dst)
+        rank_arr = np.array(rank, dtype=np.int64)
+        parent = np.full(n, -1, dtype=np.int64)
+        lo = []
+        hi = []
+        for v in range(n):
+            ups = sorted(upper[v] or ())
+            if ups:
+                parent[v] = min(ups, key=rank.__getitem__)
+            lo.extend([v] * len(ups))
+            hi.extend(ups)
+        arc_lo = np.array(lo, dtype=np.int64)
+        arc_hi = np.array(hi, dtype=np.int64)
+        up_ptr = np.searchsorted(arc_lo, np.arange(n + 1))
+        keys = arc_lo * n + arc_hi
+
+        def arc_of(a, b):
+            return np.searchsorted(keys, np.asarray(a, dtype=np.int64) * n + b)
+
+        # original edges onto arcs: lo -> hi is upward, hi -> lo downward
+        src = cg.src.astype(np.int64)
+        dst = cg.dst.astype(np.int64)
+        upward = rank_arr[src] < rank_arr[dst]
+        a = arc_of(np.where(upward, src, dst), np.where(upward, dst, src))
+        arc_fedge = np.full(len(lo), -1, dtype=np.int64)
+        arc_bedge = np.full(len(lo), -1, dtype=np.int64)
+        eids = np.arange(cg.n_edges)
+        keep = src != dst
+        arc_fedge[a[upward & keep]] = eids[upward & keep]
+        arc_bedge[a[~upward & keep]] = eids[~upward & keep]
+
+        # lower triangles {v, x, y} with v lowest and rank x < rank y
+        tv, tx, ty = [], [], []
+        for v in range(n):
+            ups = sorted(upper[v] or (), key=rank.__getitem__)
+            for i in range(len(ups)):
+                for j in range(i + 1, len(ups)):
+                    tv.append(v)
+                    tx.append(ups[i])
+                    ty.append(ups[j])
+        tv = np.array(tv, dtype=np.int64)
+        tx = np.array(tx, dtype=np.int64)
+        ty = np.array(ty, dtype=np.int64)
+        level = _levels(rank_arr, up_ptr, arc_hi)
+        order = np.argsort(level[tv], kind="stable")
+        tv, tx, ty = tv[order], tx[order], ty[order]
+        tri = (arc_of(tv, tx), arc_of(tv, ty), arc_of(tx, ty))
+        level_ptr = np.searchsorted(level[tv], np.arange(int(level.max(initial=0)) + 2))
+        return cls(rank_arr, parent, up_ptr, arc_lo, arc_hi, arc_fedge, arc_bedge, tri, level_ptr)
+
+    def _initial(self, cost, blocked=None):
+        c = np.asarray(cost, dtype=np.float64)
+        if blocked is not None and len(blocked):
+            c = c.copy()
+            c[np.asarray(blocked, dtype=np.int64)] = INF
+        fwd = np.where(self.arc_fedge >= 0, c[np.maximum(self.arc_fedge, 0)], INF)
+        bwd = np.where(self.arc_bedge >= 0, c[np.maximum(self.arc_bedge, 0)], INF)
+        return fwd, bwd
+
+    def customize(self, cost, blocked=None):
+        # full customization, one vectorized pass per elimination level
+        fwd, bwd = self._initial(cost, blocked)
+        fmid = np.full(self.n_arcs, -1, dtype=np.int64)
+        bmid = np.full(self.n_arcs, -1, dtype=np.int64)
+        vx, vy, xy = self.tri
+        ptr = self.level_ptr
+        for k in range(len(ptr) - 1):
+            a, b = ptr[k], ptr[k + 1]
+            if a == b:
+                continue
+            ids = np.arange(a, b)
+            t = xy[a:b]
+            # x -> v -> y and y -> v -> x
+            for vals, mids, cand in (
+                (fwd, fmid, bwd[vx[a:b]] + fwd[vy[a:b]]),
+                (bwd, bmid, bwd[vy[a:b]] + fwd[vx[a:b]]),
+            ):
+                old = vals[t]
+                np.minimum.at(vals, t, cand)
+                win = (cand < old) & (cand == vals[t])
+                mids[t[win]] = ids[win]
+        return Metric(fwd, bwd, fmid, bmid)
+
+    def recustomize(self, metric, cost, blocked):
+        # metric with the given edges blocked; only arcs whose value can
+        # change are recomputed, level by level from the blocked edges up
+        fwd = metric.fwd.copy()
+        bwd = metric.bwd.copy()
+        fmid = metric.fmid.copy()
+        bmid = metric.bmid.copy()
+        blocked = np.unique(np.asarray(blocked, dtype=np.int64))
+        if not len(blocked):
+            return Metric(fwd, bwd, fmid, bmid)
+        f0, b0 = self._initial(cost, blocked)
+        vx, vy, xy = self.tri
+        pending = np.zeros(self.n_arcs, dtype=bool)
+        pending[np.isin(self.arc_fedge, blocked) | np.isin(self.arc_bedge, blocked)] = True
+        by_level = self._arcs_by_level
+        ptr = self._arc_level_ptr
+        for k in range(int(self._arc_level[pending].min()), len(ptr) - 1):
+            arcs = by_level[ptr[k] : ptr[k + 1]]
+            d = arcs[pending[arcs]]
+            if not len(d):
+                continue
+            tris, owner = _gather(self._target_ptr, self._by_target, d)
+            nf, fm = f0[d], np.full(len(d), -1, dtype=np.int64)
+            nb, bm = b0[d], np.full(len(d), -1, dtype=np.int64)
+            if len(tris):
+                for vals, mids, cand in (
+                    (nf, fm, bwd[vx[tris]] + fwd[vy[tris]]),
+                    (nb, bm, bwd[vy[tris]] + fwd[vx[tris]]),
+                ):
+                    best = np.full(len(d), INF)
+                    np.minimum.at(best, owner, cand)
+                    win = cand == best[owner]
+                    pick = np.full(len(d), -1, dtype=np.int64)
+                    pick[owner[win]] = tris[win]
+                    better = best < vals
+                    vals[better] = best[better]
+                    mids[better] = pick[better]
+            changed = d[(nf != fwd[d]) | (nb != bwd[d])]
+            fwd[d], bwd[d], fmid[d], bmid[d] = nf, nb, fm, bm
+            if len(changed):
+                readers, _ = _gather(self._lower_ptr, self._by_lower, changed)
+                pending[xy[readers]] = True
+        return Metric(fwd, bwd, fmid, bmid)
+
+    def query(self, metric, s, t):
+        # node path s -> t over the elimination tree, [] if unreachable
+        if s == t:
+            return [s]
+        fwd, bwd, fmid, bmid = metric.lists()
+        rank = self._rank
+        parent = self._parent
+        up = self._up_ptr
+        hi = self._hi
+        df, db, pf, pb = self._df, self._db, self._pf, self._pb
+        touched = [s, t]
+        df[s] = 0.0
+        db[t] = 0.0
+        x, y = s, t
+        while x != y and x != -1 and y != -1:
+            if rank[x] < rank[y]:
+                dx = df[x]
+                if dx < INF:
+                    for a in range(up[x], up[x + 1]):
+                        w = hi[a]
+                        nd = dx + fwd[a]
+                        if nd < df[w]:
+                            df[w] = nd
+                            pf[w] = a
+                            touched.append(w)
+                x = parent[x]
+            else:
+                dy = db[y]
+                if dy < INF:
+                    for a in range(up[y], up[y + 1]):
+                        w = hi[a]
+                        nd = dy + bwd[a]
+                        if nd < db[w]:
+                            db[w] = nd
+                            pb[w] = a
+                            touched.append(w)
+                y = parent[y]
+        best = INF
+        meet = -1
+        if x == y:
+            while x != -1:
+                dx = df[x]
+                dy = db[x]
+                if dx + dy < best:
+                    best = dx + dy
+                    meet = x
+                for a in range(up[x], up[x + 1]):
+                    w = hi[a]
+                    if dx < INF and dx + fwd[a] < df[w]:
+                        df[w] = dx + fwd[a]
+                        pf[w] = a
+                        touched.append(w)
+                    if dy < INF and dy + bwd[a] < db[w]:
+                        db[w] = dy + bwd[a]
+                        pb[w] = a
+                        touched.append(w)
+                x = parent[x]
+        path = []
+        if meet >= 0 and best < INF:
+            path = self._unpack(metric, s, t, meet)
+        for v in touched:
+            df[v] = INF
+            db[v] = INF
+            pf[v] = -1
+            pb[v] = -1
+        return path
+
+    def _unpack(self, metric, s, t, meet):
+        _, _, fmid, bmid = metric.lists()
+        lo = self._lo
+        tvx, tvy = self._tri
+        # (arc, upward?) hops s -> meet, then meet -> t
+        hops = []
+        v = meet
+        while v != s:
+            a = self._pf[v]
+            hops.append((a, True))
+            v = lo[a]
+        hops.reverse()
+        v = meet
+        while v != t:
+            a = self._pb[v]
+            hops.append((a, False))
+            v = lo[a]
+        path = [s]
+        stack = hops[::-1]
+        while stack:
+            a, upward = stack.pop()
+            tr = fmid[a] if upward else bmid[a]
+            if tr < 0:
+                path.append(self._hi[a] if upward else lo[a])
+            elif upward:
+                # lo -> v -> hi
+                stack.append((tvy[tr], True))
+                stack.append((tvx[tr], False))
+            else:
+                # hi -> v -> lo
+                stack.append((tvx[tr], True))
+                stack.append((tvy[tr], False))
+        return path
+
+    # persistence: one .npy per array next to the cached graph
+    _ARRAYS = ("rank", "parent", "up_ptr", "arc_lo", "arc_hi", "arc_fedge", "arc_bedge", "level_ptr")
+
+    def save(self, path, prefix, base=None):
+        os.makedirs(path, exist_ok=True)
+        for name in self._ARRAYS:
+            np.save(os.path.join(path, f"{prefix}_{name}.npy"), getattr(self, name))
+        for name, arr in zip(("tri_vx", "tri_vy", "tri_xy"), self.tri):
+            np.save(os.path.join(path, f"{prefix}_{name}.npy"), arr)
+        if base is not None:
+            for name in ("fwd", "bwd", "fmid", "bmid"):
+                np.save(os.path.join(path, f"{prefix}_base_{name}.npy"), getattr(base, name))
+        # written last: marks the index complete
+        np.save(os.path.join(path, f"{prefix}_meta.npy"), np.array([FORMAT_VERSION, self.n_nodes, self.n_arcs]))
+
+    @classmethod
+    def load(cls, path, prefix, n_nodes):
+        # (CCH, base Metric or None), or None when absent or stale
+        def arr(name):
+            return np.load(os.path.join(path, f"{prefix}_{name}.npy"))
+
+        try:
+            meta = arr("meta")
+            if int(meta[0]) != FORMAT_VERSION or int(meta[1]) != n_nodes:
+                return None
+            cols = {name: arr(name) for name in cls._ARRAYS}
+            tri = (arr("tri_vx"), arr("tri_vy"), arr("tri_xy"))
+            self = cls(tri=tri, **cols)
+            base = None
+            if os.path.exists(os.path.join(path, f"{prefix}_base_fwd.npy")):
+                base = Metric(*(arr(f"base_{name}") for name in ("fwd", "bwd", "fmid", "bmid")))
+            return self, base
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+class CHRouter:
+    # one mode's CCH plus customizations cached by cost version and belief
+    def __init__(self, cch, base=None, cache_size=16):
+        self.cch = cch
+        # hazard-free customization (edge lengths)
+        self.base = base
+        self.cache_size = cache_size
+        self._metrics = OrderedDict()
+
+    def metric(self, cg, blocked_ids=(), fingerprint=None):
+        if fingerprint is None:
+            fingerprint = cg.fingerprint(blocked_ids)
+        key = (cg.version, fingerprint)
+        m = self._metrics.get(key)
+        if m is not None:
+            PROFILER.count("ch_hits")
+            self._metrics.move_to_end(key)
+            return m
+        PROFILER.count("ch_misses")
+        if fingerprint == 0:
+            m = self.cch.customize(cg.cost)
+        else:
+            m = self.cch.recustomize(self.metric(cg), cg.cost, blocked_ids)
+        self._metrics[key] = m
+        if len(self._metrics) > self.cache_size:
+            self._metrics.popitem(last=False)
+        return m
+
+    def route(self, cg, s, t, blocked_ids=(), fingerprint=None):
+        return self.cch.query(self.metric(cg, blocked_ids, fingerprint), s, t)
+
+    def base_route(self, cg, s, t):
+        # shortest path by edge length alone
+        if self.base is None:
+            self.base = self.cch.customize(cg.weight)
+        return self.cch.query(self.base, s, t)
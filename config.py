@@ -1,4 +1,5 @@
 # config.py
+import types
 
 # Phase 1: CampusResilience (Evacuation POMDP)
 EVAC_USE_OSM = True
@@ -8,6 +9,21 @@ EVAC_RADIUS_M = 1200
 EVAC_BUS_ROUTE_RADIUS_M = 1200
 EVAC_OSM_TIMEOUT_S = 30
 EVAC_OSM_USE_CACHE = True
+# local .osm / .osm.bz2 / .osm.gz / .osm.pbf extract (pbf needs pyosmium);
+# when set it replaces the Overpass download. Radius (metres around
+# EVAC_FALLBACK_CENTER) clips the extract, None keeps all of it.
+EVAC_OSM_EXTRACT_PATH = None
+EVAC_OSM_EXTRACT_RADIUS_M = None
+# compiled walk/drive graphs persisted per (center, radius); skips osmnx on warm start
+EVAC_GRAPH_CACHE = True
+EVAC_GRAPH_CACHE_DIR = "cache/graphs"
+# synthetic grid used without OSM: EVAC_GRID_SIZE^2 nodes spaced
+# EVAC_GRID_STEP metres, 4 * size * (size - 1) directed edges
+EVAC_GRID_SIZE = 6
+EVAC_GRID_STEP = 120.0
+# worker processes (Monte Carlo, VecEvacEnv) attach read-only to one copy of
+# the static graph in shared memory instead of each building their own
+EVAC_SHARED_GRAPH = True
 EVAC_SHOW_STOPS_ONLY = False
 EVAC_STOP_SAMPLE_M = 50
 
@@ -16,6 +32,22 @@ EVAC_CAR_COUNT = 15
 EVAC_BUS_COUNT = 8
 EVAC_STEP_LIMIT = 600
 EVAC_DRAW_EVERY = 5
+# Rendering: "process" (separate renderer process, never blocks the loop),
+# "inline" or "off"; EVAC_RENDER_OUT is a .mp4/.gif file or a PNG frame dir
+EVAC_RENDER = "process"
+EVAC_RENDER_INTERACTIVE = True
+EVAC_RENDER_OUT = None
+EVAC_RENDER_FPS = 20
+# snapshots buffered for the render process before frames are dropped
+EVAC_RENDER_QUEUE = 64
+# Stepping: "objects" (per-agent step calls), "arrays" (engine.StepEngine) or
+# "events" (event_sim.EventEngine: agents scheduled at node arrivals only;
+# runs with EVAC_CONGESTION step as "arrays")
+EVAC_ENGINE = "objects"
+# Profiling (profiler.PROFILER): per-phase timers and event counters per step,
+# dumped as JSON; can also be switched at runtime with PROFILER.enable()
+EVAC_PROFILE = False
+EVAC_PROFILE_OUT = "logs/phase1_profile.json"
 
 # Partial observability
 EVAC_OBS_RADIUS_M = 80.0
@@ -28,6 +60,16 @@ EVAC_SNOW_MIN = 0.0
 EVAC_SNOW_MAX = 1.0
 EVAC_SLOPE_ALPHA = 0.6
 EVAC_SNOW_ALPHA = 1.2
+# Hazard field: None seeds the hazard streams from the global random state.
+# Dynamic hazards update every EVAC_HAZARD_EVERY steps (snow in depth units
+# per step, probabilities per update).
+EVAC_HAZARD_SEED = None
+EVAC_HAZARD_DYNAMIC = False
+EVAC_HAZARD_EVERY = 10
+EVAC_HAZARD_SNOW_RATE = 0.0
+EVAC_HAZARD_SNOW_CAP = 2.0
+EVAC_HAZARD_SPREAD_PROB = 0.02
+EVAC_HAZARD_REOPEN_PROB = 0.05
 
 # Shelters
 EVAC_SHELTER_COUNT = 6
@@ -36,12 +78,39 @@ EVAC_SHELTER_COUNT = 6
 EVAC_SPEED_WALK = 1.4
 EVAC_SPEED_CAR = 8.0
 EVAC_SPEED_BUS = 6.0
+# Congestion: agents sharing an edge slow down (Greenshields,
+# v = v_free * (1 - k / k_jam)); jam densities are agents per metre of edge.
+# With EVAC_CONGESTION_ROUTING the slowdown also raises routing costs, every
+# EVAC_CONGESTION_EVERY steps on edges whose delay moved by more than
+# EVAC_CONGESTION_COST_TOL (relative).
+EVAC_CONGESTION = False
+EVAC_JAM_DENSITY_WALK = 2.0
+EVAC_JAM_DENSITY_DRIVE = 0.14
+EVAC_CONGESTION_MIN_FACTOR = 0.1
+EVAC_CONGESTION_ROUTING = False
+EVAC_CONGESTION_EVERY = 5
+EVAC_CONGESTION_COST_TOL = 0.05
 
 # Bus route
 EVAC_BUS_STOPS = 6
 EVAC_BUS_API_URL = "https://uofubus.com/Services/JSONPRelay.svc/GetRoutesForMapWithScheduleWithEncodedLine?apiKey=ride1791&isDispatch=false"
-EVAC_BUS_SAMPLE_EVERY = 20
+# feed is fetched once per run; disk copy reused for EVAC_BUS_FEED_TTL_S seconds;
+# a fixture path (JSON or JSONP file) replaces the network entirely
+EVAC_BUS_FEED_TTL_S = 3600
+EVAC_BUS_FEED_CACHE_DIR = "cache/feeds"
+EVAC_BUS_FEED_FIXTURE = None
 EVAC_BUS_SNAP_MAX_M = 250.0
+# HMM map matching of feed polylines onto the drive graph (map_match.py):
+# points thinned to EVAC_MATCH_STEP_M apart, up to EVAC_MATCH_CANDIDATES
+# edges within EVAC_MATCH_RADIUS_M per point, position noise sigma and
+# route vs straight-line mismatch scale beta in metres. Matched routes are
+# cached per feed payload and graph.
+EVAC_MATCH_STEP_M = 25.0
+EVAC_MATCH_RADIUS_M = 60.0
+EVAC_MATCH_CANDIDATES = 8
+EVAC_MATCH_SIGMA_M = 10.0
+EVAC_MATCH_BETA_M = 30.0
+EVAC_BUS_ROUTE_CACHE_DIR = "cache/routes"
 EVAC_SHUTTLE_DWELL_STEPS = 3
 
 # Population composition (Faculty vs Staff) from official figures
@@ -50,3 +119,39 @@ EVAC_STAFF_RATIO = 0.75
 
 # Campus bus fleet (estimated for Phase 1)
 EVAC_BUS_COUNT = 8
+
+# Routing
+# BaseAgent.plan backend: "astar" (compiled cost arrays), "tree" (shared
+# per-goal reverse shortest-path trees), "incremental" (per-agent D* Lite
+# repaired on belief changes), "ch" (customizable contraction hierarchy,
+# A* once more than EVAC_CH_MAX_BLOCKED edges are believed blocked) or
+# "networkx"
+EVAC_PLANNER = "astar"
+EVAC_ROUTE_CACHE_SIZE = 256
+EVAC_CH_MAX_BLOCKED = 64
+EVAC_CH_CACHE_SIZE = 16
+
+# RL environment (vec_env.VecEvacEnv) reward terms, per agent and step
+EVAC_RL_EXPOSURE_WEIGHT = 1.0
+EVAC_RL_ARRIVAL_REWARD = 10.0
+EVAC_RL_STEP_PENALTY = 0.01
+
+# What-if branches (snapshot.fork): copy-on-write os.fork where available,
+# else branches replay one after another from a snapshot; None workers means
+# one per CPU
+EVAC_FORK = True
+EVAC_FORK_WORKERS = None
+
+# Parameter sweeps (sweep.py): per-(settings, seed) results cached by content hash
+EVAC_SWEEP_CACHE_DIR = "cache/sweeps"
+
+
+def make_config(**overrides):
+    # copy of the EVAC_* settings as they stand, with overrides; passed as
+    # EvacEnv(cfg=...) so several configurations can live in one process
+    values = {k: v for k, v in globals().items() if k.startswith("EVAC_")}
+    unknown = sorted(set(overrides) - set(values))
+    if unknown:
+        raise KeyError(f"unknown settings: {', '.join(unknown)}")
+    values.update(overrides)
+    return types.SimpleNamespace(**values)
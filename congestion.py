@@ -0,0 +1,67 @@
+# congestion.py
+import numpy as np
+import config
+from hazards import HazardChange
+
+MODES = ("walk", "drive")
+
+
+class CongestionModel:
+    # Per-edge occupancy and a Greenshields speed-density relation,
+    # v = v_free * (1 - k / k_jam), recomputed for all edges in one pass from
+    # the edge each agent is on. With EVAC_CONGESTION_ROUTING the slowdown is
+    # also folded into routing costs as a per-edge delay.
+    def __init__(self, graphs, cfg=None):
+        self.graphs = graphs
+        self.cfg = config if cfg is None else cfg
+        self.capacity = {}
+        self.occupancy = {}
+        self.factor = {}
+        for mode in MODES:
+            cg = graphs[mode]
+            jam = self.cfg.EVAC_JAM_DENSITY_WALK if mode == "walk" else self.cfg.EVAC_JAM_DENSITY_DRIVE
+            # agents an edge holds at standstill
+            self.capacity[mode] = np.maximum(1.0, np.asarray(cg.weight, dtype=np.float64) * jam)
+        self.reset()
+
+    def reset(self):
+        for mode in MODES:
+            n = self.graphs[mode].n_edges
+            self.occupancy[mode] = np.zeros(n, dtype=np.int64)
+            self.factor[mode] = np.ones(n, dtype=np.float64)
+            self.graphs[mode].delay[:] = 1.0
+
+    def update(self, edges, step=0, hazards=None):
+        # edges: mode -> edge ids of the agents currently on an edge
+        for mode in MODES:
+            eids = np.asarray(edges.get(mode, ()), dtype=np.int64)
+            occ = np.bincount(eids, minlength=self.graphs[mode].n_edges)
+            self.occupancy[mode] = occ
+            self.factor[mode] = np.clip(1.0 - occ / self.capacity[mode], self.cfg.EVAC_CONGESTION_MIN_FACTOR, 1.0)
+        every = max(1, int(self.cfg.EVAC_CONGESTION_EVERY))
+        if self.cfg.EVAC_CONGESTION_ROUTING and hazards is not None and step % every == 0:
+            for mode in MODES:
+                self._update_costs(mode, step, hazards)
+
+    def update_agents(self, agents, step=0, hazards=None):
+        edges = {mode: [] for mode in MODES}
+        for a in agents:
+            if a.edge_eid >= 0 and a.alive and not a.reached:
+                edges[a.mode].append(a.edge_eid)
+        self.update(edges, step, hazards)
+
+    def _update_costs(self, mode, step, hazards):
+        # only edges whose delay moved past the tolerance change cost
+        cg = self.graphs[mode]
+        target = (1.0 / self.factor[mode]).astype(np.float32)
+        eids = np.flatnonzero(np.abs(target - cg.delay) > self.cfg.EVAC_CONGESTION_COST_TOL * cg.delay)
+        if not len(eids):
+            return
+        old_version = cg.version
+        old_cost = cg.cost[eids].copy()
+        cg.delay[eids] = target[eids]
+        cg.refresh_cost(self.cfg.EVAC_SNOW_ALPHA, self.cfg.EVAC_SLOPE_ALPHA)
+        empty = np.empty(0, dtype=np.int64)
+        hazards.publish(
+            HazardChange(mode, step, old_version, cg.version, eids, old_cost, cg.cost[eids].copy(), empty, empty)
+        )
@@ -0,0 +1,213 @@
+# engine.py
+import numpy as np
+import routing
+from profiler import PROFILER
+
+MODES = ("walk", "drive")
+
+
+class StepEngine:
+    # Struct-of-arrays state for pedestrians and cars. Agents on an edge are
+    # advanced in one batched update per mode; only agents standing on a node
+    # (observe, replan, pick next edge) drop into Python. Observations are
+    # taken at node boundaries rather than on every step.
+    def __init__(self, env, starts, goals, modes, speeds):
+        idx = env.node_index
+        n = len(starts)
+        self.env = env
+        self.cfg = env.cfg
+        self.n = n
+        self.node = np.array([idx[s] for s in starts], dtype=np.int32).reshape(n)
+        self.goal = np.array([idx.get(g, -1) for g in goals], dtype=np.int32).reshape(n)
+        self.mode = np.array([MODES.index(m) for m in modes], dtype=np.int8).reshape(n)
+        self.speed = np.asarray(speeds, dtype=np.float64).reshape(n)
+        self.edge = np.full(n, -1, dtype=np.int32)
+        self.edge_len = np.zeros(n, dtype=np.float64)
+        self.edge_progress = np.zeros(n, dtype=np.float64)
+        self.path_pos = np.zeros(n, dtype=np.int32)
+        self.exposure = np.zeros(n, dtype=np.float64)
+        self.steps = np.zeros(n, dtype=np.int32)
+        self.alive = np.ones(n, dtype=bool)
+        self.reached = np.zeros(n, dtype=bool)
+        self.paths = [[] for _ in range(n)]
+        # believed-blocked edge ids per agent
+        self.beliefs = [set() for _ in range(n)]
+        self._searches = {}
+        # optional metrics.MetricsRecorder fed with per-group deltas
+        self.metrics = None
+        self.group = np.zeros(n, dtype=np.int64)
+
+    @classmethod
+    def from_agents(cls, env, agents, goals, metrics=None):
+        cfg = env.cfg
+        speeds = [cfg.EVAC_SPEED_WALK if a.mode == "walk" else cfg.EVAC_SPEED_CAR for a in agents]
+        eng = cls(env, [a.node for a in agents], goals, [a.mode for a in agents], speeds)
+        eng.exposure[:] = [a.exposure for a in agents]
+        eng.reached[:] = [a.reached for a in agents]
+        eng.alive[:] = [a.alive for a in agents]
+        if metrics is not None:
+            eng.metrics = metrics
+            eng.group[:] = [a.group for a in agents]
+        return eng
+
+    def write_back(self, agents):
+        # copy array state onto agent objects (for plotting / inspection)
+        ids = self.env.node_ids
+        node = self.node.tolist()
+        edge = self.edge.tolist()
+        progress = self.edge_progress.tolist()
+        exposure = self.exposure.tolist()
+        reached = self.reached.tolist()
+        alive = self.alive.tolist()
+        steps = self.steps.tolist()
+        for i, a in enumerate(agents):
+            a.node = ids[node[i]]
+            a.exposure = exposure[i]
+            a.reached = reached[i]
+            a.alive = alive[i]
+            a.steps = steps[i]
+            a.path = [ids[k] for k in self.paths[i]]
+            a.path_pos = int(self.path_pos[i])
+            if edge[i] >= 0:
+                cg = self.env.compiled(MODES[self.mode[i]])
+                a.edge_u = ids[int(cg.src[edge[i]])]
+                a.edge_v = ids[int(cg.dst[edge[i]])]
+                a.edge_progress = progress[i]
+            else:
+                a.edge_u = None
+                a.edge_v = None
+                a.edge_progress = 0.0
+
+    def positions(self):
+        # (n, 2) interpolated positions
+        xy = self.env.xy[self.node].copy()
+        for m, mode in enumerate(MODES):
+            sel = np.flatnonzero((self.edge >= 0) & (self.mode == m))
+            if not len(sel):
+                continue
+            cg = self.env.compiled(mode)
+            e = self.edge[sel]
+            a = self.env.xy[cg.src[e]]
+            b = self.env.xy[cg.dst[e]]
+            length = self.edge_len[sel]
+            ratio = np.where(length > 0, np.clip(self.edge_progress[sel] / np.maximum(length, 1e-9), 0.0, 1.0), 0.0)
+            xy[sel] = a + (b - a) * ratio[:, None]
+        return xy
+
+    def _expose(self, i, amount):
+        self.exposure[i] += amount
+        if self.metrics is not None:
+            self.metrics.add_exposure(int(self.group[i]), amount)
+
+    def _observe(self, i, node, mode):
+        t0 = PROFILER.start()
+        eids, blocked = self.env.observe_index(node, mode)
+        if len(eids):
+            b = self.beliefs[i]
+            b.difference_update(eids[~blocked].tolist())
+            b.update(eids[blocked].tolist())
+        PROFILER.stop("observe", t0)
+
+    def _plan(self, i, mode):
+        t0 = PROFILER.start()
+        PROFILER.count("replans")
+        env = self.env
+        cg = env.compiled(mode)
+        s = int(self.node[i])
+        t = int(self.goal[i])
+        belief = self.beliefs[i]
+        if self.cfg.EVAC_PLANNER == "tree":
+            path = env.route_cache.path(cg, mode, s, t, list(belief))
+        elif self.cfg.EVAC_PLANNER == "incremental":
+            search = self._searches.get(i)
+            if search is None or search.goal != t or not env.refresh_search(search, mode):
+                search = routing.DStarLite(cg, env.xs, env.ys, t, belief)
+                self._searches[i] = search
+                path = search.plan(s)
+            else:
+                path = search.replan(s, belief)
+        elif self.cfg.EVAC_PLANNER == "ch" and len(belief) <= self.cfg.EVAC_CH_MAX_BLOCKED:
+            path = env.ch_router(mode).route(cg, s, t, list(belief))
+        else:
+            mask = bytearray(cg.n_edges)
+            for e in belief:
+                mask[e] = 1
+            path = routing.astar(cg, env.xs, env.ys, s, t, mask)
+        PROFILER.stop("plan", t0)
+        self.paths[i] = path
+        self.path_pos[i] = 0
+        return path
+
+    def _at_node(self, i):
+        node = int(self.node[i])
+        if node == self.goal[i]:
+            self.reached[i] = True
+            if self.metrics is not None:
+                self.metrics.arrive(int(self.group[i]), float(self.exposure[i]))
+            return
+        mode = MODES[self.mode[i]]
+        self._observe(i, node, mode)
+        path = self.paths[i]
+        pos = int(self.path_pos[i])
+        if pos >= len(path) or path[pos] != node:
+            try:
+                pos = path.index(node)
+                self.path_pos[i] = pos
+            except ValueError:
+                path = self._plan(i, mode)
+                pos = 0
+        if len(path) - pos < 2:
+            self._expose(i, 1.0)
+            return
+        nxt = path[pos + 1]
+        cg = self.env.compiled(mode)
+        eid = cg.edge_id(node, nxt)
+        if eid < 0 or eid in self.beliefs[i]:
+            self._plan(i, mode)
+            self._expose(i, 1.0)
+            return
+        self.edge[i] = eid
+        self.edge_len[i] = cg.weight[eid]
+        self.edge_progress[i] = 0.0
+
+    def occupied(self):
+        # mode -> edge ids of the agents currently on an edge
+        on = self.alive & ~self.reached & (self.edge >= 0)
+        return {mode: self.edge[on & (self.mode == m)] for m, mode in enumerate(MODES)}
+
+    def step(self):
+        env = self.env
+        if self.cfg.EVAC_CONGESTION:
+            t0 = PROFILER.start()
+            env.congestion.update(self.occupied(), env.t, env.hazards)
+            PROFILER.stop("congestion", t0)
+        moving = self.alive & ~self.reached & (self.goal >= 0)
+        self.steps[moving] += 1
+        for i in np.flatnonzero(moving & (self.edge < 0)).tolist():
+            self._at_node(i)
+        active = moving & (self.edge >= 0)
+        for m, mode in enumerate(MODES):
+            sel = np.flatnonzero(active & (self.mode == m))
+            if not len(sel):
+                continue
+            cg = self.env.compiled(mode)
+            e = self.edge[sel]
+            snow = cg.snow[e]
+            self.exposure[sel] += snow
+            if self.metrics is not None:
+                self.metrics.add_exposure_batch(self.group[sel], snow)
+            speed = self.speed[sel]
+            if self.cfg.EVAC_CONGESTION:
+                speed = speed * self.env.congestion.factor[mode][e]
+            progress = self.edge_progress[sel] + speed
+            done = progress >= self.edge_len[sel]
+            self.edge_progress[sel] = np.where(done, 0.0, progress)
+            arrived = sel[done]
+            if len(arrived):
+                self.node[arrived] = cg.dst[e[done]]
+                self.edge[arrived] = -1
+                self.path_pos[arrived] += 1
+                hit = arrived[self.node[arrived] == self.goal[arrived]]
+                self.reached[hit] = True
+                if self.metrics is not None and len(hit):
+                    self.metrics.arrive_batch(self.group[hit], self.exposure[hit])
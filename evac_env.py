@@ -2,8 +2,20 @@
 import random
 import math
 import networkx as nx
+import numpy as np
 import config
+import geo
+import graph_cache
+import osm_ingest
+from ch import CCH, CHRouter
+from congestion import CongestionModel
 import shelter
+from belief import Belief
+from hazards import HazardEngine
+from profiler import PROFILER
+from graph_core import CompiledGraph, EdgeSet, EdgeValues, compile_nx
+from routing import RouteCache
+from spatial import GridIndex, NearestIndex
 
 try:
     import osmnx as ox
@@ -12,63 +24,197 @@ except Exception:
 
 
 class EvacEnv:
-    def __init__(self):
+    # source: an existing EvacEnv whose graph, indexes and shelters are
+    # shared instead of rebuilt; hazards and caches stay per-env.
+    # cfg: settings object (config.make_config); defaults to the live config
+    # module, read at call time
+    def __init__(self, source=None, cfg=None):
+        self.cfg = config if cfg is None else cfg
+        self._nx = {}
         self.G_walk = nx.DiGraph()
         self.G_drive = nx.DiGraph()
         self.G_drive_ll = None
-        self.pos = {}
-        self.blocked_edges_walk = set()
-        self.blocked_edges_drive = set()
-        self.snow_depth_walk = {}
-        self.snow_depth_drive = {}
+        self.crs = None
+        self._pos = None
+        self.node_ids = []
+        self.node_index = {}
+        self.xy = np.empty((0, 2), dtype=np.float64)
+        # (lon, lat) per node, NaN where unknown (grid fallback)
+        self.lonlat = None
+        self.graphs = {}
+        # graph cache directory in use (routing indexes are stored alongside)
+        self.graph_dir = None
+        self._ch = {}
         self.shelters = set()
-        self._build_graph()
-        self._init_hazards()
-        self._init_shelters()
+        self.route_cache = RouteCache(self.cfg.EVAC_ROUTE_CACHE_SIZE)
+        self.t = 0
+        self._obs_index = {}
+        self._obs_cache = {}
+        self._snap = None
+        # observation noise stream, seeded from the global RNG
+        self.rng = np.random.default_rng(random.getrandbits(64))
+        if source is None:
+            self._build_graph()
+        else:
+            self._share_graph(source)
+        self.congestion = CongestionModel(self.graphs, self.cfg)
+        self.hazards = HazardEngine(self.graphs, self._hazard_seed(), cfg=self.cfg)
+        self.hazards.subscribe(self._on_hazard_change)
+        if source is None:
+            self._init_shelters()
+        else:
+            # shared, not copied: goal assignment follows the set's order
+            self.shelters = source.shelters
+
+    # networkx views are materialized from the compiled arrays on first use
+    @property
+    def G_walk(self):
+        return self._networkx("walk")
+
+    @G_walk.setter
+    def G_walk(self, G):
+        self._nx["walk"] = G
+
+    @property
+    def G_drive(self):
+        return self._networkx("drive")
+
+    @G_drive.setter
+    def G_drive(self, G):
+        self._nx["drive"] = G
+
+    # node -> (x, y), materialized from xy on first use
+    @property
+    def pos(self):
+        if self._pos is None:
+            self._pos = dict(zip(self.node_ids, map(tuple, self.xy.tolist())))
+        return self._pos
+
+    @pos.setter
+    def pos(self, pos):
+        self._pos = pos
+
+    def _networkx(self, mode):
+        G = self._nx.get(mode)
+        if G is None:
+            G = self.graphs[mode].to_networkx(self.node_ids)
+            if self.crs is not None:
+                G.graph["crs"] = self.crs
+            self._nx[mode] = G
+        return G
 
     def _build_graph(self):
-        if config.EVAC_USE_OSM and ox is not None:
-            ok = self._build_from_osm()
-            if ok:
+        if self.cfg.EVAC_OSM_EXTRACT_PATH and self._build_from_extract(self.cfg.EVAC_OSM_EXTRACT_PATH):
+            return
+        if self.cfg.EVAC_USE_OSM:
+            path = graph_cache.cache_path(self.cfg.EVAC_FALLBACK_CENTER, self.cfg.EVAC_RADIUS_M, cfg=self.cfg) if self.cfg.EVAC_GRAPH_CACHE else None
+            if path is not None and self._load_graph_cache(path):
+                self.graph_dir = path
+                return
+            if ox is not None and self._build_from_osm():
+                self._compile_graph()
+                if path is not None:
+                    try:
+                        if graph_cache.save(path, self.node_ids, self.xy, self.lonlat, self.graphs, self.crs):
+                            self.graph_dir = path
+                    except OSError:
+                        pass
                 return
-        # fallback: small grid
+        # fallback: synthetic grid
         self._build_grid()
 
+    def _build_from_extract(self, extract):
+        radius = self.cfg.EVAC_OSM_EXTRACT_RADIUS_M
+        path = graph_cache.cache_path(self.cfg.EVAC_FALLBACK_CENTER, radius, extract, self.cfg) if self.cfg.EVAC_GRAPH_CACHE else None
+        if path is not None and self._load_graph_cache(path):
+            self.graph_dir = path
+            return True
+        center = self.cfg.EVAC_FALLBACK_CENTER if radius is not None else None
+        built = osm_ingest.load(extract, center, radius)
+        if built is None:
+            return False
+        node_ids, xy, lonlat, graphs, crs = built
+        self._nx = {}
+        self.crs = crs
+        self.lonlat = lonlat
+        self._adopt_graphs(node_ids, xy, graphs)
+        if path is not None:
+            try:
+                if graph_cache.save(path, self.node_ids, self.xy, self.lonlat, self.graphs, self.crs):
+                    self.graph_dir = path
+            except OSError:
+                pass
+        return True
+
+    def _share_graph(self, source):
+        # static arrays are shared; hazard columns are fresh per graph
+        self._nx = {}
+        self.crs = source.crs
+        self.lonlat = source.lonlat
+        self._pos = source._pos
+        self.G_drive_ll = source.G_drive_ll
+        self.graph_dir = source.graph_dir
+        graphs = {
+            mode: CompiledGraph.from_csr(
+                cg.n_nodes, cg.indptr, cg.src, cg.dst, cg.weight, cg.slope, cg.nodes, cg._keys, cg.zobrist
+            )
+            for mode, cg in source.graphs.items()
+        }
+        # labels and their index are shared too; a worker attached to a
+        # SharedGraph keeps no per-node Python objects
+        self._adopt_graphs(source.node_ids, source.xy, graphs, source.node_index)
+        self._obs_index = source._obs_index
+        self._snap = source._snap
+        self._ch = {
+            mode: CHRouter(r.cch, r.base, r.cache_size) for mode, r in source._ch.items()
+        }
+
+    def _load_graph_cache(self, path):
+        cached = graph_cache.load(path)
+        if cached is None:
+            return False
+        node_ids, xy, lonlat, graphs, crs = cached
+        self._nx = {}
+        self.crs = crs
+        self.lonlat = lonlat
+        self._adopt_graphs(node_ids, xy, graphs)
+        return True
+
     def _build_from_osm(self):
         if ox is not None:
             try:
-                ox.settings.use_cache = config.EVAC_OSM_USE_CACHE
+                ox.settings.use_cache = self.cfg.EVAC_OSM_USE_CACHE
                 ox.settings.log_console = False
-                ox.settings.timeout = config.EVAC_OSM_TIMEOUT_S
+                ox.settings.timeout = self.cfg.EVAC_OSM_TIMEOUT_S
                 if hasattr(ox.settings, "requests_timeout"):
-                    ox.settings.requests_timeout = config.EVAC_OSM_TIMEOUT_S
+                    ox.settings.requests_timeout = self.cfg.EVAC_OSM_TIMEOUT_S
             except Exception:
                 pass
         try:
             # Use a fixed-radius campus graph so map extent stays within school area.
             G_walk = ox.graph_from_point(
-                config.EVAC_FALLBACK_CENTER,
-                dist=config.EVAC_RADIUS_M,
+                self.cfg.EVAC_FALLBACK_CENTER,
+                dist=self.cfg.EVAC_RADIUS_M,
                 network_type="walk",
                 simplify=True,
             )
             G_drive = ox.graph_from_point(
-                config.EVAC_FALLBACK_CENTER,
-                dist=config.EVAC_RADIUS_M,
+                self.cfg.EVAC_FALLBACK_CENTER,
+                dist=self.cfg.EVAC_RADIUS_M,
                 network_type="drive",
                 simplify=True,
             )
         except Exception:
             try:
                 G_walk = ox.graph_from_point(
-                    config.EVAC_FALLBACK_CENTER,
-                    dist=config.EVAC_RADIUS_M,
+                    self.cfg.EVAC_FALLBACK_CENTER,
+                    dist=self.cfg.EVAC_RADIUS_M,
                     network_type="walk",
                     simplify=True,
                 )
                 G_drive = ox.graph_from_point(
-                    config.EVAC_FALLBACK_CENTER,
-                    dist=config.EVAC_RADIUS_M,
+                    self.cfg.EVAC_FALLBACK_CENTER,
+                    dist=self.cfg.EVAC_RADIUS_M,
                     network_type="drive",
                     simplify=True,
                 )
@@ -76,12 +222,18 @@ class EvacEnv:
                 return False
         # keep lat/lon drive graph for nearest-node lookup
         self.G_drive_ll = G_drive
+        lonlat = {}
+        for G in (G_walk, G_drive):
+            for n, data in G.nodes(data=True):
+                lonlat[n] = (data.get("x", np.nan), data.get("y", np.nan))
         try:
             G_walk = ox.project_graph(G_walk)
             G_drive = ox.project_graph(G_drive, to_crs=G_walk.graph.get("crs"))
         except Exception:
             return False
 
+        self.crs = G_walk.graph.get("crs")
+
         # keep largest component
         G_walk = G_walk.subgraph(max(nx.weakly_connected_components(G_walk), key=len)).copy()
         G_drive = G_drive.subgraph(max(nx.weakly_connected_components(G_drive), key=len)).copy()
@@ -116,121 +268,253 @@ class EvacEnv:
             horiz = max(1e-6, math.hypot(dx, dy))
             slope = abs(dy) / horiz
             self.G_drive.add_edge(u, v, weight=length, slope=slope)
+        self.lonlat = np.array([lonlat.get(n, (np.nan, np.nan)) for n in self.pos], dtype=np.float64).reshape(-1, 2)
         return True
 
     def _build_grid(self):
-        size = 6
-        step = 120.0
-        for i in range(size):
-            for j in range(size):
-                n = (i, j)
-                self.pos[n] = (i * step, j * step)
-                self.G_walk.add_node(n)
-                self.G_drive.add_node(n)
-        for i in range(size):
-            for j in range(size):
-                if i + 1 < size:
-                    self.G_walk.add_edge((i, j), (i + 1, j), weight=step, slope=0.05)
-                    self.G_walk.add_edge((i + 1, j), (i, j), weight=step, slope=0.05)
-                    self.G_drive.add_edge((i, j), (i + 1, j), weight=step, slope=0.05)
-                    self.G_drive.add_edge((i + 1, j), (i, j), weight=step, slope=0.05)
-                if j + 1 < size:
-                    self.G_walk.add_edge((i, j), (i, j + 1), weight=step, slope=0.05)
-                    self.G_walk.add_edge((i, j + 1), (i, j), weight=step, slope=0.05)
-                    self.G_drive.add_edge((i, j), (i, j + 1), weight=step, slope=0.05)
-                    self.G_drive.add_edge((i, j + 1), (i, j), weight=step, slope=0.05)
-
-    def _init_hazards(self):
-        self.blocked_edges_walk.clear()
-        self.blocked_edges_drive.clear()
-        self.snow_depth_walk.clear()
-        self.snow_depth_drive.clear()
-        for u, v in self.G_walk.edges():
-            if random.random() < config.EVAC_BLOCK_PROB:
-                self.blocked_edges_walk.add((u, v))
-            self.snow_depth_walk[(u, v)] = random.uniform(config.EVAC_SNOW_MIN, config.EVAC_SNOW_MAX)
-        for u, v in self.G_drive.edges():
-            if random.random() < config.EVAC_BLOCK_PROB:
-                self.blocked_edges_drive.add((u, v))
-            self.snow_depth_drive[(u, v)] = random.uniform(config.EVAC_SNOW_MIN, config.EVAC_SNOW_MAX)
+        # EVAC_GRID_SIZE^2 nodes (i, j), both directions between 4-neighbours,
+        # built straight into compiled arrays (networkx views stay lazy)
+        size = max(2, int(self.cfg.EVAC_GRID_SIZE))
+        step = float(self.cfg.EVAC_GRID_STEP)
+        ii, jj = np.divmod(np.arange(size * size), size)
+        node_ids = list(zip(ii.tolist(), jj.tolist()))
+        xy = np.column_stack([ii * step, jj * step]).astype(np.float64)
+        k = np.arange(size * size).reshape(size, size)
+        a = np.concatenate([k[:-1, :].ravel(), k[:, :-1].ravel()])
+        b = np.concatenate([k[1:, :].ravel(), k[:, 1:].ravel()])
+        src = np.concatenate([a, b])
+        dst = np.concatenate([b, a])
+        weight = np.full(len(src), step, dtype=np.float32)
+        slope = np.full(len(src), 0.05, dtype=np.float32)
+        self._nx = {}
+        self._adopt_graphs(
+            node_ids,
+            xy,
+            {mode: CompiledGraph(size * size, src, dst, weight, slope) for mode in ("walk", "drive")},
+        )
+
+    def _compile_graph(self):
+        # integer node ids shared by both modes; positions as one array
+        node_ids = list(self.pos.keys())
+        node_index = {n: i for i, n in enumerate(node_ids)}
+        xy = np.array([self.pos[n] for n in node_ids], dtype=np.float64).reshape(-1, 2)
+        graphs = {
+            "walk": compile_nx(self.G_walk, node_index),
+            "drive": compile_nx(self.G_drive, node_index),
+        }
+        self._adopt_graphs(node_ids, xy, graphs)
+
+    def _adopt_graphs(self, node_ids, xy, graphs, node_index=None):
+        self.node_ids = node_ids
+        self.node_index = {n: i for i, n in enumerate(node_ids)} if node_index is None else node_index
+        self.xy = xy
+        # coordinate columns for the search loops, as views of xy
+        self.xs = memoryview(xy[:, 0])
+        self.ys = memoryview(xy[:, 1])
+        if not self._pos:
+            self._pos = None
+        self.graphs = graphs
+        for cg in graphs.values():
+            cg.attach_xy(xy)
+
+    def _hazard_seed(self, seed=None):
+        if seed is not None:
+            return seed
+        if self.cfg.EVAC_HAZARD_SEED is not None:
+            return self.cfg.EVAC_HAZARD_SEED
+        return random.getrandbits(64)
+
+    def _on_hazard_change(self, change):
+        self.route_cache.apply(self.graphs[change.mode], change)
+
+    def reset(self, seed=None):
+        # new hazard realization on the already-built graph
+        if seed is not None:
+            random.seed(seed)
+            self.rng = np.random.default_rng(seed)
+        self.congestion.reset()
+        self.hazards.reset(self._hazard_seed(seed))
+        self.route_cache.clear()
+        self._obs_cache.clear()
+        self.t = 0
+
+    def begin_step(self, step):
+        # noise-free observations are shared by all agents within one step;
+        # dynamic hazards advance here, before anyone observes
+        if step != self.t:
+            self.t = step
+            self._obs_cache.clear()
+            t0 = PROFILER.start()
+            self.hazards.advance(step)
+            PROFILER.stop("hazards", t0)
+
+    def refresh_search(self, search, mode):
+        # bring a routing.DStarLite up to current edge costs; False when it
+        # has to be rebuilt instead
+        cg = self.compiled(mode)
+        if search.cg is not cg:
+            return False
+        if search.version == cg.version:
+            return True
+        eids = self.hazards.changed_since(mode, search.version)
+        return eids is not None and search.update_costs(eids)
+
+    def _obs_grid(self, mode):
+        r = self.cfg.EVAC_OBS_RADIUS_M
+        key = (mode, r)
+        grid = self._obs_index.get(key)
+        if grid is None:
+            cg = self.compiled(mode)
+            grid = GridIndex(self.xy[cg.src], r)
+            self._obs_index[key] = grid
+        return grid
+
+    def compiled(self, mode="walk"):
+        return self.graphs["walk" if mode == "walk" else "drive"]
+
+    def ch_router(self, mode="walk"):
+        # contraction-hierarchy router, loaded from or saved to the graph cache
+        mode = "walk" if mode == "walk" else "drive"
+        router = self._ch.get(mode)
+        if router is None:
+            cg = self.graphs[mode]
+            prefix = f"{mode}_cch"
+            hit = CCH.load(self.graph_dir, prefix, cg.n_nodes) if self.graph_dir else None
+            if hit is not None:
+                router = CHRouter(hit[0], hit[1], self.cfg.EVAC_CH_CACHE_SIZE)
+            else:
+                router = CHRouter(CCH.build(cg), None, self.cfg.EVAC_CH_CACHE_SIZE)
+                if self.graph_dir:
+                    router.base = router.cch.customize(cg.weight)
+                    try:
+                        router.cch.save(self.graph_dir, prefix, router.base)
+                    except OSError:
+                        pass
+            self._ch[mode] = router
+        return router
+
+    def edge_id(self, u, v, mode="walk"):
+        return self.compiled(mode).edge_id(self.node_index.get(u, -1), self.node_index.get(v, -1))
+
+    @property
+    def blocked_edges_walk(self):
+        return EdgeSet(self, self.graphs["walk"], "blocked")
+
+    @property
+    def blocked_edges_drive(self):
+        return EdgeSet(self, self.graphs["drive"], "blocked")
+
+    @property
+    def snow_depth_walk(self):
+        return EdgeValues(self, self.graphs["walk"], "snow")
+
+    @property
+    def snow_depth_drive(self):
+        return EdgeValues(self, self.graphs["drive"], "snow")
 
     def _init_shelters(self):
-        nodes = list(self.G_walk.nodes())
-        self.shelters = shelter.select_shelters(nodes, config.EVAC_SHELTER_COUNT)
+        nodes = [self.node_ids[i] for i in self.graphs["walk"].nodes.tolist()]
+        self.shelters = shelter.select_shelters(nodes, self.cfg.EVAC_SHELTER_COUNT)
+
+    def _snap_index(self):
+        # KD-tree over drive nodes: local metres from lon/lat when known,
+        # projected coords otherwise (then inputs are taken as x/y)
+        if self._snap is None:
+            nodes = self.graphs["drive"].nodes
+            if not len(nodes):
+                nodes = np.arange(len(self.node_ids), dtype=np.int32)
+            ll = self.lonlat[nodes] if self.lonlat is not None else None
+            if ll is not None and np.isfinite(ll).all(axis=1).any():
+                ok = np.isfinite(ll).all(axis=1)
+                nodes = nodes[ok]
+                ll = ll[ok]
+                origin = (float(ll[:, 1].mean()), float(ll[:, 0].mean()))
+                pts = geo.project_local(ll[:, 1], ll[:, 0], *origin)
+                self._snap = (nodes, NearestIndex(pts), origin)
+            else:
+                self._snap = (nodes, NearestIndex(self.xy[nodes]), None)
+        return self._snap
+
+    def snap_latlon(self, lats, lons):
+        # batched nearest drive node: (node ids, distances, distances_are_metres)
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+        nodes, index, origin = self._snap_index()
+        if not len(nodes):
+            return [None] * len(lats), np.full(len(lats), 1e9), False
+        if origin is None:
+            # no lon/lat for this graph (grid fallback): distance not in metres
+            k, d = index.query(np.column_stack([lons, lats]))
+            return [self.node_ids[i] for i in nodes[k].tolist()], d, False
+        k, _ = index.query(geo.project_local(lats, lons, *origin))
+        hit = nodes[k]
+        d = geo.haversine_m(lats, lons, self.lonlat[hit, 1], self.lonlat[hit, 0])
+        return [self.node_ids[i] for i in hit.tolist()], d, True
 
     def nearest_node(self, lat, lon):
-        if ox is not None:
-            try:
-                if self.G_drive_ll is not None:
-                    return ox.distance.nearest_nodes(self.G_drive_ll, lon, lat)
-                return ox.distance.nearest_nodes(self.G_drive, lon, lat)
-            except Exception:
-                pass
-        # brute-force fallback (lat/lon in projected coords may be inaccurate)
-        best = None
-        best_d = 1e18
-        for n, (x, y) in self.pos.items():
-            d = (x - lon) ** 2 + (y - lat) ** 2
-            if d < best_d:
-                best_d = d
-                best = n
-        return best
+        nodes, _, _ = self.snap_latlon([lat], [lon])
+        return nodes[0]
 
     def nearest_node_with_dist(self, lat, lon):
-        if ox is not None:
-            try:
-                if self.G_drive_ll is not None:
-                    node, dist = ox.distance.nearest_nodes(self.G_drive_ll, lon, lat, return_dist=True)
-                    return node, dist, True
-                node, dist = ox.distance.nearest_nodes(self.G_drive, lon, lat, return_dist=True)
-                return node, dist, True
-            except Exception:
-                pass
-        # fallback: brute-force on projected coords (distance not meaningful for lat/lon)
-        best = None
-        best_d = 1e18
-        for n, (x, y) in self.pos.items():
-            d = (x - lon) ** 2 + (y - lat) ** 2
-            if d < best_d:
-                best_d = d
-                best = n
-        return best, math.sqrt(best_d), False
+        nodes, dist, dist_is_m = self.snap_latlon([lat], [lon])
+        return nodes[0], float(dist[0]), dist_is_m
+
+    def _observe_truth(self, i, mode):
+        key = (i, mode)
+        hit = self._obs_cache.get(key)
+        if hit is not None:
+            PROFILER.count("obs_cache_hits")
+            return hit
+        x0, y0 = self.xy[i]
+        eids = self._obs_grid(mode).query_radius(x0, y0, self.cfg.EVAC_OBS_RADIUS_M)
+        hit = (eids, self.compiled(mode).blocked[eids])
+        self._obs_cache[key] = hit
+        return hit
+
+    def observe_index(self, i, mode="walk"):
+        # (edge ids, observed blocked flags) around compiled node id i
+        eids, blocked = self._observe_truth(i, mode)
+        PROFILER.count("observe_edges", len(eids))
+        obs_error = self.cfg.EVAC_OBS_ERROR_WALK if mode == "walk" else self.cfg.EVAC_OBS_ERROR_DRIVE
+        if obs_error > 0.0 and len(eids):
+            # observation noise
+            blocked = blocked ^ (self.rng.random(len(eids)) < obs_error)
+        return eids, blocked
+
+    def observe_ids(self, node, mode="walk"):
+        # (edge ids, observed blocked flags) within the observation radius
+        i = self.node_index.get(node)
+        if i is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+        return self.observe_index(i, mode)
 
     def observe(self, node, mode="walk"):
         # partial observation within radius
-        if node not in self.pos:
+        if node not in self.node_index:
             return {}
-        x0, y0 = self.pos[node]
+        eids, blocked = self.observe_ids(node, mode)
+        cg = self.compiled(mode)
+        ids = self.node_ids
         obs = {}
-        G = self.G_walk if mode == "walk" else self.G_drive
-        blocked_set = self.blocked_edges_walk if mode == "walk" else self.blocked_edges_drive
-        snow = self.snow_depth_walk if mode == "walk" else self.snow_depth_drive
-        obs_error = config.EVAC_OBS_ERROR_WALK if mode == "walk" else config.EVAC_OBS_ERROR_DRIVE
-        for u, v in G.edges():
-            x1, y1 = self.pos[u]
-            if math.hypot(x1 - x0, y1 - y0) <= config.EVAC_OBS_RADIUS_M:
-                blocked = (u, v) in blocked_set
-                # observation noise
-                if random.random() < obs_error:
-                    blocked = not blocked
-                obs[(u, v)] = {
-                    "blocked": blocked,
-                    "snow": snow[(u, v)],
-                    "slope": G[u][v]["slope"],
-                }
+        for eid, b, sn, sl in zip(
+            eids.tolist(), blocked.tolist(), cg.snow[eids].tolist(), cg.slope[eids].tolist()
+        ):
+            obs[(ids[cg.src[eid]], ids[cg.dst[eid]])] = {"blocked": b, "snow": sn, "slope": sl}
         return obs
 
     def edge_cost(self, u, v, mode="walk"):
-        G = self.G_walk if mode == "walk" else self.G_drive
-        snow = self.snow_depth_walk if mode == "walk" else self.snow_depth_drive
-        base = G[u][v]["weight"]
-        slope = G[u][v]["slope"]
-        return base * (1.0 + config.EVAC_SNOW_ALPHA * snow + config.EVAC_SLOPE_ALPHA * slope)
+        eid = self.edge_id(u, v, mode)
+        if eid < 0:
+            raise KeyError((u, v))
+        return float(self.compiled(mode).cost[eid])
 
     def is_blocked(self, u, v, mode="walk", belief=None):
-        blocked_set = self.blocked_edges_walk if mode == "walk" else self.blocked_edges_drive
         if belief is None:
-            return (u, v) in blocked_set
+            eid = self.edge_id(u, v, mode)
+            return eid >= 0 and bool(self.compiled(mode).blocked[eid])
+        if isinstance(belief, Belief):
+            eid = self.edge_id(u, v, mode)
+            return eid >= 0 and belief.is_blocked(eid)
         if (u, v) in belief:
             return belief[(u, v)]["blocked"]
         return False
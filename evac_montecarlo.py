@@ -0,0 +1,147 @@
+# evac_montecarlo.py
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import config
+from evac_env import EvacEnv
+from profiler import PROFILER
+from shared_graph import SharedGraph, attach
+from simulation import Simulation, spawn_agents
+
+_ENV = None
+
+
+def _init_worker(base_seed, spec=None, cfg=None):
+    # one graph per worker process, reused across episodes; seeding first
+    # keeps shelter placement identical in every worker. With a spec the
+    # worker attaches to the parent's shared graph instead of building one.
+    # cfg: settings object for the worker's env (None: its live config)
+    global _ENV
+    random.seed(base_seed)
+    _ENV = EvacEnv(cfg=cfg) if spec is None else attach(spec, cfg)
+
+
+def _worker_env():
+    if _ENV is None:
+        _init_worker(0)
+    return _ENV
+
+
+def _first_step(series, target):
+    hits = np.flatnonzero(series >= target)
+    return int(hits[0]) if len(hits) else None
+
+
+def run_episode(seed, steps=None, env=None):
+    env = _worker_env() if env is None else env
+    env.reset(seed)
+    peds, cars = spawn_agents(env)
+    sim = Simulation(env, peds, cars)
+    steps = env.cfg.EVAC_STEP_LIMIT if steps is None else steps
+    total = max(1, len(peds) + len(cars))
+    reached_series = np.zeros(steps, dtype=np.int32)
+    if PROFILER.enabled:
+        PROFILER.reset()
+    t0 = time.perf_counter()
+    alive = reached = 0
+    avg_exp = 0.0
+    for step in range(steps):
+        sim.step()
+        PROFILER.end_step(step)
+        alive, reached, avg_exp = sim.counts()
+        reached_series[step] = reached
+    frac = reached_series / total
+    result = {
+        "seed": seed,
+        "agents": total,
+        "alive": alive,
+        "reached": reached,
+        "reached_frac": reached / total,
+        "avg_exposure": avg_exp,
+        "t50": _first_step(frac, 0.5),
+        "t90": _first_step(frac, 0.9),
+        "wall_s": time.perf_counter() - t0,
+    }
+    if PROFILER.enabled:
+        result["profile"] = PROFILER.summary()
+    return result
+
+
+def _stats(values):
+    vals = np.array([v for v in values if v is not None], dtype=np.float64)
+    if not len(vals):
+        return None
+    return {
+        "mean": float(vals.mean()),
+        "std": float(vals.std()),
+        "p05": float(np.percentile(vals, 5)),
+        "p50": float(np.percentile(vals, 50)),
+        "p95": float(np.percentile(vals, 95)),
+        "n": int(len(vals)),
+    }
+
+
+def summarize(episodes, cfg=None):
+    cfg = config if cfg is None else cfg
+    keys = ("reached_frac", "avg_exposure", "t50", "t90", "wall_s")
+    return {
+        "episodes": len(episodes),
+        "planner": cfg.EVAC_PLANNER,
+        "engine": cfg.EVAC_ENGINE,
+        "metrics": {k: _stats([e[k] for e in episodes]) for k in keys},
+        "per_episode": episodes,
+    }
+
+
+def run(episodes, workers=None, seed=0, steps=None, cfg=None):
+    # cfg: settings object (config.make_config), handed to every worker;
+    # defaults to the live config module
+    seeds = [seed + k for k in range(episodes)]
+    if workers == 1:
+        _init_worker(seed, cfg=cfg)
+        results = [run_episode(s, steps) for s in seeds]
+    else:
+        shared = None
+        if (config if cfg is None else cfg).EVAC_SHARED_GRAPH:
+            random.seed(seed)
+            shared = SharedGraph(EvacEnv(cfg=cfg))
+        spec = None if shared is None else shared.spec
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(seed, spec, cfg)
+            ) as pool:
+                results = list(pool.map(run_episode, seeds, [steps] * len(seeds)))
+        finally:
+            if shared is not None:
+                shared.close()
+    return summarize(results, cfg)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Monte Carlo evacuation runs")
+    parser.add_argument("--episodes", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--steps", type=int, default=None)
+    parser.add_argument("--out", default=os.path.join("logs", "montecarlo_summary.json"))
+    parser.add_argument("--profile", action="store_true", help="per-episode phase timings and counters")
+    args = parser.parse_args()
+    if args.profile:
+        config.EVAC_PROFILE = True
+        PROFILER.enable()
+
+    summary = run(args.episodes, args.workers, args.seed, args.steps)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(summary, f, indent=2)
+    m = summary["metrics"]["reached_frac"]
+    print(f"[montecarlo] {summary['episodes']} episodes, reached {m['mean']:.3f} +/- {m['std']:.3f} -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# event_sim.py
+import heapq
+import math
+
+import numpy as np
+from engine import MODES, StepEngine
+from metrics import GROUPS
+
+# event phases within a step: node decisions first, edge arrivals at the end
+_NODE = 0
+_ARRIVE = 1
+
+
+def traverse_steps(length, speed):
+    # steps StepEngine takes to cover an edge: the first k with k additions
+    # of speed >= length, at least 1
+    if speed <= 0.0:
+        return None
+    ratio = length / speed
+    k = max(1, math.ceil(ratio))
+    if abs(ratio - round(ratio)) < 1e-9:
+        # near a whole number the float sum decides; replay it
+        p = 0.0
+        k = 0
+        while True:
+            p += speed
+            k += 1
+            if p >= length:
+                return k
+    return k
+
+
+class EventEngine(StepEngine):
+    # Discrete-event counterpart of StepEngine with the same per-step
+    # outcome. Agents are touched only when they stand on a node (observe,
+    # replan, pick an edge) and when they reach the end of an edge, which is
+    # scheduled ceil(len / speed) steps ahead. Exposure on an edge accrues as
+    # snow rate x steps, settled at arrival, on hazard updates and in sync();
+    # metrics get per-group rate sums each step. Positions, progress and
+    # exposure are brought up to date only when asked for (sync, positions,
+    # write_back). Congestion changes speeds every step and is not supported.
+    def __init__(self, env, starts, goals, modes, speeds):
+        super().__init__(env, starts, goals, modes, speeds)
+        self.t = None
+        self._t0 = None
+        self._heap = []
+        # step the current edge was entered, snow rate, step exposure is settled to
+        self.entered = np.zeros(self.n, dtype=np.int64)
+        self.rate = np.zeros(self.n, dtype=np.float64)
+        self.since = np.zeros(self.n, dtype=np.int64)
+        self.group_rate = np.zeros(len(GROUPS), dtype=np.float64)
+        self._versions = {}
+        self.events = 0
+
+    def _start(self, t):
+        self.t = t
+        self._t0 = t
+        for mode in MODES:
+            self._versions[mode] = self.env.compiled(mode).version
+        moving = self.alive & ~self.reached & (self.goal >= 0)
+        for i in np.flatnonzero(moving).tolist():
+            heapq.heappush(self._heap, (t, _NODE, i))
+
+    def _settle(self, sel, t):
+        # exposure on the current edge through step t - 1
+        if len(sel):
+            self.exposure[sel] += self.rate[sel] * (t - self.since[sel])
+            self.since[sel] = t
+
+    def _hazards_moved(self, t):
+        # snow may have changed under agents on an edge: settle them and
+        # take the new rates from this step on
+        for m, mode in enumerate(MODES):
+            cg = self.env.compiled(mode)
+            if self._versions.get(mode) == cg.version:
+                continue
+            self._versions[mode] = cg.version
+            sel = np.flatnonzero((self.edge >= 0) & (self.mode == m))
+            if not len(sel):
+                continue
+            self._settle(sel, t)
+            self.rate[sel] = cg.snow[self.edge[sel]]
+        on = np.flatnonzero(self.edge >= 0)
+        self.group_rate = np.bincount(self.group[on], weights=self.rate[on], minlength=len(GROUPS))
+
+    def step(self):
+        t = self.env.t if self.t is None else self.t + 1
+        if self.t is None:
+            self._start(t)
+        self.t = t
+        if any(self.env.compiled(mode).version != self._versions[mode] for mode in MODES):
+            self._hazards_moved(t)
+        heap = self._heap
+        arrivals = []
+        while heap and heap[0][0] == t:
+            _, phase, i = heapq.heappop(heap)
+            self.events += 1
+            if phase == _ARRIVE:
+                arrivals.append(i)
+                continue
+            self._at_node(i)
+            if self.reached[i]:
+                continue
+            e = int(self.edge[i])
+            if e < 0:
+                # waited or replanned in place: decide again next step
+                heapq.heappush(heap, (t + 1, _NODE, i))
+                continue
+            cg = self.env.compiled(MODES[self.mode[i]])
+            k = traverse_steps(float(self.edge_len[i]), float(self.speed[i]))
+            if k is None:
+                continue
+            rate = float(cg.snow[e])
+            self.entered[i] = t
+            self.since[i] = t
+            self.rate[i] = rate
+            self.group_rate[self.group[i]] += rate
+            heapq.heappush(heap, (t + k - 1, _ARRIVE, i))
+        if self.metrics is not None:
+            self.metrics.add_exposure_batch(np.arange(len(GROUPS)), self.group_rate)
+        if arrivals:
+            self._arrive(np.array(arrivals, dtype=np.int64), t)
+
+    def _arrive(self, idx, t):
+        self._settle(idx, t + 1)
+        for m, mode in enumerate(MODES):
+            sel = idx[self.mode[idx] == m]
+            if not len(sel):
+                continue
+            cg = self.env.compiled(mode)
+            self.node[sel] = cg.dst[self.edge[sel]]
+        self.group_rate -= np.bincount(self.group[idx], weights=self.rate[idx], minlength=len(GROUPS))
+        self.rate[idx] = 0.0
+        self.edge[idx] = -1
+        self.edge_progress[idx] = 0.0
+        self.path_pos[idx] += 1
+        hit = idx[self.node[idx] == self.goal[idx]]
+        self.reached[hit] = True
+        self.steps[hit] = t - self._t0 + 1
+        if self.metrics is not None and len(hit):
+            self.metrics.arrive_batch(self.group[hit], self.exposure[hit])
+        for i in idx[self.node[idx] != self.goal[idx]].tolist():
+            heapq.heappush(self._heap, (t + 1, _NODE, i))
+
+    def _at_node(self, i):
+        super()._at_node(i)
+        if self.reached[i]:
+            self.steps[i] = self.t - self._t0 + 1
+
+    def sync(self):
+        # bring progress, exposure and step counts up to the last step run
+        if self.t is None:
+            return
+        t = self.t
+        on = np.flatnonzero(self.edge >= 0)
+        self._settle(on, t + 1)
+        done = t - self.entered[on] + 1
+        self.edge_progress[on] = np.minimum(done * self.speed[on], self.edge_len[on])
+        moving = self.alive & ~self.reached & (self.goal >= 0)
+        self.steps[moving] = t - self._t0 + 1
+
+    def positions(self):
+        self.sync()
+        return super().positions()
+
+    def write_back(self, agents):
+        self.sync()
+        super().write_back(agents)
+
+    def next_event(self):
+        # step of the next scheduled event, None when every agent is done
+        return self._heap[0][0] if self._heap else None
+
+
+def step_shuttles(shuttles, step):
+    # shuttles sleep through their dwell at a stop instead of counting it
+    # down one call per step; same positions as calling step() every step
+    for b in shuttles:
+        if step < getattr(b, "wake", 0):
+            continue
+        b.step()
+        if b.dwell > 0:
+            b.wake = step + b.dwell + 1
+            b.dwell = 0
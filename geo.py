@@ -0,0 +1,23 @@
+# geo.py
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    # great-circle distance in metres; broadcasts over arrays
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dl = np.radians(np.asarray(lon2, dtype=np.float64) - lon1)
+    h = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def project_local(lat, lon, lat0, lon0):
+    # equirectangular metres around (lat0, lon0); good to a few km
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    x = np.radians(lon - lon0) * EARTH_RADIUS_M * np.cos(np.radians(lat0))
+    y = np.radians(lat - lat0) * EARTH_RADIUS_M
+    return np.column_stack([x.reshape(-1), y.reshape(-1)])
@@ -0,0 +1,94 @@
+# graph_cache.py
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import config
+from graph_core import CompiledGraph
+
+FORMAT_VERSION = 1
+MODES = ("walk", "drive")
+_COLUMNS = ("nodes", "indptr", "src", "dst", "weight", "slope")
+
+
+def cache_key(center, radius_m, network_types=MODES, extract=None):
+    key = {
+        "center": [round(float(c), 7) for c in center],
+        "radius_m": None if radius_m is None else float(radius_m),
+        "network_types": list(network_types),
+        "format": FORMAT_VERSION,
+    }
+    if extract is not None:
+        # a local extract is identified by path, size and modification time
+        st = os.stat(extract)
+        key["extract"] = [os.path.abspath(extract), st.st_size, int(st.st_mtime)]
+    blob = json.dumps(key, sort_keys=True)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def cache_path(center=None, radius_m=None, extract=None, cfg=None):
+    cfg = config if cfg is None else cfg
+    center = cfg.EVAC_FALLBACK_CENTER if center is None else center
+    if radius_m is None and extract is None:
+        radius_m = cfg.EVAC_RADIUS_M
+    return os.path.join(cfg.EVAC_GRAPH_CACHE_DIR, cache_key(center, radius_m, extract=extract))
+
+
+def save(path, node_ids, xy, lonlat, graphs, crs=None):
+    # one .npy per array so every column can be memory-mapped on load
+    try:
+        labels = np.asarray(node_ids, dtype=np.int64)
+    except (TypeError, ValueError):
+        return False
+    if labels.ndim != 1:
+        return False
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "node_ids.npy"), labels)
+    np.save(os.path.join(tmp, "xy.npy"), np.asarray(xy, dtype=np.float64))
+    np.save(os.path.join(tmp, "lonlat.npy"), np.asarray(lonlat, dtype=np.float64))
+    for mode in MODES:
+        cg = graphs[mode]
+        for col in _COLUMNS:
+            np.save(os.path.join(tmp, f"{mode}_{col}.npy"), np.ascontiguousarray(getattr(cg, col)))
+    meta = {
+        "format": FORMAT_VERSION,
+        "crs": None if crs is None else (crs.to_wkt() if hasattr(crs, "to_wkt") else str(crs)),
+        "n_nodes": int(len(labels)),
+        "n_edges": {mode: graphs[mode].n_edges for mode in MODES},
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return True
+
+
+def load(path):
+    # (node_ids, xy, lonlat, graphs, crs) or None when absent or stale
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            return None
+
+        def arr(name):
+            return np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+
+        node_ids = arr("node_ids").tolist()
+        n = len(node_ids)
+        graphs = {}
+        for mode in MODES:
+            cols = {col: arr(f"{mode}_{col}") for col in _COLUMNS}
+            graphs[mode] = CompiledGraph.from_csr(
+                n, cols["indptr"], cols["src"], cols["dst"], cols["weight"], cols["slope"], cols["nodes"]
+            )
+        return node_ids, np.asarray(arr("xy")), np.asarray(arr("lonlat")), graphs, meta.get("crs")
+    except (OSError, ValueError, KeyError):
+        return None
@@ -0,0 +1,261 @@
+# graph_core.py
+from collections.abc import Mapping, Set
+
+import networkx as nx
+import numpy as np
+
+
+class CompiledGraph:
+    # CSR adjacency over a shared integer node index with per-edge columns.
+    def __init__(self, n_nodes, src, dst, weight, slope, nodes=None):
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        # sort by (src, dst) so rows are contiguous and keys are searchable
+        order = np.lexsort((dst, src))
+        src = np.ascontiguousarray(src[order], dtype=np.int32)
+        counts = np.bincount(src, minlength=n_nodes)
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        self._adopt(
+            n_nodes,
+            indptr,
+            src,
+            np.ascontiguousarray(dst[order], dtype=np.int32),
+            np.ascontiguousarray(np.asarray(weight, dtype=np.float32)[order]),
+            np.ascontiguousarray(np.asarray(slope, dtype=np.float32)[order]),
+            nodes,
+        )
+        # input_order[k] is the position in the input of CSR edge k
+        self.input_order = order
+
+    @classmethod
+    def from_csr(cls, n_nodes, indptr, src, dst, weight, slope, nodes=None, keys=None, zobrist=None):
+        # adopt arrays already in CSR order (e.g. memory-mapped or shared)
+        # without copying; keys and zobrist skip recomputing derived columns
+        self = cls.__new__(cls)
+        self._adopt(n_nodes, indptr, src, dst, weight, slope, nodes, keys, zobrist)
+        self.input_order = np.arange(self.n_edges)
+        return self
+
+    def _adopt(self, n_nodes, indptr, src, dst, weight, slope, nodes, keys=None, zobrist=None):
+        self.n_nodes = int(n_nodes)
+        self.n_edges = int(len(src))
+        self.indptr = indptr
+        self.src = src
+        self.dst = dst
+        self.weight = weight
+        self.slope = slope
+        # compiled ids of the nodes that belong to this mode
+        if nodes is None:
+            nodes = np.unique(np.concatenate([src, dst])).astype(np.int32)
+        self.nodes = np.asarray(nodes, dtype=np.int32)
+        if keys is None:
+            keys = self.src.astype(np.int64) * self.n_nodes + self.dst
+        self._keys = keys
+        self.snow = np.zeros(self.n_edges, dtype=np.float32)
+        self.blocked = np.zeros(self.n_edges, dtype=bool)
+        # travel-time multiplier from congestion (1 = free flow)
+        self.delay = np.ones(self.n_edges, dtype=np.float32)
+        self.cost = np.array(self.weight, dtype=np.float32)
+        # straight-line edge lengths, set by attach_xy
+        self.euclid = None
+        self.heuristic_scale = 0.0
+        self.version = 0
+        self._adj = None
+        self._radj = None
+        # fixed random keys for XOR fingerprints of edge sets
+        if zobrist is None:
+            zobrist = np.random.default_rng(0x5EED).integers(1, 2**63 - 1, size=self.n_edges, dtype=np.int64)
+        self.zobrist = zobrist
+
+    def edge_id(self, ui, vi):
+        # -1 when the edge does not exist
+        if ui < 0 or vi < 0:
+            return -1
+        key = ui * self.n_nodes + vi
+        k = int(np.searchsorted(self._keys, key))
+        if k < self.n_edges and self._keys[k] == key:
+            return k
+        return -1
+
+    def edge_ids(self, us, vs):
+        keys = np.asarray(us, dtype=np.int64) * self.n_nodes + np.asarray(vs, dtype=np.int64)
+        k = np.searchsorted(self._keys, keys)
+        k = np.minimum(k, max(0, self.n_edges - 1))
+        found = self._keys[k] == keys if self.n_edges else np.zeros(len(keys), dtype=bool)
+        return np.where(found, k, -1)
+
+    def out_edges(self, ui):
+        return range(int(self.indptr[ui]), int(self.indptr[ui + 1]))
+
+    def attach_xy(self, xy):
+        d = xy[self.dst] - xy[self.src]
+        self.euclid = np.hypot(d[:, 0], d[:, 1]).astype(np.float32)
+        self._update_heuristic()
+
+    def refresh_cost(self, snow_alpha, slope_alpha):
+        np.multiply(
+            self.weight,
+            (1.0 + snow_alpha * self.snow + slope_alpha * self.slope) * self.delay,
+            out=self.cost,
+        )
+        self._update_heuristic()
+        self.version += 1
+
+    def _update_heuristic(self):
+        # largest factor that keeps scale * euclid a consistent lower bound
+        if self.euclid is None:
+            return
+        m = self.euclid > 1e-6
+        if not m.any():
+            self.heuristic_scale = 0.0
+            return
+        self.heuristic_scale = max(0.0, float(np.min(self.cost[m] / self.euclid[m])))
+
+    def to_networkx(self, node_ids):
+        G = nx.DiGraph()
+        G.add_nodes_from(node_ids[i] for i in self.nodes.tolist())
+        G.add_edges_from(
+            (node_ids[u], node_ids[v], {"weight": w, "slope": sl, "eid": k})
+            for k, (u, v, w, sl) in enumerate(
+                zip(self.src.tolist(), self.dst.tolist(), self.weight.tolist(), self.slope.tolist())
+            )
+        )
+        return G
+
+    def fingerprint(self, eids):
+        # order-independent hash of a set of edge ids
+        if len(eids) == 0:
+            return 0
+        return int(np.bitwise_xor.reduce(self.zobrist[np.asarray(eids, dtype=np.int64)]))
+
+    def reverse_adjacency(self):
+        # (rindptr, rsrc, reid) in-edges grouped by destination, as memoryviews
+        if self._radj is None:
+            order = np.lexsort((self.src, self.dst))
+            counts = np.bincount(self.dst, minlength=self.n_nodes)
+            rindptr = np.zeros(self.n_nodes + 1, dtype=np.int64)
+            np.cumsum(counts, out=rindptr[1:])
+            self._radj = (memoryview(rindptr), memoryview(self.src[order]), memoryview(order))
+        return self._radj
+
+    def adjacency(self):
+        # (indptr, dst, cost) for pure-Python search loops: memoryviews over
+        # the arrays index to Python scalars as fast as lists, without a
+        # per-edge copy (and read shared-memory columns in place)
+        if self._adj is None or self._adj[0] != self.version:
+            self._adj = (self.version, memoryview(self.indptr), memoryview(self.dst), memoryview(self.cost))
+        return self._adj[1:]
+
+
+def compile_nx(G, node_index):
+    # G edges must carry "weight" and "slope"; tags each edge with its id
+    n = G.number_of_edges()
+    src = np.empty(n, dtype=np.int64)
+    dst = np.empty(n, dtype=np.int64)
+    weight = np.empty(n, dtype=np.float32)
+    slope = np.empty(n, dtype=np.float32)
+    for k, (u, v, data) in enumerate(G.edges(data=True)):
+        src[k] = node_index[u]
+        dst[k] = node_index[v]
+        weight[k] = data.get("weight", 1.0)
+        slope[k] = data.get("slope", 0.0)
+    nodes = np.array([node_index[n] for n in G.nodes()], dtype=np.int32)
+    cg = CompiledGraph(len(node_index), src, dst, weight, slope, nodes)
+    edges = list(G.edges())
+    for k, i in enumerate(cg.input_order):
+        u, v = edges[i]
+        G[u][v]["eid"] = k
+    return cg
+
+
+class LabelIndex(Mapping):
+    # node label -> compiled id over an int64 label array and its sorting
+    # permutation (e.g. both in shared memory); a read-only stand-in for the
+    # {label: id} dict without a Python object per node
+    def __init__(self, labels, order):
+        self.labels = labels
+        self.order = order
+
+    def get(self, label, default=None):
+        if not isinstance(label, (int, np.integer)) or isinstance(label, bool) or not len(self.order):
+            return default
+        k = int(np.searchsorted(self.labels, label, sorter=self.order))
+        if k < len(self.order):
+            i = int(self.order[k])
+            if self.labels[i] == label:
+                return i
+        return default
+
+    def __getitem__(self, label):
+        i = self.get(label)
+        if i is None:
+            raise KeyError(label)
+        return i
+
+    def __contains__(self, label):
+        return self.get(label) is not None
+
+    def __iter__(self):
+        return iter(memoryview(self.labels))
+
+    def __len__(self):
+        return len(self.labels)
+
+
+class EdgeValues(Mapping):
+    # read-only (u, v) -> value view over a per-edge column
+    def __init__(self, env, cg, column):
+        self._env = env
+        self._cg = cg
+        self._column = column
+
+    def _eid(self, key):
+        try:
+            u, v = key
+        except (TypeError, ValueError):
+            return -1
+        idx = self._env.node_index
+        return self._cg.edge_id(idx.get(u, -1), idx.get(v, -1))
+
+    def __getitem__(self, key):
+        eid = self._eid(key)
+        if eid < 0:
+            raise KeyError(key)
+        return float(getattr(self._cg, self._column)[eid])
+
+    def __contains__(self, key):
+        return self._eid(key) >= 0
+
+    def __iter__(self):
+        ids = self._env.node_ids
+        for u, v in zip(self._cg.src.tolist(), self._cg.dst.tolist()):
+            yield (ids[u], ids[v])
+
+    def __len__(self):
+        return self._cg.n_edges
+
+
+class EdgeSet(Set):
+    # read-only set-like view of edges whose flag column is True
+    def __init__(self, env, cg, column):
+        self._env = env
+        self._cg = cg
+        self._column = column
+
+    def __contains__(self, key):
+        try:
+            u, v = key
+        except (TypeError, ValueError):
+            return False
+        idx = self._env.node_index
+        eid = self._cg.edge_id(idx.get(u, -1), idx.get(v, -1))
+        return eid >= 0 and bool(getattr(self._cg, self._column)[eid])
+
+    def __iter__(self):
+        ids = self._env.node_ids
+        for eid in np.flatnonzero(getattr(self._cg, self._column)).tolist():
+            yield (ids[int(self._cg.src[eid])], ids[int(self._cg.dst[eid])])
+
+    def __len__(self):
+        return int(np.count_nonzero(getattr(self._cg, self._column)))
@@ -0,0 +1,145 @@
+# hazards.py
+from collections import deque, namedtuple
+
+import numpy as np
+import config
+
+MODES = ("walk", "drive")
+
+# one batched hazard update on one mode; costs are for eids, closed/opened are
+# edge ids whose blocked flag flipped
+HazardChange = namedtuple(
+    "HazardChange", "mode step old_version version eids old_cost new_cost closed opened"
+)
+
+
+class HazardEngine:
+    # Blocked flags and snow depth for every edge of every mode, drawn from
+    # per-mode numpy Generator streams. With EVAC_HAZARD_DYNAMIC the field
+    # evolves every EVAC_HAZARD_EVERY steps and each update is published as a
+    # HazardChange to subscribers.
+    def __init__(self, graphs, seed=None, log_size=16, cfg=None):
+        self.graphs = graphs
+        self.cfg = config if cfg is None else cfg
+        self.listeners = []
+        self.log = {mode: deque(maxlen=log_size) for mode in MODES}
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        # streams: initial field per mode, then dynamics per mode
+        seq = np.random.SeedSequence(seed)
+        streams = [np.random.default_rng(s) for s in seq.spawn(2 * len(MODES))]
+        self._init_rng = dict(zip(MODES, streams[: len(MODES)]))
+        self._dyn_rng = dict(zip(MODES, streams[len(MODES) :]))
+        self.rate = {}
+        for log in self.log.values():
+            log.clear()
+        self.sample()
+
+    def subscribe(self, fn):
+        self.listeners.append(fn)
+
+    def sample(self):
+        for mode in MODES:
+            cg = self.graphs[mode]
+            rng = self._init_rng[mode]
+            cg.blocked[:] = rng.random(cg.n_edges) < self.cfg.EVAC_BLOCK_PROB
+            cg.snow[:] = rng.uniform(self.cfg.EVAC_SNOW_MIN, self.cfg.EVAC_SNOW_MAX, cg.n_edges)
+            # per-edge accumulation factor (exposure, shading)
+            self.rate[mode] = rng.uniform(0.5, 1.5, cg.n_edges).astype(np.float32)
+            cg.refresh_cost(self.cfg.EVAC_SNOW_ALPHA, self.cfg.EVAC_SLOPE_ALPHA)
+
+    def advance(self, step):
+        # batched update every EVAC_HAZARD_EVERY steps; returns the changes
+        every = max(1, int(self.cfg.EVAC_HAZARD_EVERY))
+        if not self.cfg.EVAC_HAZARD_DYNAMIC or step <= 0 or step % every:
+            return []
+        changes = []
+        for mode in MODES:
+            change = self._advance_mode(mode, step, every)
+            if change is not None:
+                changes.append(change)
+        for change in changes:
+            self.publish(change)
+        return changes
+
+    def publish(self, change):
+        # log a cost change (from here or e.g. congestion) and notify
+        self.log[change.mode].append(change)
+        for fn in self.listeners:
+            fn(change)
+
+    def _advance_mode(self, mode, step, dt):
+        cg = self.graphs[mode]
+        rng = self._dyn_rng[mode]
+        n = cg.n_edges
+        if not n:
+            return None
+        blocked = cg.blocked
+        # closures spread to edges sharing an endpoint with a closed edge
+        touch = np.bincount(cg.src[blocked], minlength=cg.n_nodes) + np.bincount(
+            cg.dst[blocked], minlength=cg.n_nodes
+        )
+        near = touch[cg.src] + touch[cg.dst]
+        p_close = 1.0 - (1.0 - self.cfg.EVAC_HAZARD_SPREAD_PROB) ** near
+        draw = rng.random(n)
+        closed = np.flatnonzero(~blocked & (draw < p_close))
+        opened = np.flatnonzero(blocked & (draw < self.cfg.EVAC_HAZARD_REOPEN_PROB))
+
+        snow = cg.snow
+        grown = np.minimum(
+            snow + self.cfg.EVAC_HAZARD_SNOW_RATE * dt * self.rate[mode], self.cfg.EVAC_HAZARD_SNOW_CAP
+        ).astype(np.float32)
+        grown = np.maximum(grown, snow)
+        snowed = np.flatnonzero(grown != snow)
+
+        if not len(closed) and not len(opened) and not len(snowed):
+            return None
+        old_version = cg.version
+        old_cost = cg.cost[snowed].copy()
+        blocked[closed] = True
+        blocked[opened] = False
+        snow[snowed] = grown[snowed]
+        if len(snowed):
+            cg.refresh_cost(self.cfg.EVAC_SNOW_ALPHA, self.cfg.EVAC_SLOPE_ALPHA)
+        else:
+            # flags only: costs are unchanged but the edge state moved on
+            cg.version += 1
+        return HazardChange(
+            mode, step, old_version, cg.version, snowed, old_cost, cg.cost[snowed].copy(), closed, opened
+        )
+
+    def close(self, mode, eids, step=0):
+        # intervention: block edges now, published like a dynamic update
+        cg = self.graphs[mode]
+        eids = np.unique(np.asarray(eids, dtype=np.int64))
+        closed = eids[~cg.blocked[eids]]
+        if not len(closed):
+            return None
+        old_version = cg.version
+        cg.blocked[closed] = True
+        cg.version += 1
+        empty = np.empty(0, dtype=np.int64)
+        change = HazardChange(
+            mode, step, old_version, cg.version, empty, cg.cost[empty], cg.cost[empty], closed, empty
+        )
+        self.publish(change)
+        return change
+
+    def changed_since(self, mode, version):
+        # edge ids whose cost changed after version, or None if the log
+        # does not reach back that far
+        cg = self.graphs[mode]
+        if version == cg.version:
+            return np.empty(0, dtype=np.int64)
+        parts = []
+        for change in self.log[mode]:
+            if change.version <= version:
+                continue
+            if change.old_version != version:
+                return None
+            parts.append(change.eids)
+            version = change.version
+        if version != cg.version:
+            return None
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
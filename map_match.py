@@ -0,0 +1,336 @@
+# map_match.py
+# HMM map matching of transit polylines onto the drive graph (Newson &
+# Krumm): hidden states are candidate edges near each polyline point, with
+# Gaussian emission in the point-to-edge distance and exponential transition
+# in |route distance - straight-line distance|. The Viterbi edge sequence is
+# expanded into a contiguous node path. Matched routes are cached by feed
+# payload hash and graph, in memory and on disk, so a route is matched once
+# per feed change rather than once per bus per run.
+import hashlib
+import heapq
+import json
+import math
+import os
+
+import numpy as np
+import geo
+from spatial import GridIndex
+
+FORMAT_VERSION = 2
+# route key -> (route node ids, stop node ids)
+_ROUTES = {}
+
+
+def _frame(env):
+    # node coordinates in the matching frame: local metres from lon/lat when
+    # the graph has them, else graph x/y (inputs are then read as (y, x),
+    # like EvacEnv.snap_latlon)
+    ll = env.lonlat
+    if ll is not None and len(ll) and np.isfinite(ll).all(axis=1).any():
+        ok = np.isfinite(ll).all(axis=1)
+        origin = (float(ll[ok, 1].mean()), float(ll[ok, 0].mean()))
+        return geo.project_local(ll[:, 1], ll[:, 0], *origin), origin
+    return np.asarray(env.xy, dtype=np.float64), None
+
+
+class Matcher:
+    # one drive graph's candidate index and shortest-path memo, reused for
+    # every polyline matched against it
+    def __init__(self, env):
+        cfg = env.cfg
+        self.env = env
+        self.cg = cg = env.compiled("drive")
+        self.radius = float(cfg.EVAC_MATCH_RADIUS_M)
+        self.k = int(cfg.EVAC_MATCH_CANDIDATES)
+        self.sigma = float(cfg.EVAC_MATCH_SIGMA_M)
+        self.beta = float(cfg.EVAC_MATCH_BETA_M)
+        self.step = float(cfg.EVAC_MATCH_STEP_M)
+        self.xy, self.origin = _frame(env)
+        a = self.xy[cg.src]
+        b = self.xy[cg.dst]
+        ok = np.isfinite(a).all(axis=1) & np.isfinite(b).all(axis=1)
+        self.a = a
+        self.seg = b - a
+        self.len2 = np.maximum((self.seg**2).sum(axis=1), 1e-12)
+        self.length = np.asarray(cg.weight, dtype=np.float64)
+        # sample points along every edge at most one radius apart: any edge
+        # within r of a query has a sample within 1.5 r
+        eids = np.flatnonzero(ok)
+        per = np.ceil(np.sqrt(self.len2[eids]) / self.radius).astype(np.int64) + 1
+        owner = np.repeat(eids, per)
+        first = np.cumsum(per) - per
+        frac = (np.arange(len(owner)) - np.repeat(first, per)) / np.repeat(np.maximum(per - 1, 1), per)
+        self.owner = owner
+        self.index = GridIndex(a[owner] + self.seg[owner] * frac[:, None], self.radius)
+        self._adj = (cg.indptr.tolist(), cg.dst.tolist(), self.length.tolist())
+        # source node -> (bound, dist, parent)
+        self._sp = {}
+
+    def project(self, lats, lons):
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+        if self.origin is None:
+            return np.column_stack([lons, lats])
+        return geo.project_local(lats, lons, *self.origin)
+
+    def thin(self, pts):
+        # drop points closer than EVAC_MATCH_STEP_M to the last kept one
+        keep = [0] if len(pts) else []
+        for i in range(1, len(pts)):
+            d = pts[i] - pts[keep[-1]]
+            if d[0] * d[0] + d[1] * d[1] >= self.step * self.step:
+                keep.append(i)
+        return pts[keep]
+
+    def candidates(self, p):
+        # (edge ids, position along edge in [0, 1], distance) of the nearest
+        # k edges within radius of p
+        hit = self.index.query_radius(p[0], p[1], 1.5 * self.radius)
+        e = np.unique(self.owner[hit])
+        if not len(e):
+            return e, np.empty(0), np.empty(0)
+        t = np.clip(((p - self.a[e]) * self.seg[e]).sum(axis=1) / self.len2[e], 0.0, 1.0)
+        d = np.hypot(*(p - self.a[e] - self.seg[e] * t[:, None]).T)
+        near = np.flatnonzero(d <= self.radius)
+        near = near[np.argsort(d[near], kind="stable")[: self.k]]
+        return e[near], t[near], d[near]
+
+    def _search(self, s, bound):
+        # bounded Dijkstra on edge length from node s, memoized per source
+        memo = self._sp.get(s)
+        if memo is not None and memo[0] >= bound:
+            return memo[1], memo[2]
+        indptr, dst, length = self._adj
+        dist = {s: 0.0}
+        parent = {s: -1}
+        heap = [(0.0, s)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u] or d > bound:
+                continue
+            for k in range(indptr[u], indptr[u + 1]):
+                v = dst[k]
+                nd = d + length[k]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+        self._sp[s] = (bound, dist, parent)
+        return dist, parent
+
+    def _path(self, s, t, bound=math.inf):
+        # node path s -> t, [] if not reachable within bound
+        memo = self._sp.get(s)
+        if memo is not None and memo[1].get(t, math.inf) <= memo[0]:
+            dist, parent = memo[1], memo[2]
+        else:
+            dist, parent = self._search(s, bound)
+        if t not in dist or dist[t] > bound:
+            return []
+        path = [t]
+        while path[-1] != s:
+            path.append(parent[path[-1]])
+        return path[::-1]
+
+    def _transitions(self, prev, cur, gap):
+        # (len(prev), len(cur)) log transition scores; one bounded search per
+        # distinct end node of the previous candidates serves all targets
+        ea, ta = prev
+        eb, tb = cur
+        bound = 3.0 * gap + 4.0 * self.radius
+        src = self.cg.src
+        dst = self.cg.dst
+        route = np.full((len(ea), len(eb)), np.inf)
+        targets = src[eb].tolist()
+        for u in np.unique(dst[ea]).tolist():
+            dist, _ = self._search(u, bound)
+            d = np.array([dist.get(v, np.inf) for v in targets])
+            rows = np.flatnonzero(dst[ea] == u)
+            head = (1.0 - ta[rows]) * self.length[ea[rows]]
+            route[rows] = head[:, None] + d[None, :] + (tb * self.length[eb])[None, :]
+        # staying on an edge; slipping back by less than the candidate radius
+        # is position noise rather than a U-turn
+        along = (tb[None, :] - ta[:, None]) * self.length[ea][:, None]
+        same = (ea[:, None] == eb[None, :]) & (along >= -self.radius)
+        route = np.where(same, np.maximum(along, 0.0), route)
+        score = -np.abs(route - gap) / self.beta
+        score[route > bound] = -np.inf
+        return score
+
+    def match(self, lats, lons):
+        # contiguous compiled node path following the polyline, [] if nothing matches
+        pts = self.thin(self.project(lats, lons))
+        segments = []
+        states = []
+        prev_p = None
+        score = back = None
+        for p in pts:
+            e, t, d = self.candidates(p)
+            if not len(e):
+                continue
+            emit = -0.5 * (d / self.sigma) ** 2
+            if states:
+                trans = self._transitions(states[-1], (e, t), float(np.hypot(*(p - prev_p))))
+                total = score[:, None] + trans
+                best = np.argmax(total, axis=0)
+                new = total[best, np.arange(len(e))] + emit
+                if np.isfinite(new).any():
+                    back.append(best)
+                    score = new
+                    states.append((e, t))
+                    prev_p = p
+                    continue
+                # no route between consecutive points: close this run
+                segments.append(self._decode(states, back, score))
+                states = []
+            states.append((e, t))
+            back = [None]
+            score = emit
+            prev_p = p
+        if states:
+            segments.append(self._decode(states, back, score))
+        return self._drop_spurs(self._join(segments), pts)
+
+    def _drop_spurs(self, path, pts):
+        # out-and-back detours (u, v, u) to a node the polyline never comes
+        # near are corner noise, not turnarounds
+        out = []
+        for v in path:
+            if len(out) >= 2 and out[-2] == v:
+                d = np.hypot(*(pts - self.xy[out[-1]]).T).min()
+                if d > 2.0 * self.sigma:
+                    out.pop()
+                    continue
+            out.append(v)
+        return out
+
+    def _decode(self, states, back, score):
+        # Viterbi backtrack to a node path over the chosen edges
+        k = int(np.argmax(score))
+        chosen = []
+        for i in range(len(states) - 1, -1, -1):
+            chosen.append((int(states[i][0][k]), float(states[i][1][k])))
+            if back[i] is not None:
+                k = int(back[i][k])
+        chosen.reverse()
+        t_first = chosen[0][1]
+        t_last = chosen[-1][1]
+        chosen = [e for e, _ in chosen]
+        src = self.cg.src
+        dst = self.cg.dst
+        path = [int(src[chosen[0]]), int(dst[chosen[0]])]
+        for ea, eb in zip(chosen, chosen[1:]):
+            if ea == eb:
+                continue
+            gap = self._path(int(dst[ea]), int(src[eb]))
+            path.extend(gap[1:])
+            path.append(int(dst[eb]))
+        # the run starts and ends at the edge ends nearest its first and last points
+        if t_first >= 0.5:
+            path = path[1:]
+        if t_last < 0.5 and len(path) > 1:
+            path = path[:-1]
+        return path
+
+    def _join(self, segments):
+        # bridge runs by shortest path; an unreachable run loses to the longer side
+        path = []
+        for seg in segments:
+            if not path:
+                path = seg
+                continue
+            gap = self._path(path[-1], seg[0])
+            if gap:
+                path = path + gap[1:] + seg[1:]
+            elif len(seg) > len(path):
+                path = seg
+        return path
+
+    def close_loop(self, path):
+        # route for cycling with wrap-around: last node leads back to the
+        # first; [] when there is no way back
+        if len(path) < 2:
+            return []
+        if path[-1] != path[0]:
+            back = self._path(path[-1], path[0])
+            if not back:
+                return []
+            path = path + back[1:]
+        return path[:-1]
+
+    def nearest_on(self, path, lats, lons, max_d):
+        # nearest node of path to each point, dropped beyond max_d
+        pts = self.project(lats, lons)
+        nodes = np.asarray(path, dtype=np.int64)
+        if not len(nodes) or not len(pts):
+            return []
+        xy = self.xy[nodes]
+        d2 = ((pts[:, None, :] - xy[None, :, :]) ** 2).sum(axis=2)
+        k = np.argmin(d2, axis=1)
+        near = np.sqrt(d2[np.arange(len(pts)), k]) <= max_d
+        return nodes[k[near]].tolist()
+
+
+def graph_signature(env):
+    cg = env.compiled("drive")
+    h = hashlib.sha1()
+    for arr in (cg.indptr, cg.dst, env.xy):
+        h.update(np.ascontiguousarray(arr).tobytes())
+    return h.hexdigest()
+
+
+def cache_key(env, payload_hash):
+    cfg = env.cfg
+    key = {
+        "format": FORMAT_VERSION,
+        "feed": payload_hash,
+        "graph": graph_signature(env),
+        "params": [
+            cfg.EVAC_FALLBACK_CENTER,
+            cfg.EVAC_BUS_ROUTE_RADIUS_M,
+            cfg.EVAC_BUS_SNAP_MAX_M,
+            cfg.EVAC_BUS_STOPS,
+            cfg.EVAC_MATCH_STEP_M,
+            cfg.EVAC_MATCH_RADIUS_M,
+            cfg.EVAC_MATCH_CANDIDATES,
+            cfg.EVAC_MATCH_SIGMA_M,
+            cfg.EVAC_MATCH_BETA_M,
+        ],
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=repr).encode("utf-8")).hexdigest()
+
+
+def load(env, key):
+    # (route, stops) as node ids, or None
+    hit = _ROUTES.get(key)
+    if hit is not None:
+        return hit
+    root = env.cfg.EVAC_BUS_ROUTE_CACHE_DIR
+    if not root:
+        return None
+    try:
+        with open(os.path.join(root, key + ".json")) as f:
+            data = json.load(f)
+        ids = env.node_ids
+        hit = ([ids[i] for i in data["route"]], [ids[i] for i in data["stops"]])
+    except (OSError, ValueError, KeyError, IndexError):
+        return None
+    _ROUTES[key] = hit
+    return hit
+
+
+def save(env, key, route, stops):
+    _ROUTES[key] = (route, stops)
+    root = env.cfg.EVAC_BUS_ROUTE_CACHE_DIR
+    if not root:
+        return
+    idx = env.node_index
+    data = {"route": [idx[n] for n in route], "stops": [idx[n] for n in stops]}
+    try:
+        os.makedirs(root, exist_ok=True)
+        path = os.path.join(root, key + ".json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
@@ -0,0 +1,174 @@
+# metrics.py
+import csv
+import math
+
+import numpy as np
+
+ROLES = ("faculty", "staff")
+MODES = ("walk", "drive")
+GROUPS = tuple(f"{r}_{m}" for r in ROLES for m in MODES)
+
+
+def group_of(role, mode):
+    r = ROLES.index(role) if role in ROLES else ROLES.index("staff")
+    return r * len(MODES) + (0 if mode == "walk" else 1)
+
+
+class QuantileSketch:
+    # log-bucketed streaming quantiles with relative error alpha (DDSketch-style)
+    def __init__(self, alpha=0.01):
+        self.gamma = (1.0 + alpha) / (1.0 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.n = 0
+
+    def add(self, x):
+        self.n += 1
+        if x <= 0:
+            self.zeros += 1
+            return
+        k = int(math.ceil(math.log(x) / self._log_gamma))
+        self.buckets[k] = self.buckets.get(k, 0) + 1
+
+    def add_many(self, xs):
+        xs = np.asarray(xs, dtype=np.float64).reshape(-1)
+        if not len(xs):
+            return
+        self.n += len(xs)
+        pos = xs[xs > 0]
+        self.zeros += len(xs) - len(pos)
+        if len(pos):
+            keys, counts = np.unique(np.ceil(np.log(pos) / self._log_gamma).astype(np.int64), return_counts=True)
+            for k, c in zip(keys.tolist(), counts.tolist()):
+                self.buckets[k] = self.buckets.get(k, 0) + c
+
+    def quantile(self, q):
+        if self.n == 0:
+            return None
+        rank = q * (self.n - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if rank < seen:
+                return 2.0 * self.gamma ** k / (self.gamma + 1.0)
+        return 2.0 * self.gamma ** max(self.buckets) / (self.gamma + 1.0)
+
+
+class MetricsRecorder:
+    # Aggregates per (role, mode) group, updated as agents change state, so a
+    # recorded step costs O(groups) rather than O(agents).
+    def __init__(self, agents=(), steps=600, alpha=0.01):
+        g = len(GROUPS)
+        self.n = np.zeros(g, dtype=np.int64)
+        self._alive = np.zeros(g, dtype=np.int64)
+        self._reached = np.zeros(g, dtype=np.int64)
+        self._exposure = np.zeros(g, dtype=np.float64)
+        self.steps = np.zeros(steps, dtype=np.int32)
+        self.alive = np.zeros((steps, g), dtype=np.int32)
+        self.reached = np.zeros((steps, g), dtype=np.int32)
+        self.exposure = np.zeros((steps, g), dtype=np.float64)
+        self.rows = 0
+        self.step = 0
+        self.arrival_step = [QuantileSketch(alpha) for _ in range(g)]
+        self.arrival_exposure = [QuantileSketch(alpha) for _ in range(g)]
+        for a in agents:
+            self.register(a)
+
+    def register(self, agent):
+        g = group_of(agent.role, agent.mode)
+        agent.group = g
+        agent.metrics = self
+        self.n[g] += 1
+        self._alive[g] += 1 if agent.alive else 0
+        self._reached[g] += 1 if agent.reached else 0
+        self._exposure[g] += agent.exposure
+
+    def add_exposure(self, group, amount):
+        self._exposure[group] += amount
+
+    def add_exposure_batch(self, groups, amounts):
+        self._exposure += np.bincount(groups, weights=amounts, minlength=len(GROUPS))
+
+    def arrive(self, group, exposure):
+        self._reached[group] += 1
+        self.arrival_step[group].add(self.step)
+        self.arrival_exposure[group].add(exposure)
+
+    def arrive_batch(self, groups, exposures):
+        groups = np.asarray(groups)
+        self._reached += np.bincount(groups, minlength=len(GROUPS))
+        for g in np.unique(groups).tolist():
+            sel = groups == g
+            self.arrival_step[g].add_many(np.full(int(sel.sum()), self.step))
+            self.arrival_exposure[g].add_many(np.asarray(exposures)[sel])
+
+    def record(self, step):
+        if self.rows == len(self.steps):
+            grow = max(1, len(self.steps))
+            self.steps = np.concatenate([self.steps, np.zeros(grow, dtype=self.steps.dtype)])
+            for name in ("alive", "reached", "exposure"):
+                col = getattr(self, name)
+                setattr(self, name, np.concatenate([col, np.zeros((grow, col.shape[1]), dtype=col.dtype)]))
+        k = self.rows
+        self.steps[k] = step
+        self.alive[k] = self._alive
+        self.reached[k] = self._reached
+        self.exposure[k] = self._exposure
+        self.rows += 1
+
+    def totals(self):
+        # (alive, reached, avg_exposure) over all groups right now
+        total = max(1, int(self.n.sum()))
+        return int(self._alive.sum()), int(self._reached.sum()), float(self._exposure.sum()) / total
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99)):
+        out = {}
+        for g, name in enumerate(GROUPS):
+            n = int(self.n[g])
+            out[name] = {
+                "agents": n,
+                "reached": int(self._reached[g]),
+                "mean_exposure": float(self._exposure[g]) / n if n else None,
+                "arrival_step": {f"p{int(q * 100)}": self.arrival_step[g].quantile(q) for q in quantiles},
+                "arrival_exposure": {f"p{int(q * 100)}": self.arrival_exposure[g].quantile(q) for q in quantiles},
+            }
+        return out
+
+    def save(self, path):
+        # columnar: one array per metric, rows = recorded steps, columns = GROUPS
+        k = self.rows
+        qs = np.array([0.5, 0.9, 0.99])
+        arrival = np.array(
+            [[np.nan if s.quantile(q) is None else s.quantile(q) for q in qs] for s in self.arrival_step]
+        )
+        arrival_exp = np.array(
+            [[np.nan if s.quantile(q) is None else s.quantile(q) for q in qs] for s in self.arrival_exposure]
+        )
+        np.savez_compressed(
+            path,
+            groups=np.array(GROUPS),
+            agents=self.n,
+            step=self.steps[:k],
+            alive=self.alive[:k],
+            reached=self.reached[:k],
+            exposure_sum=self.exposure[:k],
+            quantiles=qs,
+            arrival_step_q=arrival,
+            arrival_exposure_q=arrival_exp,
+        )
+
+    def write_csv(self, path):
+        # legacy step,alive,reached,avg_exposure table
+        total = max(1, int(self.n.sum()))
+        k = self.rows
+        alive = self.alive[:k].sum(axis=1).tolist()
+        reached = self.reached[:k].sum(axis=1).tolist()
+        avg = (self.exposure[:k].sum(axis=1) / total).tolist()
+        with open(path, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["step", "alive", "reached", "avg_exposure"])
+            for row in zip(self.steps[:k].tolist(), alive, reached, avg):
+                w.writerow([row[0], row[1], row[2], f"{row[3]:.3f}"])
@@ -0,0 +1,330 @@
+# osm_ingest.py
+# Walk and drive graphs from a local OSM extract (.osm, .osm.bz2, .osm.gz or,
+# with pyosmium, .osm.pbf) without network access. Ways are streamed once and
+# filtered for both modes together; only the coordinates of nodes on kept ways
+# are retained, in flat arrays. Graphs follow osmnx (network_type walk/drive,
+# simplify=True, largest weakly connected component, UTM projection).
+import bz2
+import gzip
+import math
+import re
+import xml.etree.ElementTree as ET
+from array import array
+
+import numpy as np
+import geo
+from graph_core import CompiledGraph
+
+try:
+    import osmium
+except Exception:
+    osmium = None
+
+try:
+    from pyproj import CRS, Transformer
+except Exception:
+    CRS = None
+    Transformer = None
+
+try:
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+except Exception:
+    coo_matrix = None
+    connected_components = None
+
+# osmnx's overpass filters, applied to tag values as regex searches
+_ANY = {"area": re.compile("yes"), "access": re.compile("private")}
+_WALK = {
+    "highway": re.compile(
+        "abandoned|bus_guideway|construction|cycleway|motor|no|planned|platform|proposed|raceway|razed"
+    ),
+    "foot": re.compile("no"),
+    "service": re.compile("private"),
+}
+_DRIVE = {
+    "highway": re.compile(
+        "abandoned|bridleway|bus_guideway|construction|corridor|cycleway|elevator|escalator|footway|no|path|"
+        "pedestrian|planned|platform|proposed|raceway|razed|service|steps|track"
+    ),
+    "motor_vehicle": re.compile("no"),
+    "motorcar": re.compile("no"),
+    "service": re.compile("alley|driveway|emergency_access|parking|parking_aisle|private"),
+}
+WALK, DRIVE, FORWARD, BACKWARD = 1, 2, 4, 8
+# nodes buffered per vectorized lookup in the node pass
+_CHUNK = 1 << 20
+
+
+def _excluded(tags, rules):
+    for key, rx in rules.items():
+        v = tags.get(key)
+        if v is not None and rx.search(v):
+            return True
+    return False
+
+
+def way_flags(tags):
+    # WALK / DRIVE membership plus drive direction bits, 0 if neither mode
+    if "highway" not in tags or _excluded(tags, _ANY):
+        return 0
+    flags = 0
+    if not _excluded(tags, _WALK):
+        flags |= WALK
+    if not _excluded(tags, _DRIVE):
+        flags |= DRIVE
+        oneway = tags.get("oneway", "")
+        if oneway in ("-1", "reverse"):
+            flags |= BACKWARD
+        elif oneway in ("yes", "true", "1") or tags.get("junction") == "roundabout":
+            flags |= FORWARD
+        else:
+            flags |= FORWARD | BACKWARD
+    return flags
+
+
+def _open(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _iter_xml(path, tag):
+    # yield elements of one kind; everything parsed so far is released
+    with _open(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag == tag:
+                yield elem
+            if elem.tag in ("node", "way", "relation"):
+                elem.clear()
+                root.clear()
+
+
+class _Ways:
+    # kept ways as flat arrays: refs[ptr[k]:ptr[k + 1]] are the nodes of way k
+    def __init__(self):
+        self.refs = array("q")
+        self.ptr = array("q", [0])
+        self.flags = bytearray()
+        # per-ref coordinates, filled only by readers that carry locations
+        self.lon = array("d")
+        self.lat = array("d")
+
+    def add(self, refs, flags):
+        if len(refs) < 2:
+            return
+        self.refs.extend(refs)
+        self.ptr.append(len(self.refs))
+        self.flags.append(flags)
+
+
+def _read_xml(path):
+    ways = _Ways()
+    for elem in _iter_xml(path, "way"):
+        tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+        flags = way_flags(tags)
+        if flags:
+            ways.add([int(nd.get("ref")) for nd in elem.iter("nd")], flags)
+    refs = np.frombuffer(ways.refs, dtype=np.int64) if len(ways.refs) else np.empty(0, dtype=np.int64)
+    ids = np.unique(refs)
+    lonlat = np.full((len(ids), 2), np.nan)
+    buf_id, buf_lon, buf_lat = array("q"), array("d"), array("d")
+
+    def flush():
+        if not buf_id:
+            return
+        # copies, so the buffers can be emptied afterwards
+        nid = np.array(buf_id, dtype=np.int64)
+        k = np.minimum(np.searchsorted(ids, nid), max(0, len(ids) - 1))
+        hit = ids[k] == nid if len(ids) else np.zeros(len(nid), dtype=bool)
+        lonlat[k[hit], 0] = np.array(buf_lon, dtype=np.float64)[hit]
+        lonlat[k[hit], 1] = np.array(buf_lat, dtype=np.float64)[hit]
+        del buf_id[:], buf_lon[:], buf_lat[:]
+
+    if len(ids):
+        for elem in _iter_xml(path, "node"):
+            buf_id.append(int(elem.get("id")))
+            buf_lon.append(float(elem.get("lon")))
+            buf_lat.append(float(elem.get("lat")))
+            if len(buf_id) >= _CHUNK:
+                flush()
+        flush()
+    return ways, ids, lonlat
+
+
+def _read_pbf(path):
+    # one pass: pyosmium resolves node locations while streaming ways
+    ways = _Ways()
+
+    class Handler(osmium.SimpleHandler):
+        def way(self, w):
+            flags = way_flags({t.k: t.v for t in w.tags})
+            if not flags:
+                return
+            refs, lon, lat = [], [], []
+            for n in w.nodes:
+                # nodes missing from the extract are dropped like in XML
+                ok = n.location.valid()
+                refs.append(n.ref)
+                lon.append(n.location.lon if ok else math.nan)
+                lat.append(n.location.lat if ok else math.nan)
+            if len(refs) >= 2:
+                ways.add(refs, flags)
+                ways.lon.extend(lon)
+                ways.lat.extend(lat)
+
+    Handler().apply_file(path, locations=True, idx="flex_mem")
+    refs = np.frombuffer(ways.refs, dtype=np.int64) if len(ways.refs) else np.empty(0, dtype=np.int64)
+    ids, first = np.unique(refs, return_index=True)
+    lonlat = np.column_stack(
+        [np.frombuffer(ways.lon, dtype=np.float64)[first], np.frombuffer(ways.lat, dtype=np.float64)[first]]
+    ) if len(ids) else np.empty((0, 2))
+    return ways, ids, lonlat
+
+
+def _largest_component(n, src, dst):
+    # boolean mask of the nodes in the largest weakly connected component
+    if not len(src):
+        return np.zeros(n, dtype=bool)
+    if connected_components is not None:
+        g = coo_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+        _, label = connected_components(g, directed=True, connection="weak")
+    else:
+        # min-label propagation over both edge directions
+        label = np.arange(n)
+        while True:
+            prev = label
+            label = label.copy()
+            np.minimum.at(label, src, prev[dst])
+            np.minimum.at(label, dst, prev[src])
+            label = label[label]
+            if np.array_equal(label, prev):
+                break
+    used = np.zeros(n, dtype=bool)
+    used[src] = True
+    used[dst] = True
+    counts = np.bincount(label[used], minlength=n)
+    return label == np.argmax(counts)
+
+
+def _mode_edges(ways, node, lonlat, mode_bit, directed):
+    # simplified edges (u, v, length) over the compact node index for one mode
+    ptr = np.frombuffer(ways.ptr, dtype=np.int64)
+    flags = np.frombuffer(bytes(ways.flags), dtype=np.uint8)
+    sel = np.flatnonzero(flags & mode_bit)
+    if not len(sel):
+        e = np.empty(0, dtype=np.int64)
+        return e, e, np.empty(0)
+    lengths = ptr[sel + 1] - ptr[sel]
+    way = np.repeat(np.arange(len(sel)), lengths)
+    # positions of the selected ways' refs in the flat arrays
+    pos = np.repeat(ptr[sel] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    r = node[pos]
+    ok = r >= 0
+    # drop refs outside the kept node set, splitting ways there
+    way = np.where(ok, way, -1)
+    first = np.r_[True, way[1:] != way[:-1]]
+    last = np.r_[way[1:] != way[:-1], True]
+    # runs of refs between ends and dropped nodes; single-node runs carry
+    # no edge and do not make their node an intersection
+    run = np.cumsum(first)
+    ok &= np.bincount(run)[run] > 1
+    # graph nodes: way ends and nodes on more than one way (or twice on one)
+    count = np.bincount(r[ok], minlength=len(lonlat))
+    keep = ok & (first | last | (count[np.maximum(r, 0)] > 1))
+    ll = lonlat[np.maximum(r, 0)]
+    seg = np.zeros(len(r))
+    same = (way[1:] == way[:-1]) & ok[1:]
+    seg[1:][same] = geo.haversine_m(ll[:-1, 1][same], ll[:-1, 0][same], ll[1:, 1][same], ll[1:, 0][same])
+    cum = np.cumsum(seg)
+    k = np.flatnonzero(keep)
+    pair = run[k[1:]] == run[k[:-1]]
+    a, b = k[:-1][pair], k[1:][pair]
+    u, v, length = r[a], r[b], cum[b] - cum[a]
+    fwd = np.ones(len(u), dtype=bool)
+    bwd = np.ones(len(u), dtype=bool)
+    if directed:
+        wf = flags[sel][way[a]]
+        fwd = (wf & FORWARD) > 0
+        bwd = (wf & BACKWARD) > 0
+    src = np.concatenate([u[fwd], v[bwd]])
+    dst = np.concatenate([v[fwd], u[bwd]])
+    length = np.concatenate([length[fwd], length[bwd]])
+    loop = src == dst
+    src, dst, length = src[~loop], dst[~loop], length[~loop]
+    if not len(src):
+        return src, dst, length
+    # parallel edges collapse to the shortest, as in a DiGraph
+    order = np.lexsort((length, dst, src))
+    src, dst, length = src[order], dst[order], length[order]
+    uniq = np.r_[True, (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])]
+    return src[uniq], dst[uniq], length[uniq]
+
+
+def _project(lonlat):
+    # (xy, crs): UTM via pyproj when available, local metres otherwise
+    lon0 = float(np.nanmean(lonlat[:, 0])) if len(lonlat) else 0.0
+    lat0 = float(np.nanmean(lonlat[:, 1])) if len(lonlat) else 0.0
+    if Transformer is not None:
+        zone = int(math.floor((lon0 + 180.0) / 6.0)) + 1
+        crs = CRS.from_epsg((32600 if lat0 >= 0 else 32700) + zone)
+        x, y = Transformer.from_crs("EPSG:4326", crs, always_xy=True).transform(lonlat[:, 0], lonlat[:, 1])
+        return np.column_stack([x, y]).astype(np.float64), crs.to_wkt()
+    return geo.project_local(lonlat[:, 1], lonlat[:, 0], lat0, lon0), None
+
+
+def load(path, center=None, radius_m=None):
+    # (node_ids, xy, lonlat, graphs, crs) like graph_cache.load, or None when
+    # no walk or no drive edges are left within the radius
+    if path.endswith(".pbf"):
+        if osmium is None:
+            raise RuntimeError("reading .pbf extracts needs pyosmium")
+        ways, ids, lonlat = _read_pbf(path)
+    else:
+        ways, ids, lonlat = _read_xml(path)
+    if not len(ids):
+        return None
+    refs = np.frombuffer(ways.refs, dtype=np.int64)
+    valid = np.isfinite(lonlat).all(axis=1)
+    if center is not None and radius_m is not None:
+        valid &= geo.haversine_m(center[0], center[1], lonlat[:, 1], lonlat[:, 0]) <= radius_m
+    # compact index of every ref, -1 for nodes dropped above
+    node = np.searchsorted(ids, refs)
+    node = np.where(valid[node], node, -1)
+
+    edges = {}
+    used = np.zeros(len(ids), dtype=bool)
+    for mode, bit in (("walk", WALK), ("drive", DRIVE)):
+        src, dst, length = _mode_edges(ways, node, lonlat, bit, directed=mode == "drive")
+        comp = _largest_component(len(ids), src, dst)
+        m = comp[src] & comp[dst]
+        edges[mode] = (src[m], dst[m], length[m])
+        used[src[m]] = True
+        used[dst[m]] = True
+    if not all(len(src) for src, _, _ in edges.values()):
+        return None
+
+    # walk nodes first, then drive-only nodes, as the osmnx path orders them
+    walk_used = np.zeros(len(ids), dtype=bool)
+    walk_used[edges["walk"][0]] = True
+    walk_used[edges["walk"][1]] = True
+    keep = np.concatenate([np.flatnonzero(walk_used), np.flatnonzero(used & ~walk_used)])
+    remap = np.full(len(ids), -1, dtype=np.int64)
+    remap[keep] = np.arange(len(keep))
+    lonlat = lonlat[keep]
+    xy, crs = _project(lonlat)
+    graphs = {}
+    for mode, (src, dst, length) in edges.items():
+        s, d = remap[src], remap[dst]
+        delta = xy[d] - xy[s]
+        # proxy slope from geometry, as in the osmnx path
+        slope = np.abs(delta[:, 1]) / np.maximum(1e-6, np.hypot(delta[:, 0], delta[:, 1]))
+        nodes = np.unique(np.concatenate([s, d])).astype(np.int32)
+        graphs[mode] = CompiledGraph(len(keep), s, d, length, slope, nodes)
+    return ids[keep].tolist(), xy, lonlat, graphs, crs
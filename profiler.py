@@ -0,0 +1,131 @@
+# profiler.py
+import json
+import os
+import time
+from collections import defaultdict
+
+import config
+
+_clock = time.perf_counter
+
+
+class Profiler:
+    # Per-phase wall-clock timers and event counters, closed into one row per
+    # step by end_step(). Call sites use
+    #     t0 = PROFILER.start(); ...; PROFILER.stop("plan", t0)
+    #     PROFILER.count("replans")
+    # which reduce to an attribute check while disabled. Phases may nest
+    # ("move" includes "observe" and "plan"), so shares can sum past 1.
+    def __init__(self, enabled=False):
+        self.enabled = bool(enabled)
+        self._watched = []
+        self.reset()
+
+    def reset(self):
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counts = defaultdict(int)
+        self.total_times = defaultdict(float)
+        self.total_calls = defaultdict(int)
+        self.total_counts = defaultdict(int)
+        # (step, wall seconds, phase seconds, counters)
+        self.rows = []
+        self._mark()
+
+    def enable(self, on=True):
+        if on and not self.enabled:
+            self._mark()
+        self.enabled = bool(on)
+
+    def watch(self, counters):
+        # a dict of cumulative counters (e.g. routing.stats) sampled per step
+        self._watched.append((counters, dict(counters)))
+
+    def _mark(self):
+        self._watched = [(c, dict(c)) for c, _ in self._watched]
+        self._t0 = _clock()
+
+    def start(self):
+        return _clock() if self.enabled else 0.0
+
+    def stop(self, phase, t0):
+        if t0:
+            self.times[phase] += _clock() - t0
+            self.calls[phase] += 1
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counts[name] += n
+
+    def end_step(self, step):
+        if not self.enabled:
+            return
+        counts = self.counts
+        for counters, last in self._watched:
+            for k, v in counters.items():
+                if v != last.get(k, 0):
+                    counts[k] += v - last.get(k, 0)
+        now = _clock()
+        self.rows.append((step, now - self._t0, dict(self.times), dict(counts)))
+        for k, v in self.times.items():
+            self.total_times[k] += v
+        for k, v in self.calls.items():
+            self.total_calls[k] += v
+        for k, v in counts.items():
+            self.total_counts[k] += v
+        self.times.clear()
+        self.calls.clear()
+        counts.clear()
+        self._mark()
+
+    def summary(self):
+        # totals include phases timed since the last end_step (e.g. the
+        # final metrics write); wall time and rates cover closed steps
+        wall = sum(r[1] for r in self.rows)
+        steps = len(self.rows)
+        times = _merged(self.total_times, self.times)
+        calls = _merged(self.total_calls, self.calls)
+        phases = {}
+        for k in sorted(times, key=times.get, reverse=True):
+            t = times[k]
+            n = calls[k]
+            phases[k] = {
+                "total_s": t,
+                "calls": n,
+                "mean_us": 1e6 * t / n if n else 0.0,
+                "per_step_ms": 1e3 * t / steps if steps else 0.0,
+                "share": t / wall if wall else 0.0,
+            }
+        return {
+            "steps": steps,
+            "wall_s": wall,
+            "steps_per_s": steps / wall if wall else 0.0,
+            "phases": phases,
+            "counters": dict(sorted(_merged(self.total_counts, self.counts).items())),
+        }
+
+    def series(self):
+        # columnar per-step series; missing entries are 0
+        phases = sorted({k for r in self.rows for k in r[2]})
+        counters = sorted({k for r in self.rows for k in r[3]})
+        return {
+            "step": [r[0] for r in self.rows],
+            "wall_s": [r[1] for r in self.rows],
+            "phases": {k: [r[2].get(k, 0.0) for r in self.rows] for k in phases},
+            "counters": {k: [r[3].get(k, 0) for r in self.rows] for k in counters},
+        }
+
+    def dump(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "series": self.series()}, f)
+
+
+def _merged(total, pending):
+    out = dict(total)
+    for k, v in pending.items():
+        out[k] = out.get(k, 0) + v
+    return out
+
+
+PROFILER = Profiler(config.EVAC_PROFILE)
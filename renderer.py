@@ -0,0 +1,267 @@
+# renderer.py
+import multiprocessing as mp
+import os
+import queue
+
+import numpy as np
+import config
+
+BG_COLOR = "#0f1116"
+EDGE_COLOR = "#2f333a"
+BLOCKED_COLOR = "#b33939"
+ROUTE_COLOR = "#ff6b6b"
+PED_COLOR = "#ffd166"
+PED_DONE_COLOR = "#7f8c8d"
+CAR_COLOR = "#00b4d8"
+CAR_DONE_COLOR = "#95a5a6"
+SHUTTLE_COLOR = "#ff6b6b"
+SHELTER_COLOR = "#2ecc71"
+STOP_COLOR = "#f72585"
+
+
+def agent_positions(env, agents):
+    # (n, 2) positions, interpolated along each agent's current edge
+    if not agents:
+        return np.empty((0, 2))
+    idx = env.node_index
+    xy = env.xy[np.array([idx[a.node] for a in agents], dtype=np.int64)].copy()
+    on = [
+        k for k, a in enumerate(agents)
+        if a.edge_u is not None and a.edge_v is not None and a.edge_u in idx and a.edge_v in idx
+    ]
+    if not on:
+        return xy
+    u = np.array([idx[agents[k].edge_u] for k in on], dtype=np.int64)
+    v = np.array([idx[agents[k].edge_v] for k in on], dtype=np.int64)
+    progress = np.array([agents[k].edge_progress for k in on], dtype=np.float64)
+    walk = np.array([agents[k].mode == "walk" for k in on], dtype=bool)
+    length = np.zeros(len(on))
+    for mode, sel in (("walk", walk), ("drive", ~walk)):
+        if sel.any():
+            cg = env.compiled(mode)
+            e = cg.edge_ids(u[sel], v[sel])
+            length[sel] = np.where(e >= 0, cg.weight[np.maximum(e, 0)], 0.0)
+    ratio = np.where(length > 0, np.clip(progress / np.maximum(length, 1e-9), 0.0, 1.0), 0.0)
+    a = env.xy[u]
+    b = env.xy[v]
+    xy[np.array(on)] = a + (b - a) * ratio[:, None]
+    return xy
+
+
+def build_scene(env, shuttles, stops_xy=()):
+    # static layers as plain arrays (picklable for the render process)
+    idx = env.node_index
+    cg = env.compiled("walk")
+    routes = []
+    for b in shuttles:
+        pts = [idx[n] for n in b.route if n in idx]
+        if len(pts) >= 2:
+            routes.append(env.xy[pts].astype(np.float32))
+    shelters = [idx[s] for s in env.shelters if s in idx]
+    return {
+        "segments": np.stack([env.xy[cg.src], env.xy[cg.dst]], axis=1).astype(np.float32),
+        "blocked": np.array(cg.blocked, dtype=bool),
+        "routes": routes,
+        "shelters": env.xy[shelters].astype(np.float32),
+        "stops": np.asarray(stops_xy, dtype=np.float32).reshape(-1, 2),
+        "extent": (
+            (float(env.xy[:, 0].min()), float(env.xy[:, 0].max()), float(env.xy[:, 1].min()), float(env.xy[:, 1].max()))
+            if len(env.xy)
+            else None
+        ),
+        "stops_only": bool(getattr(config, "EVAC_SHOW_STOPS_ONLY", False)),
+    }
+
+
+def snapshot(sim, shuttles, step):
+    # dynamic state for one frame
+    env = sim.env
+    n_ped = len(sim.peds)
+    if sim.engine is not None:
+        xy = sim.engine.positions()
+        reached = sim.engine.reached
+        ped_xy, car_xy = xy[:n_ped], xy[n_ped:]
+        ped_done, car_done = reached[:n_ped], reached[n_ped:]
+    else:
+        ped_xy = agent_positions(env, sim.peds)
+        car_xy = agent_positions(env, sim.cars)
+        ped_done = np.array([a.reached for a in sim.peds], dtype=bool)
+        car_done = np.array([a.reached for a in sim.cars], dtype=bool)
+    return {
+        "step": step,
+        "ped_xy": np.asarray(ped_xy, dtype=np.float32),
+        "ped_done": np.array(ped_done, dtype=bool),
+        "car_xy": np.asarray(car_xy, dtype=np.float32),
+        "car_done": np.array(car_done, dtype=bool),
+        "shuttle_xy": agent_positions(env, shuttles).astype(np.float32),
+    }
+
+
+class Renderer:
+    # one figure; the walk network is a single LineCollection
+    def __init__(self, scene):
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+
+        self.plt = plt
+        self.scene = scene
+        self.fig, self.ax = plt.subplots()
+        ax = self.ax
+        ax.set_facecolor(BG_COLOR)
+        stops_only = scene["stops_only"]
+        if scene["extent"] is not None:
+            x0, x1, y0, y1 = scene["extent"]
+            ax.set_xlim(x0, x1)
+            ax.set_ylim(y0, y1)
+        if not stops_only:
+            colors = np.where(scene["blocked"], BLOCKED_COLOR, EDGE_COLOR)
+            ax.add_collection(LineCollection(scene["segments"], colors=colors, linewidths=0.7, alpha=0.7))
+            if scene["routes"]:
+                ax.add_collection(
+                    LineCollection(scene["routes"], colors=ROUTE_COLOR, linewidths=1.2, alpha=0.35, zorder=2)
+                )
+            if len(scene["shelters"]):
+                sh = scene["shelters"]
+                ax.scatter(sh[:, 0], sh[:, 1], c=SHELTER_COLOR, s=40, marker="P", zorder=5)
+        stops = scene["stops"]
+        if len(stops):
+            ax.scatter(
+                stops[:, 0], stops[:, 1], c=STOP_COLOR, s=40, marker="D", zorder=9,
+                alpha=1.0, linewidths=0.6, edgecolors="#ffffff",
+            )
+            if stops_only:
+                xpad = (stops[:, 0].max() - stops[:, 0].min()) * 0.05
+                ypad = (stops[:, 1].max() - stops[:, 1].min()) * 0.05
+                ax.set_xlim(stops[:, 0].min() - xpad, stops[:, 0].max() + xpad)
+                ax.set_ylim(stops[:, 1].min() - ypad, stops[:, 1].max() + ypad)
+        empty = np.empty((0, 2))
+        self.ped = ax.scatter(empty[:, 0], empty[:, 1], c=PED_COLOR, s=18, marker="o",
+                              edgecolors="#1a1a1a", linewidths=0.4, zorder=6)
+        self.car = ax.scatter(empty[:, 0], empty[:, 1], c=CAR_COLOR, s=28, marker="^",
+                              edgecolors="#1a1a1a", linewidths=0.4, zorder=7)
+        self.shuttle = ax.scatter(empty[:, 0], empty[:, 1], c=SHUTTLE_COLOR, s=46, marker="s",
+                                  edgecolors="#1a1a1a", linewidths=0.4, zorder=8)
+        self.title = ax.set_title("Evacuation Step 0", color="#e6e6e6", fontsize=12)
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.text(0.01, 0.01, "ped: ●  car: ▲  shuttle: ■  shelter: ✚  shuttle stop: ◆  blocked: red",
+                transform=ax.transAxes, fontsize=8, color="#cfd2d6", alpha=0.9)
+
+    def draw(self, snap):
+        self.title.set_text(f"Evacuation Step {snap['step']}")
+        if not self.scene["stops_only"]:
+            self.ped.set_offsets(snap["ped_xy"])
+            self.ped.set_color(np.where(snap["ped_done"], PED_DONE_COLOR, PED_COLOR))
+            self.car.set_offsets(snap["car_xy"])
+            self.car.set_color(np.where(snap["car_done"], CAR_DONE_COLOR, CAR_COLOR))
+            self.shuttle.set_offsets(snap["shuttle_xy"])
+        self.fig.canvas.draw_idle()
+
+
+class FrameSink:
+    # video file (.mp4/.mkv/.avi/.mov via ffmpeg, .gif via Pillow) or a PNG directory
+    def __init__(self, fig, out, fps=None, dpi=100):
+        from matplotlib import animation
+
+        self.fig = fig
+        self.out = out
+        self.count = 0
+        self.writer = None
+        fps = config.EVAC_RENDER_FPS if fps is None else fps
+        ext = os.path.splitext(out)[1].lower()
+        if ext in (".mp4", ".mkv", ".avi", ".mov"):
+            self.writer = animation.FFMpegWriter(fps=fps)
+        elif ext == ".gif":
+            self.writer = animation.PillowWriter(fps=fps)
+        if self.writer is not None:
+            os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+            self.writer.setup(fig, out, dpi=dpi)
+        else:
+            os.makedirs(out, exist_ok=True)
+
+    def write(self):
+        if self.writer is not None:
+            self.writer.grab_frame(facecolor=self.fig.get_facecolor())
+        else:
+            path = os.path.join(self.out, f"frame_{self.count:05d}.png")
+            self.fig.savefig(path, facecolor=self.fig.get_facecolor())
+        self.count += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.finish()
+
+
+class InlineView:
+    # draws in the simulation process (blocks on plt.pause when interactive)
+    def __init__(self, scene, out=None, interactive=True, fps=None):
+        self.renderer = Renderer(scene)
+        self.sink = FrameSink(self.renderer.fig, out, fps) if out else None
+        self.interactive = interactive
+        self.dropped = 0
+        if interactive:
+            self.renderer.plt.ion()
+
+    def submit(self, snap):
+        self.renderer.draw(snap)
+        if self.sink is not None:
+            self.sink.write()
+        if self.interactive:
+            self.renderer.plt.pause(0.001)
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+        if self.interactive:
+            self.renderer.plt.ioff()
+            self.renderer.plt.show()
+
+
+def _render_main(q, scene, out, interactive, fps):
+    if not interactive:
+        import matplotlib
+
+        matplotlib.use("Agg")
+    view = InlineView(scene, out, interactive, fps)
+    while True:
+        snap = q.get()
+        if snap is None:
+            break
+        view.submit(snap)
+    view.close()
+
+
+class RenderProcess:
+    # renders in a child process; frames are dropped rather than ever
+    # blocking the simulation when the renderer falls behind
+    def __init__(self, scene, out=None, interactive=True, fps=None, maxsize=None):
+        # the child re-imports config under "spawn", so settings are passed in
+        fps = config.EVAC_RENDER_FPS if fps is None else fps
+        maxsize = config.EVAC_RENDER_QUEUE if maxsize is None else maxsize
+        ctx = mp.get_context("spawn")
+        self.queue = ctx.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.proc = ctx.Process(target=_render_main, args=(self.queue, scene, out, interactive, fps), daemon=True)
+        self.proc.start()
+
+    def submit(self, snap):
+        try:
+            self.queue.put_nowait(snap)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.queue.put(None)
+        self.proc.join()
+
+
+def open_view(scene):
+    # EVAC_RENDER: "process", "inline" or "off"; EVAC_RENDER_OUT: video/frames path
+    mode = config.EVAC_RENDER
+    out = config.EVAC_RENDER_OUT
+    interactive = config.EVAC_RENDER_INTERACTIVE
+    if mode == "off" or (not out and not interactive):
+        return None
+    if mode == "inline":
+        return InlineView(scene, out, interactive)
+    return RenderProcess(scene, out, interactive)
@@ -0,0 +1,327 @@
+# routing.py
+import heapq
+import math
+from collections import OrderedDict
+
+import numpy as np
+from profiler import PROFILER
+
+# cumulative search counters
+stats = {"searches": 0, "expansions": 0, "repairs": 0, "expansions_saved": 0}
+PROFILER.watch(stats)
+
+
+def _unwind(parent, t):
+    path = [t]
+    while parent[path[-1]] != -1:
+        path.append(parent[path[-1]])
+    path.reverse()
+    return path
+
+
+def astar(cg, xs, ys, s, t, blocked=None):
+    # A* over compiled node ids; blocked is indexable by edge id (or None)
+    stats["searches"] += 1
+    if s == t:
+        return [s]
+    indptr, dst, cost = cg.adjacency()
+    scale = cg.heuristic_scale
+    tx = xs[t]
+    ty = ys[t]
+    hypot = math.hypot
+    push = heapq.heappush
+    pop = heapq.heappop
+    g = {s: 0.0}
+    parent = {s: -1}
+    closed = set()
+    heap = [(scale * hypot(xs[s] - tx, ys[s] - ty), 0.0, s)]
+    expansions = 0
+    found = False
+    while heap:
+        _, gu, u = pop(heap)
+        if u in closed:
+            continue
+        if u == t:
+            found = True
+            break
+        closed.add(u)
+        expansions += 1
+        for e in range(indptr[u], indptr[u + 1]):
+            if blocked is not None and blocked[e]:
+                continue
+            v = dst[e]
+            if v in closed:
+                continue
+            nv = gu + cost[e]
+            if nv < g.get(v, math.inf):
+                g[v] = nv
+                parent[v] = u
+                push(heap, (nv + scale * hypot(xs[v] - tx, ys[v] - ty), nv, v))
+    stats["expansions"] += expansions
+    if not found:
+        return []
+    return _unwind(parent, t)
+
+
+def reverse_tree(cg, t, blocked=None):
+    # Dijkstra toward t over in-edges; returns (dist, next_hop) lists
+    stats["searches"] += 1
+    rindptr, rsrc, reid = cg.reverse_adjacency()
+    _, _, cost = cg.adjacency()
+    n = cg.n_nodes
+    dist = [math.inf] * n
+    nxt = [-1] * n
+    dist[t] = 0.0
+    heap = [(0.0, t)]
+    push = heapq.heappush
+    pop = heapq.heappop
+    expansions = 0
+    while heap:
+        dv, v = pop(heap)
+        if dv > dist[v]:
+            continue
+        expansions += 1
+        for k in range(rindptr[v], rindptr[v + 1]):
+            e = reid[k]
+            if blocked is not None and blocked[e]:
+                continue
+            u = rsrc[k]
+            nu = dv + cost[e]
+            if nu < dist[u]:
+                dist[u] = nu
+                nxt[u] = v
+                push(heap, (nu, u))
+    stats["expansions"] += expansions
+    return dist, nxt
+
+
+class RouteCache:
+    # shared reverse shortest-path trees keyed by (goal, mode, blocked set);
+    # hazard changes invalidate only the trees they can affect
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._trees = OrderedDict()
+
+    def clear(self):
+        self._trees.clear()
+
+    def tree(self, cg, mode, t, blocked_ids=(), fingerprint=None):
+        # fingerprint: cg.fingerprint(blocked_ids) when the caller tracks it
+        if fingerprint is None:
+            fingerprint = cg.fingerprint(blocked_ids)
+        key = (t, mode, fingerprint)
+        entry = self._trees.get(key)
+        if entry is not None and entry["version"] == cg.version:
+            self.hits += 1
+            PROFILER.count("tree_hits")
+            self._trees.move_to_end(key)
+            return entry["tree"]
+        self.misses += 1
+        PROFILER.count("tree_misses")
+        blocked = None
+        if len(blocked_ids):
+            blocked = bytearray(cg.n_edges)
+            for e in blocked_ids:
+                blocked[e] = 1
+        tree = reverse_tree(cg, t, blocked)
+        self._trees[key] = {
+            "tree": tree,
+            "version": cg.version,
+            "dist": np.array(tree[0]),
+            "next": np.array(tree[1]),
+            "blocked": np.sort(np.asarray(blocked_ids, dtype=np.int64)),
+        }
+        self._trees.move_to_end(key)
+        if len(self._trees) > self.maxsize:
+            self._trees.popitem(last=False)
+        return tree
+
+    def apply(self, cg, change):
+        # drop trees touched by a hazards.HazardChange, keep the rest current
+        eids = change.eids
+        src = cg.src[eids]
+        dst = cg.dst[eids]
+        up = change.new_cost > change.old_cost
+        for key in [k for k in self._trees if k[1] == change.mode]:
+            entry = self._trees[key]
+            if entry["version"] != change.old_version:
+                continue
+            live = ~np.isin(eids, entry["blocked"])
+            dist = entry["dist"]
+            # a dearer edge matters only on the tree, a cheaper one only if
+            # it now gives its source a shorter route
+            hit = live & up & (entry["next"][src] == dst)
+            hit |= live & ~up & (dist[src] > change.new_cost + dist[dst])
+            if hit.any():
+                del self._trees[key]
+                self.invalidated += 1
+            else:
+                entry["version"] = change.version
+
+    def path(self, cg, mode, s, t, blocked_ids=(), fingerprint=None):
+        # node path s -> t read from the shared tree, [] if unreachable
+        dist, nxt = self.tree(cg, mode, t, blocked_ids, fingerprint)
+        if dist[s] == math.inf:
+            return []
+        path = [s]
+        while path[-1] != t:
+            path.append(nxt[path[-1]])
+        return path
+
+
+class DStarLite:
+    # incremental search toward a fixed goal; repairs after edge flips
+    def __init__(self, cg, xs, ys, goal, blocked_ids=()):
+        self.cg = cg
+        self.version = cg.version
+        self.xs = xs
+        self.ys = ys
+        self.goal = goal
+        # heuristic factor fixed for the life of the search
+        self.scale = cg.heuristic_scale
+        self.blocked = bytearray(cg.n_edges)
+        for e in blocked_ids:
+            self.blocked[e] = 1
+        self.blocked_ids = set(blocked_ids)
+        self.g = {}
+        self.rhs = {goal: 0.0}
+        self.km = 0.0
+        self.start = None
+        self.last = None
+        self._open = {}
+        self._heap = []
+        # expansions of the most recent full search (the replan baseline)
+        self.full_expansions = 0
+
+    def _h(self, a, b):
+        return self.scale * math.hypot(self.xs[a] - self.xs[b], self.ys[a] - self.ys[b])
+
+    def _key(self, s):
+        m = min(self.g.get(s, math.inf), self.rhs.get(s, math.inf))
+        return (m + self._h(self.start, s) + self.km, m)
+
+    def _push(self, s):
+        k = self._key(s)
+        self._open[s] = k
+        heapq.heappush(self._heap, (k, s))
+
+    def _update_vertex(self, u):
+        indptr, dst, cost = self.cg.adjacency()
+        if u != self.goal:
+            best = math.inf
+            g = self.g
+            blocked = self.blocked
+            for e in range(indptr[u], indptr[u + 1]):
+                if blocked[e]:
+                    continue
+                c = cost[e] + g.get(dst[e], math.inf)
+                if c < best:
+                    best = c
+            self.rhs[u] = best
+        self._open.pop(u, None)
+        if self.g.get(u, math.inf) != self.rhs.get(u, math.inf):
+            self._push(u)
+
+    def _top(self):
+        heap = self._heap
+        while heap and self._open.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _compute(self):
+        rindptr, rsrc, _ = self.cg.reverse_adjacency()
+        g = self.g
+        rhs = self.rhs
+        expansions = 0
+        while True:
+            top = self._top()
+            s = self.start
+            if top is None:
+                break
+            if not (top[0] < self._key(s) or rhs.get(s, math.inf) > g.get(s, math.inf)):
+                break
+            k_old, u = top
+            k_new = self._key(u)
+            if k_old < k_new:
+                self._push(u)
+                continue
+            heapq.heappop(self._heap)
+            del self._open[u]
+            expansions += 1
+            if g.get(u, math.inf) > rhs.get(u, math.inf):
+                g[u] = rhs[u]
+                for k in range(rindptr[u], rindptr[u + 1]):
+                    self._update_vertex(rsrc[k])
+            else:
+                g[u] = math.inf
+                self._update_vertex(u)
+                for k in range(rindptr[u], rindptr[u + 1]):
+                    self._update_vertex(rsrc[k])
+        stats["expansions"] += expansions
+        return expansions
+
+    def update_costs(self, eids):
+        # take in edge cost changes since self.version; False when the search
+        # must be rebuilt because its heuristic would no longer be admissible
+        if self.cg.heuristic_scale < self.scale:
+            return False
+        src = self.cg.src
+        for v in set(src[np.asarray(eids, dtype=np.int64)].tolist()):
+            self._update_vertex(v)
+        self.version = self.cg.version
+        return True
+
+    def plan(self, start):
+        # first full search from start
+        stats["searches"] += 1
+        self.start = start
+        self.last = start
+        self._push(self.goal)
+        self.full_expansions = self._compute()
+        return self.path()
+
+    def replan(self, start, blocked_ids):
+        # repair after the blocked set changed and/or the start moved
+        blocked_ids = set(blocked_ids)
+        changed = blocked_ids ^ self.blocked_ids
+        self.km += self._h(self.last, start)
+        self.last = start
+        self.start = start
+        src = self.cg.src
+        for e in changed:
+            self.blocked[e] = 1 if e in blocked_ids else 0
+        self.blocked_ids = blocked_ids
+        for e in changed:
+            self._update_vertex(int(src[e]))
+        expansions = self._compute()
+        stats["repairs"] += 1
+        stats["expansions_saved"] += max(0, self.full_expansions - expansions)
+        return self.path()
+
+    def path(self):
+        s = self.start
+        g = self.g
+        if min(g.get(s, math.inf), self.rhs.get(s, math.inf)) == math.inf:
+            return []
+        indptr, dst, cost = self.cg.adjacency()
+        path = [s]
+        seen = {s}
+        while s != self.goal:
+            best = math.inf
+            nxt = -1
+            for e in range(indptr[s], indptr[s + 1]):
+                if self.blocked[e]:
+                    continue
+                c = cost[e] + g.get(dst[e], math.inf)
+                if c < best:
+                    best = c
+                    nxt = dst[e]
+            if nxt < 0 or nxt in seen:
+                return []
+            path.append(nxt)
+            seen.add(nxt)
+            s = nxt
+        return path
@@ -0,0 +1,148 @@
+# shared_graph.py
+from multiprocessing import shared_memory
+
+import numpy as np
+import config
+from ch import CCH, CHRouter, Metric
+from evac_env import EvacEnv
+from graph_core import CompiledGraph, LabelIndex
+from spatial import GridIndex
+
+MODES = ("walk", "drive")
+# in CompiledGraph.from_csr argument order
+_COLUMNS = ("indptr", "src", "dst", "weight", "slope", "nodes", "_keys", "zobrist")
+_GRID = ("points", "order", "start")
+_METRIC = ("fwd", "bwd", "fmid", "bmid")
+_ALIGN = 64
+
+
+class _Source:
+    # the attributes EvacEnv(source=...) reads, backed by shared arrays
+    def __init__(self, spec, arrays, cfg):
+        meta = spec["meta"]
+        self.crs = meta["crs"]
+        self.graph_dir = meta["graph_dir"]
+        self.shelters = meta["shelters"]
+        if meta["node_ids"] is None:
+            # integer labels stay in the block: Python ints on indexing,
+            # looked up through the shared sort order
+            self.node_ids = memoryview(arrays["node_ids"])
+            self.node_index = LabelIndex(arrays["node_ids"], arrays["node_order"])
+        else:
+            self.node_ids = meta["node_ids"]
+            self.node_index = None
+        self.xy = arrays["xy"]
+        self.lonlat = arrays.get("lonlat")
+        self._pos = None
+        self.G_drive_ll = None
+        self._snap = None
+        n = len(self.node_ids)
+        self.graphs = {
+            mode: CompiledGraph.from_csr(n, *(arrays[f"{mode}_{col}"] for col in _COLUMNS)) for mode in MODES
+        }
+        self._obs_index = {}
+        for (mode, r), (cell, origin, nx, ny) in meta["grids"].items():
+            cols = [arrays[f"{mode}_grid_{name}"] for name in _GRID]
+            self._obs_index[(mode, r)] = GridIndex.from_arrays(cols[0], cell, origin, nx, ny, cols[1], cols[2])
+        self._ch = {}
+        for mode, has_base in meta["ch"].items():
+            cols = {name: arrays[f"{mode}_cch_{name}"] for name in CCH._ARRAYS}
+            tri = tuple(arrays[f"{mode}_cch_{name}"] for name in ("tri_vx", "tri_vy", "tri_xy"))
+            base = Metric(*(arrays[f"{mode}_cch_base_{name}"] for name in _METRIC)) if has_base else None
+            self._ch[mode] = CHRouter(CCH(tri=tri, **cols), base, cfg.EVAC_CH_CACHE_SIZE)
+
+
+class SharedGraph:
+    # Static arrays of an EvacEnv (node positions, CSR topology and edge
+    # columns of both modes, observation grids, any CCH already built) copied
+    # once into a multiprocessing.shared_memory block. spec is small and
+    # picklable; attach(spec) in a worker builds an EvacEnv whose static
+    # arrays are read-only views of the block, while hazards, costs, caches
+    # and agents stay private to the worker. The publisher owns the block and
+    # must close() it once the workers are done.
+    def __init__(self, env):
+        arrays = {"xy": np.asarray(env.xy, dtype=np.float64)}
+        try:
+            labels = np.asarray(env.node_ids, dtype=np.int64)
+            node_ids = None if labels.ndim == 1 else list(env.node_ids)
+        except (TypeError, ValueError):
+            labels, node_ids = None, list(env.node_ids)
+        if node_ids is None:
+            arrays["node_ids"] = labels
+            arrays["node_order"] = np.argsort(labels, kind="stable")
+        if env.lonlat is not None:
+            arrays["lonlat"] = np.asarray(env.lonlat, dtype=np.float64)
+        grids = {}
+        for mode in MODES:
+            cg = env.compiled(mode)
+            for col in _COLUMNS:
+                arrays[f"{mode}_{col}"] = getattr(cg, col)
+            grid = env._obs_grid(mode)
+            for name in _GRID:
+                arrays[f"{mode}_grid_{name}"] = getattr(grid, name)
+            grids[(mode, env.cfg.EVAC_OBS_RADIUS_M)] = (grid.cell, grid.origin.tolist(), grid.nx, grid.ny)
+        ch = {}
+        for mode, router in env._ch.items():
+            cch = router.cch
+            for name in CCH._ARRAYS:
+                arrays[f"{mode}_cch_{name}"] = getattr(cch, name)
+            for name, arr in zip(("tri_vx", "tri_vy", "tri_xy"), cch.tri):
+                arrays[f"{mode}_cch_{name}"] = arr
+            if router.base is not None:
+                for name in _METRIC:
+                    arrays[f"{mode}_cch_base_{name}"] = getattr(router.base, name)
+            ch[mode] = router.base is not None
+
+        layout = {}
+        size = 0
+        for key, arr in arrays.items():
+            arr = np.asarray(arr)
+            layout[key] = (size, arr.dtype.str, arr.shape)
+            size += -(-arr.nbytes // _ALIGN) * _ALIGN
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for key, arr in arrays.items():
+            off, dtype, shape = layout[key]
+            np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=off)[...] = arr
+        self.nbytes = size
+        self.spec = {
+            "name": self.shm.name,
+            "layout": layout,
+            "meta": {
+                "crs": None if env.crs is None else (env.crs.to_wkt() if hasattr(env.crs, "to_wkt") else str(env.crs)),
+                "graph_dir": env.graph_dir,
+                # pickled as is: a rebuilt set may iterate in another order
+                "shelters": env.shelters,
+                "node_ids": node_ids,
+                "grids": grids,
+                "ch": ch,
+            },
+        }
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(spec, cfg=None):
+    # EvacEnv over the published block; the mapping lives as long as the env
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    arrays = {}
+    for key, (off, dtype, shape) in spec["layout"].items():
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)
+        arr.flags.writeable = False
+        arrays[key] = arr
+    env = EvacEnv(source=_Source(spec, arrays, config if cfg is None else cfg), cfg=cfg)
+    env._shared = shm
+    return env
@@ -0,0 +1,102 @@
+# simulation.py
+import random
+import numpy as np
+from agents.ped_agent import PedAgent
+from agents.car_agent import CarAgent
+from engine import StepEngine
+from event_sim import EventEngine
+from metrics import MetricsRecorder
+from profiler import PROFILER
+
+
+def spawn_agents(env):
+    # pedestrians and cars at random start nodes with faculty/staff roles
+    cfg = env.cfg
+    peds = []
+    cars = []
+    # compiled node sets, in the networkx views' node order
+    ids = env.node_ids
+    nodes_walk = env.compiled("walk").nodes
+    nodes_drive = env.compiled("drive").nodes
+    for i in range(cfg.EVAC_PED_COUNT):
+        start = ids[int(random.choice(nodes_walk))]
+        ped = PedAgent(i + 1, start, env)
+        ped.role = "faculty" if random.random() < cfg.EVAC_FACULTY_RATIO else "staff"
+        peds.append(ped)
+    for i in range(cfg.EVAC_CAR_COUNT):
+        start = ids[int(random.choice(nodes_drive))]
+        car = CarAgent(i + 1, start, env)
+        car.role = "faculty" if random.random() < cfg.EVAC_FACULTY_RATIO else "staff"
+        cars.append(car)
+    return peds, cars
+
+
+def shelter_goals(env):
+    shelters = list(env.shelters)
+    cg = env.compiled("drive")
+    on_drive = np.zeros(cg.n_nodes, dtype=bool)
+    on_drive[cg.nodes] = True
+    idx = env.node_index
+    shelters_drive = [s for s in shelters if s in idx and on_drive[idx[s]]]
+    if not shelters_drive:
+        shelters_drive = [env.node_ids[i] for i in cg.nodes.tolist()]
+    return shelters, shelters_drive
+
+
+class Simulation:
+    # pedestrians and cars heading to shelters; shuttles are stepped by the caller
+    def __init__(self, env, peds, cars):
+        self.env = env
+        self.cfg = env.cfg
+        self.peds = peds
+        self.cars = cars
+        self.shelters, self.shelters_drive = shelter_goals(env)
+        self.step_idx = 0
+        self.metrics = MetricsRecorder(peds + cars, self.cfg.EVAC_STEP_LIMIT)
+        self.engine = None
+        if self.cfg.EVAC_ENGINE in ("arrays", "events"):
+            # congestion rescales speeds every step, which the event engine
+            # cannot schedule ahead; it steps those runs like "arrays"
+            cls = StepEngine
+            if self.cfg.EVAC_ENGINE == "events" and not self.cfg.EVAC_CONGESTION:
+                cls = EventEngine
+            goals = [self.goal(a) for a in peds + cars]
+            self.engine = cls.from_agents(env, peds + cars, goals, self.metrics)
+
+    def goal(self, a):
+        goals = self.shelters if a.mode == "walk" else self.shelters_drive
+        if not goals:
+            return None
+        return goals[a.id % len(goals)]
+
+    def step(self):
+        self.env.begin_step(self.step_idx)
+        self.metrics.step = self.step_idx
+        if self.engine is not None:
+            t0 = PROFILER.start()
+            self.engine.step()
+            PROFILER.stop("move", t0)
+        else:
+            if self.cfg.EVAC_CONGESTION:
+                t0 = PROFILER.start()
+                self.env.congestion.update_agents(self.peds + self.cars, self.step_idx, self.env.hazards)
+                PROFILER.stop("congestion", t0)
+            t0 = PROFILER.start()
+            if self.shelters:
+                for a in self.peds:
+                    a.step(self.goal(a))
+            if self.shelters_drive:
+                for a in self.cars:
+                    a.step(self.goal(a))
+            PROFILER.stop("move", t0)
+        self.metrics.record(self.step_idx)
+        self.step_idx += 1
+
+    def sync(self):
+        # bring agent objects up to date with the array engine
+        if self.engine is not None:
+            self.engine.write_back(self.peds + self.cars)
+
+    def counts(self):
+        # (alive, reached, avg_exposure) over pedestrians and cars
+        return self.metrics.totals()
@@ -0,0 +1,309 @@
+# snapshot.py
+# Mid-run snapshots and what-if branches. A snapshot is one compressed blob
+# holding the env's dynamic state (hazard fields and streams, congestion,
+# observation rng, step), the global random / numpy random states, and any
+# picklable objects bound to the env (Simulation, shuttles, ...). The static
+# graph is not copied: references to it are stored by name and resolved
+# against the env the blob is restored into.
+#
+#   python snapshot.py --at 200 --branches 8 --close 5
+import argparse
+import io
+import json
+import os
+import pickle
+import random
+import sys
+import time
+import traceback
+import zlib
+
+import numpy as np
+from event_sim import step_shuttles
+
+MAGIC = b"EVSNAP"
+FORMAT_VERSION = 1
+MODES = ("walk", "drive")
+
+
+def _shape(env):
+    return [len(env.node_ids)] + [env.compiled(mode).n_edges for mode in MODES]
+
+
+def _shared(env):
+    # env-owned objects pickled by reference: name -> object
+    out = {
+        "env": env,
+        "cfg": env.cfg,
+        "xs": env.xs,
+        "ys": env.ys,
+        "xy": env.xy,
+        "node_ids": env.node_ids,
+        "node_index": env.node_index,
+        "shelters": env.shelters,
+        "hazards": env.hazards,
+        "congestion": env.congestion,
+        "route_cache": env.route_cache,
+    }
+    for mode in MODES:
+        out["cg_" + mode] = env.compiled(mode)
+        if mode in env._nx:
+            out["nx_" + mode] = env._nx[mode]
+    return out
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, f, env):
+        super().__init__(f, pickle.HIGHEST_PROTOCOL)
+        self._names = {id(obj): name for name, obj in _shared(env).items()}
+
+    def persistent_id(self, obj):
+        return self._names.get(id(obj))
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, f, env):
+        super().__init__(f)
+        self._env = env
+
+    def persistent_load(self, pid):
+        if pid.startswith("nx_"):
+            return self._env._networkx(pid[3:])
+        shared = _shared(self._env)
+        if pid not in shared:
+            raise pickle.UnpicklingError(f"unknown env reference {pid!r}")
+        return shared[pid]
+
+
+def _env_state(env):
+    hz = env.hazards
+    graphs = {}
+    for mode in MODES:
+        cg = env.compiled(mode)
+        graphs[mode] = {
+            "blocked": np.packbits(cg.blocked),
+            "snow": cg.snow.copy(),
+            "delay": cg.delay.copy(),
+            "cost": cg.cost.copy(),
+            "version": cg.version,
+        }
+    return {
+        "t": env.t,
+        "rng": env.rng.bit_generator.state,
+        "graphs": graphs,
+        "hazard_init_rng": {m: g.bit_generator.state for m, g in hz._init_rng.items()},
+        "hazard_dyn_rng": {m: g.bit_generator.state for m, g in hz._dyn_rng.items()},
+        "hazard_rate": {m: r.copy() for m, r in hz.rate.items()},
+        "hazard_log": {m: list(log) for m, log in hz.log.items()},
+        "occupancy": {m: o.copy() for m, o in env.congestion.occupancy.items()},
+        "factor": {m: f.copy() for m, f in env.congestion.factor.items()},
+    }
+
+
+def _set_env_state(env, state):
+    hz = env.hazards
+    for mode in MODES:
+        cg = env.compiled(mode)
+        g = state["graphs"][mode]
+        cg.blocked[:] = np.unpackbits(g["blocked"], count=cg.n_edges).astype(bool)
+        cg.snow[:] = g["snow"]
+        cg.delay[:] = g["delay"]
+        cg.cost[:] = g["cost"]
+        cg._update_heuristic()
+        # versions rewind with the costs, so every cache keyed on a version
+        # is dropped rather than trusted
+        cg.version = g["version"]
+        cg._adj = None
+    for router in env._ch.values():
+        router._metrics.clear()
+    env.route_cache.clear()
+    env._obs_cache.clear()
+    env.t = state["t"]
+    env.rng.bit_generator.state = state["rng"]
+    for m, s in state["hazard_init_rng"].items():
+        hz._init_rng[m].bit_generator.state = s
+    for m, s in state["hazard_dyn_rng"].items():
+        hz._dyn_rng[m].bit_generator.state = s
+    hz.rate = {m: r.copy() for m, r in state["hazard_rate"].items()}
+    for m, log in hz.log.items():
+        log.clear()
+        log.extend(state["hazard_log"][m])
+    env.congestion.occupancy = {m: o.copy() for m, o in state["occupancy"].items()}
+    env.congestion.factor = {m: f.copy() for m, f in state["factor"].items()}
+
+
+def capture(env, objects=None, level=1):
+    # bytes; objects is anything picklable that refers to env (e.g. (sim, shuttles))
+    buf = io.BytesIO()
+    _Pickler(buf, env).dump(objects)
+    state = {
+        "format": FORMAT_VERSION,
+        "shape": _shape(env),
+        "env": _env_state(env),
+        "random": random.getstate(),
+        "np_random": np.random.get_state(),
+        "objects": buf.getvalue(),
+    }
+    return MAGIC + zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL), level)
+
+
+def restore(blob, env, objects=True):
+    # puts env and the global random streams back to the captured state and
+    # returns fresh copies of the captured objects (None if objects=False)
+    if not blob.startswith(MAGIC):
+        raise ValueError("not a simulation snapshot")
+    state = pickle.loads(zlib.decompress(blob[len(MAGIC) :]))
+    if state.get("format") != FORMAT_VERSION:
+        raise ValueError(f"snapshot format {state.get('format')} is not {FORMAT_VERSION}")
+    if state["shape"] != _shape(env):
+        raise ValueError(f"snapshot of a graph shaped {state['shape']}, env is {_shape(env)}")
+    _set_env_state(env, state["env"])
+    random.setstate(state["random"])
+    np.random.set_state(state["np_random"])
+    if not objects:
+        return None
+    return _Unpickler(io.BytesIO(state["objects"]), env).load()
+
+
+def save(path, blob):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+    os.replace(tmp, path)
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def fork(env, objects, branches, run, workers=None):
+    # [run(env, objects, branch) for branch in branches], every branch
+    # starting from the current state. Forked children share the parent's
+    # memory copy-on-write; without os.fork (or with EVAC_FORK off) branches
+    # replay in turn from a snapshot. Either way the caller's env and objects
+    # are left as they were. Fork settings come from env.cfg.
+    cfg = env.cfg
+    if workers is None:
+        workers = cfg.EVAC_FORK_WORKERS or os.cpu_count() or 1
+    if cfg.EVAC_FORK and hasattr(os, "fork") and len(branches) > 1:
+        return _fork_all(env, objects, branches, run, max(1, workers))
+    blob = capture(env, objects)
+    try:
+        return [run(env, restore(blob, env), branch) for branch in branches]
+    finally:
+        restore(blob, env, objects=False)
+
+
+def _fork_all(env, objects, branches, run, workers):
+    results = [None] * len(branches)
+    errors = []
+    pending = list(enumerate(branches))
+    running = []
+    sys.stdout.flush()
+    sys.stderr.flush()
+    while pending or running:
+        while pending and len(running) < workers:
+            k, branch = pending.pop(0)
+            r, w = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(r)
+                code = 0
+                try:
+                    out = ("ok", run(env, objects, branch))
+                except BaseException:
+                    out = ("error", traceback.format_exc())
+                    code = 1
+                with os.fdopen(w, "wb") as f:
+                    pickle.dump(out, f, pickle.HIGHEST_PROTOCOL)
+                sys.stdout.flush()
+                os._exit(code)
+            os.close(w)
+            running.append((pid, k, r))
+        # drain the pipe before reaping so a large result cannot block the child
+        pid, k, r = running.pop(0)
+        with os.fdopen(r, "rb") as f:
+            data = f.read()
+        os.waitpid(pid, 0)
+        status, value = pickle.loads(data) if data else ("error", "branch exited without a result")
+        if status == "ok":
+            results[k] = value
+        else:
+            errors.append((k, value))
+    if errors:
+        k, tb = errors[0]
+        raise RuntimeError(f"branch {k} failed:\n{tb}")
+    return results
+
+
+def advance(sim, shuttles, stop):
+    # step sim (and shuttles, as evacuation_main does) until step index stop
+    while sim.step_idx < stop:
+        step = sim.step_idx
+        sim.step()
+        if sim.cfg.EVAC_ENGINE == "events":
+            step_shuttles(shuttles, step)
+        else:
+            for b in shuttles:
+                b.step()
+
+
+def _close_branch(env, objects, branch):
+    sim, shuttles = objects
+    k, n_close, at = branch
+    if k and n_close:
+        # branch 0 is the untouched baseline
+        cg = env.compiled("drive")
+        rng = np.random.default_rng(k)
+        env.hazards.close("drive", rng.choice(cg.n_edges, min(n_close, cg.n_edges), replace=False), at)
+    t0 = time.perf_counter()
+    advance(sim, shuttles, sim.cfg.EVAC_STEP_LIMIT)
+    alive, reached, avg_exp = sim.counts()
+    return {
+        "branch": k,
+        "closed": n_close if k else 0,
+        "alive": alive,
+        "reached": reached,
+        "avg_exposure": avg_exp,
+        "wall_s": time.perf_counter() - t0,
+    }
+
+
+def main():
+    from evac_env import EvacEnv
+    from simulation import Simulation, spawn_agents
+
+    parser = argparse.ArgumentParser(description="What-if branches off one shared simulation prefix")
+    parser.add_argument("--at", type=int, default=200, help="step the branches split at")
+    parser.add_argument("--branches", type=int, default=8, help="including the untouched baseline")
+    parser.add_argument("--close", type=int, default=5, help="random drive edges closed per branch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default=os.path.join("logs", "what_if.json"))
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    env = EvacEnv()
+    env.reset(args.seed)
+    peds, cars = spawn_agents(env)
+    sim = Simulation(env, peds, cars)
+    t0 = time.perf_counter()
+    advance(sim, [], min(args.at, sim.cfg.EVAC_STEP_LIMIT))
+    prefix_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    branches = [(k, args.close, sim.step_idx) for k in range(args.branches)]
+    results = fork(env, (sim, []), branches, _close_branch, args.workers)
+    branch_s = time.perf_counter() - t0
+    for r in results:
+        print(f"[what-if] branch {r['branch']}: closed {r['closed']}, reached {r['reached']}/{r['alive']}, "
+              f"avg exposure {r['avg_exposure']:.2f}")
+    print(f"[what-if] prefix {prefix_s:.2f}s once, {len(results)} branches {branch_s:.2f}s")
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"at": sim.step_idx, "prefix_s": prefix_s, "branch_s": branch_s, "branches": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# spatial.py
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except Exception:
+    cKDTree = None
+
+
+class GridIndex:
+    # uniform-grid bucket index over 2D points (projected metres)
+    def __init__(self, points, cell):
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.points = pts
+        self.cell = float(max(cell, 1e-6))
+        if len(pts):
+            self.origin = pts.min(axis=0)
+            span = pts.max(axis=0) - self.origin
+        else:
+            self.origin = np.zeros(2)
+            span = np.zeros(2)
+        self.nx = int(span[0] // self.cell) + 1
+        self.ny = int(span[1] // self.cell) + 1
+        cx, cy = self._cells(pts)
+        keys = cx * self.ny + cy
+        self.order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self.order]
+        # start[k]..start[k + 1] are the points of cell k in self.order
+        self.start = np.searchsorted(sorted_keys, np.arange(self.nx * self.ny + 1))
+
+    @classmethod
+    def from_arrays(cls, points, cell, origin, nx, ny, order, start):
+        # rebuild around existing (e.g. shared) arrays without re-sorting
+        self = cls.__new__(cls)
+        self.points = points
+        self.cell = float(cell)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.nx = int(nx)
+        self.ny = int(ny)
+        self.order = order
+        self.start = start
+        return self
+
+    def _cells(self, pts):
+        c = np.floor((pts - self.origin) / self.cell).astype(np.int64)
+        return np.clip(c[:, 0], 0, self.nx - 1), np.clip(c[:, 1], 0, self.ny - 1)
+
+    def query_radius(self, x, y, r):
+        # indices of points within r of (x, y), ascending
+        if not len(self.points):
+            return np.empty(0, dtype=np.int64)
+        lo = np.floor((np.array([x - r, y - r]) - self.origin) / self.cell).astype(np.int64)
+        hi = np.floor((np.array([x + r, y + r]) - self.origin) / self.cell).astype(np.int64)
+        x0, y0 = max(lo[0], 0), max(lo[1], 0)
+        x1, y1 = min(hi[0], self.nx - 1), min(hi[1], self.ny - 1)
+        if x0 > x1 or y0 > y1:
+            return np.empty(0, dtype=np.int64)
+        parts = []
+        for cx in range(x0, x1 + 1):
+            # cells of one grid column are contiguous in key order
+            a = self.start[cx * self.ny + y0]
+            b = self.start[cx * self.ny + y1 + 1]
+            if b > a:
+                parts.append(self.order[a:b])
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        cand = np.concatenate(parts)
+        p = self.points[cand]
+        d2 = (p[:, 0] - x) ** 2 + (p[:, 1] - y) ** 2
+        return np.sort(cand[d2 <= r * r])
+
+
+class NearestIndex:
+    # batched nearest-point queries: scipy KD-tree when available, chunked
+    # brute force otherwise
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self._tree = cKDTree(self.points) if cKDTree is not None and len(self.points) else None
+
+    def query(self, queries):
+        # (index, euclidean distance) per query row
+        q = np.asarray(queries, dtype=np.float64).reshape(-1, 2)
+        if not len(self.points):
+            return np.full(len(q), -1, dtype=np.int64), np.full(len(q), np.inf)
+        if self._tree is not None:
+            d, k = self._tree.query(q)
+            return np.asarray(k, dtype=np.int64), np.asarray(d, dtype=np.float64)
+        idx = np.empty(len(q), dtype=np.int64)
+        dist = np.empty(len(q), dtype=np.float64)
+        p = self.points
+        # bound the (chunk x points) distance block to a few million entries
+        chunk = max(1, 4000000 // len(p))
+        for a in range(0, len(q), chunk):
+            b = q[a : a + chunk]
+            d2 = (b[:, 0:1] - p[None, :, 0]) ** 2 + (b[:, 1:2] - p[None, :, 1]) ** 2
+            k = np.argmin(d2, axis=1)
+            idx[a : a + chunk] = k
+            dist[a : a + chunk] = np.sqrt(d2[np.arange(len(b)), k])
+        return idx, dist
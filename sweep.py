@@ -0,0 +1,238 @@
+# sweep.py
+# Parameter sweeps over config settings. A design (full grid or Latin
+# hypercube) expands to cells of setting overrides; every (cell, seed) pair
+# runs one evac_montecarlo episode under its own config object. Results are
+# stored under a hash of the fully resolved settings and the seed, so an
+# interrupted or extended sweep only runs the missing pairs. Cells that agree
+# on the area settings share one compiled graph per process.
+#
+#   python sweep.py EVAC_BLOCK_PROB=0.02,0.05,0.1 EVAC_SNOW_ALPHA=0.5,1.0 --seeds 4
+#   python sweep.py --design lhs --samples 16 EVAC_BLOCK_PROB=0.0:0.2 EVAC_OBS_RADIUS_M=50:200
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import config
+from evac_env import EvacEnv
+from evac_montecarlo import run_episode, summarize
+
+FORMAT_VERSION = 1
+# settings that decide the graph and the shelters; cells equal on these share
+# one built environment
+AREA = (
+    "EVAC_USE_OSM",
+    "EVAC_PLACE",
+    "EVAC_FALLBACK_CENTER",
+    "EVAC_RADIUS_M",
+    "EVAC_OSM_EXTRACT_PATH",
+    "EVAC_OSM_EXTRACT_RADIUS_M",
+    "EVAC_GRID_SIZE",
+    "EVAC_GRID_STEP",
+    "EVAC_SHELTER_COUNT",
+)
+# settings that cannot change an episode's result, left out of cache keys
+_NOT_HASHED = {
+    "EVAC_OSM_TIMEOUT_S",
+    "EVAC_OSM_USE_CACHE",
+    "EVAC_GRAPH_CACHE",
+    "EVAC_GRAPH_CACHE_DIR",
+    "EVAC_SHARED_GRAPH",
+    "EVAC_DRAW_EVERY",
+    "EVAC_RENDER",
+    "EVAC_RENDER_INTERACTIVE",
+    "EVAC_RENDER_OUT",
+    "EVAC_RENDER_FPS",
+    "EVAC_RENDER_QUEUE",
+    "EVAC_PROFILE",
+    "EVAC_PROFILE_OUT",
+    "EVAC_ROUTE_CACHE_SIZE",
+    "EVAC_CH_CACHE_SIZE",
+    "EVAC_BUS_FEED_CACHE_DIR",
+    "EVAC_BUS_ROUTE_CACHE_DIR",
+    "EVAC_FORK",
+    "EVAC_FORK_WORKERS",
+    "EVAC_SWEEP_CACHE_DIR",
+}
+
+# (area key, base seed) -> EvacEnv whose graph, indexes and shelters the
+# cells clone
+_BASES = {}
+
+
+def grid(space):
+    # space: name -> list of values; every combination, names in sorted order
+    names = sorted(space)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(space[n] for n in names))]
+
+
+def lhs(space, n, seed=0):
+    # space: name -> (lo, hi) range, integer when both ends are ints, or a
+    # list of choices; n cells, one per stratum of every dimension
+    rng = np.random.default_rng(seed)
+    cells = [{} for _ in range(n)]
+    for name in sorted(space):
+        spec = space[name]
+        u = (rng.permutation(n) + rng.random(n)) / n
+        if isinstance(spec, tuple):
+            lo, hi = spec
+            if isinstance(lo, int) and isinstance(hi, int):
+                vals = np.minimum(lo + np.floor(u * (hi - lo + 1)), hi).astype(np.int64).tolist()
+            else:
+                vals = (lo + u * (hi - lo)).tolist()
+        else:
+            vals = [spec[int(x * len(spec))] for x in u]
+        for cell, v in zip(cells, vals):
+            cell[name] = v
+    return cells
+
+
+def settings(cfg):
+    return {k: v for k, v in vars(cfg).items() if k.startswith("EVAC_")}
+
+
+def cell_key(cfg, seed, base_seed=0):
+    values = {k: v for k, v in settings(cfg).items() if k not in _NOT_HASHED}
+    blob = json.dumps(
+        {"format": FORMAT_VERSION, "seed": seed, "base_seed": base_seed, "settings": values},
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def area_key(cfg):
+    return json.dumps([getattr(cfg, k) for k in AREA], default=repr)
+
+
+def _cache_file(root, key):
+    return os.path.join(root, key[:2], key + ".json")
+
+
+def _load(root, key):
+    try:
+        with open(_cache_file(root, key)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _store(root, key, result):
+    path = _cache_file(root, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp, path)
+
+
+def _cell_env(cfg, base_seed):
+    key = (area_key(cfg), base_seed)
+    base = _BASES.get(key)
+    if base is None:
+        # seeded like evac_montecarlo.run with the same base seed, so shelters
+        # do not depend on which cell reaches an area first
+        random.seed(base_seed)
+        base = _BASES[key] = EvacEnv(cfg=cfg)
+    return base, EvacEnv(source=base, cfg=cfg)
+
+
+def run_cell(cfg, seed, base_seed=0):
+    # cfg is the resolved settings object, so workers run exactly what the
+    # parent hashed
+    base, env = _cell_env(cfg, base_seed)
+    result = run_episode(seed, env=env)
+    # contraction hierarchies built by this cell serve later clones too
+    for mode, router in env._ch.items():
+        base._ch.setdefault(mode, router)
+    return result
+
+
+def run(cells, seeds, workers=1, cache_dir=None, refresh=False, base_seed=0):
+    root = config.EVAC_SWEEP_CACHE_DIR if cache_dir is None else cache_dir
+    cfgs = [config.make_config(**cell) for cell in cells]
+    results = {}
+    jobs = []
+    for i, cfg in enumerate(cfgs):
+        for s in seeds:
+            key = cell_key(cfg, s, base_seed)
+            hit = None if refresh else _load(root, key)
+            if hit is None:
+                jobs.append((i, s, key))
+            else:
+                results[(i, s)] = hit
+    cached = len(results)
+    # grouped by area so each process builds a graph once per area
+    jobs.sort(key=lambda job: area_key(cfgs[job[0]]))
+    if workers == 1:
+        for i, s, key in jobs:
+            results[(i, s)] = run_cell(cfgs[i], s, base_seed)
+            _store(root, key, results[(i, s)])
+    elif jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_cell, cfgs[i], s, base_seed): (i, s, key) for i, s, key in jobs}
+            for fut in as_completed(futures):
+                i, s, key = futures[fut]
+                results[(i, s)] = fut.result()
+                _store(root, key, results[(i, s)])
+    out = []
+    for i, cell in enumerate(cells):
+        summary = summarize([results[(i, s)] for s in seeds], cfgs[i])
+        out.append({"settings": cell, **summary})
+    return {"cells": out, "ran": len(jobs), "cached": cached}
+
+
+def _value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_space(params, design):
+    # NAME=a,b,c lists values (choices for lhs); NAME=lo:hi is an lhs range
+    space = {}
+    for p in params:
+        name, _, spec = p.partition("=")
+        if name not in vars(config) or not name.startswith("EVAC_"):
+            raise SystemExit(f"unknown setting {name!r}")
+        if design == "lhs" and ":" in spec:
+            lo, hi = spec.split(":", 1)
+            space[name] = (_value(lo), _value(hi))
+        else:
+            space[name] = [_value(v) for v in spec.split(",")]
+    return space
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter sweeps with a content-addressed result cache")
+    parser.add_argument("params", nargs="+", help="NAME=v1,v2,... or, for lhs, NAME=lo:hi")
+    parser.add_argument("--design", choices=("grid", "lhs"), default="grid")
+    parser.add_argument("--samples", type=int, default=16, help="lhs cells")
+    parser.add_argument("--seeds", type=int, default=4, help="episodes per cell")
+    parser.add_argument("--seed", type=int, default=0, help="first episode seed, base seed and lhs seed")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--refresh", action="store_true", help="rerun cached pairs")
+    parser.add_argument("--out", default=os.path.join("logs", "sweep_summary.json"))
+    args = parser.parse_args()
+
+    space = parse_space(args.params, args.design)
+    cells = grid(space) if args.design == "grid" else lhs(space, args.samples, args.seed)
+    seeds = [args.seed + k for k in range(args.seeds)]
+    summary = run(cells, seeds, args.workers, args.cache_dir, args.refresh, args.seed)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(summary, f, indent=2)
+    for cell in summary["cells"]:
+        m = cell["metrics"]["reached_frac"]
+        print(f"[sweep] {cell['settings']}: reached {m['mean']:.3f} +/- {m['std']:.3f}")
+    print(f"[sweep] {len(cells)} cells x {len(seeds)} seeds: {summary['ran']} run, {summary['cached']} cached -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
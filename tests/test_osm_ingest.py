@@ -0,0 +1,40 @@
+# tests/test_osm_ingest.py
+import os
+
+import numpy as np
+import pytest
+
+import geo
+import osm_ingest
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+CENTER = (0.0, 0.0)
+RADIUS_M = 1000.0
+
+
+def _edges(node_ids, cg):
+    return {(node_ids[u], node_ids[v]): float(w) for u, v, w in zip(cg.src, cg.dst, cg.weight)}
+
+
+def test_clipping_oneway_and_missing_ref():
+    node_ids, xy, lonlat, graphs, _ = osm_ingest.load(os.path.join(DATA, "clipped.osm"), CENTER, RADIUS_M)
+    walk = _edges(node_ids, graphs["walk"])
+    drive = _edges(node_ids, graphs["drive"])
+    # 3 only touches the clipped primary, so it is simplified away; 4 is interior
+    assert 3 not in node_ids and 4 not in node_ids and 9 not in node_ids
+    # the footway splits at the missing node 7; 10-11 is a separate component
+    assert 10 not in node_ids and 11 not in node_ids
+    assert set(walk) == {(1, 2), (2, 1), (2, 6), (6, 2), (2, 5), (5, 2), (6, 8), (8, 6)}
+    # one-way street in its direction only; no footway for drive
+    assert set(drive) == {(1, 2), (2, 1), (2, 6), (6, 2), (2, 5)}
+    assert drive[(2, 6)] == pytest.approx(geo.haversine_m(0.001, 0.0, 0.003, 0.0), rel=1e-4)
+    assert drive[(2, 5)] == pytest.approx(
+        geo.haversine_m(0.001, 0.0, 0.001, 0.001) + geo.haversine_m(0.001, 0.001, 0.002, 0.001), rel=1e-4
+    )
+    assert np.isfinite(xy).all() and len(xy) == len(node_ids) == len(lonlat)
+
+
+def test_mode_without_edges():
+    # the only drive way lies outside the radius: no graph, EvacEnv falls back
+    assert osm_ingest.load(os.path.join(DATA, "drive_outside.osm"), CENTER, RADIUS_M) is None
+    assert osm_ingest.load(os.path.join(DATA, "drive_outside.osm")) is not None
@@ -0,0 +1,36 @@
+# tests/test_shared_graph.py
+import os
+import random
+
+import pytest
+
+import config
+from evac_env import EvacEnv
+from shared_graph import SharedGraph, attach
+from simulation import Simulation, spawn_agents
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+AREAS = {
+    # tuple node labels
+    "grid": dict(EVAC_USE_OSM=False, EVAC_GRID_SIZE=12),
+    # integer OSM labels, looked up through the shared sort order
+    "extract": dict(EVAC_OSM_EXTRACT_PATH=os.path.join(DATA, "clipped.osm"), EVAC_OSM_EXTRACT_RADIUS_M=None),
+}
+
+
+@pytest.mark.parametrize("area", sorted(AREAS))
+def test_attached_env_steps_without_networkx_views(area):
+    cfg = config.make_config(
+        EVAC_GRAPH_CACHE=False, EVAC_ENGINE="objects", EVAC_PED_COUNT=6, EVAC_CAR_COUNT=3, **AREAS[area]
+    )
+    random.seed(0)
+    env = EvacEnv(cfg=cfg)
+    with SharedGraph(env) as shared:
+        worker = attach(shared.spec, cfg)
+        peds, cars = spawn_agents(worker)
+        sim = Simulation(worker, peds, cars)
+        for _ in range(10):
+            sim.step()
+        assert worker._nx == {}
+        assert worker._pos is None
+        assert sim.step_idx == 10
@@ -1,39 +1,21 @@
 # transit_stops.py
-import math
+import numpy as np
 import config
-from bus_api import fetch_jsonp, extract_stops
+from bus_api import get_feed_client
+from geo import haversine_m
 
 
-def _haversine_m(a, b, c, d):
-    r = 6371000.0
-    phi1 = math.radians(a)
-    phi2 = math.radians(c)
-    dphi = math.radians(c - a)
-    dl = math.radians(d - b)
-    h = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dl / 2) ** 2
-    return 2 * r * math.asin(math.sqrt(h))
-
-
-def fetch_shuttle_stops(center, radius_m, timeout=10):
-    if not config.EVAC_BUS_API_URL:
+def fetch_shuttle_stops(center, radius_m, timeout=10, cfg=None):
+    cfg = config if cfg is None else cfg
+    if not cfg.EVAC_BUS_API_URL:
         return []
-    try:
-        payload = fetch_jsonp(config.EVAC_BUS_API_URL, timeout=timeout)
-        stops = extract_stops(payload)
-    except Exception:
-        return []
-
+    stops = get_feed_client(cfg.EVAC_BUS_API_URL, timeout=timeout, cfg=cfg).stops()
+    clat, clon = center
+    stops = [s for s in stops if s.get("lat") is not None and s.get("lon") is not None]
     if not stops:
         return []
-
-    clat, clon = center
-    filtered = []
-    for s in stops:
-        lat = s.get("lat")
-        lon = s.get("lon")
-        if lat is None or lon is None:
-            continue
-        if _haversine_m(clat, clon, lat, lon) <= radius_m:
-            filtered.append(s)
-    return filtered
+    lat = np.array([s["lat"] for s in stops], dtype=np.float64)
+    lon = np.array([s["lon"] for s in stops], dtype=np.float64)
+    keep = haversine_m(clat, clon, lat, lon) <= radius_m
+    return [s for s, k in zip(stops, keep.tolist()) if k]
 
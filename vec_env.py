@@ -0,0 +1,301 @@
+# vec_env.py
+import multiprocessing as mp
+import random
+
+import numpy as np
+import config
+from engine import MODES, StepEngine
+from evac_env import EvacEnv
+from shared_graph import SharedGraph, attach
+from simulation import shelter_goals
+
+# per-agent features before the out-edge slots
+_SELF_FEATURES = 10
+# per out-edge slot: exists, believed blocked, snow, slope, cost, goal distance
+_SLOT_FEATURES = 6
+
+
+class ActionEngine(StepEngine):
+    # StepEngine whose agents take their next edge from an action: k picks
+    # the k-th out-edge of the current node, -1 falls back to the planner.
+    # Edges that are truly blocked cannot be entered (the agent waits).
+    def __init__(self, env, starts, goals, modes, speeds):
+        super().__init__(env, starts, goals, modes, speeds)
+        self.actions = np.full(self.n, -1, dtype=np.int64)
+
+    def step(self, actions=None):
+        if actions is not None:
+            self.actions = np.asarray(actions, dtype=np.int64).reshape(self.n)
+        super().step()
+
+    def _at_node(self, i):
+        k = int(self.actions[i])
+        if k < 0:
+            return super()._at_node(i)
+        node = int(self.node[i])
+        if node == self.goal[i]:
+            self.reached[i] = True
+            return
+        mode = MODES[self.mode[i]]
+        self._observe(i, node, mode)
+        cg = self.env.compiled(mode)
+        lo, hi = int(cg.indptr[node]), int(cg.indptr[node + 1])
+        eid = lo + k
+        if eid >= hi or cg.blocked[eid]:
+            self._expose(i, 1.0)
+            return
+        self.paths[i] = [node, int(cg.dst[eid])]
+        self.path_pos[i] = 0
+        self.edge[i] = eid
+        self.edge_len[i] = cg.weight[eid]
+        self.edge_progress[i] = 0.0
+
+
+class _Episode:
+    # one EvacEnv plus the agents of its current episode; shelters is the
+    # (walk, drive) goal pools from simulation.shelter_goals
+    def __init__(self, env, seed, shelters):
+        self.env = env
+        self.shelters = shelters
+        self.rng = np.random.default_rng(seed)
+        self.engine = None
+        self.role = None
+        self.t = 0
+        self.ret = 0.0
+
+    def reset(self):
+        env = self.env
+        env.reset(int(self.rng.integers(2**63 - 1)))
+        rng = self.rng
+        walk = env.compiled("walk").nodes
+        drive = env.compiled("drive").nodes
+        cfg = env.cfg
+        n_ped = cfg.EVAC_PED_COUNT
+        n_car = cfg.EVAC_CAR_COUNT
+        idx = np.concatenate([rng.choice(walk, n_ped), rng.choice(drive, n_car)]).astype(np.int64)
+        starts = [env.node_ids[i] for i in idx.tolist()]
+        modes = ["walk"] * n_ped + ["drive"] * n_car
+        shelters, shelters_drive = self.shelters
+        goals = []
+        for k, mode in enumerate(modes):
+            pool = shelters if mode == "walk" else shelters_drive
+            # ids restart per mode, as in spawn_agents
+            aid = k + 1 if mode == "walk" else k - n_ped + 1
+            goals.append(pool[aid % len(pool)] if pool else None)
+        speeds = [cfg.EVAC_SPEED_WALK if m == "walk" else cfg.EVAC_SPEED_CAR for m in modes]
+        self.engine = ActionEngine(env, starts, goals, modes, speeds)
+        self.role = (rng.random(n_ped + n_car) < cfg.EVAC_FACULTY_RATIO).astype(np.float32)
+        self.t = 0
+        self.ret = 0.0
+
+
+class _Group:
+    # a slice of the K episodes, stepped in this process
+    def __init__(self, seeds, base=None, seed=0, cfg=None):
+        if base is None:
+            # seeded like the Monte Carlo workers so shelters match everywhere
+            random.seed(seed)
+            base = EvacEnv(cfg=cfg)
+        self.base = base
+        # clones share the base's shelter set, so the pools are worked out once
+        pools = shelter_goals(base)
+        self.episodes = [
+            _Episode(base if k == 0 else EvacEnv(source=base, cfg=base.cfg), s, pools) for k, s in enumerate(seeds)
+        ]
+        self.n_agents = base.cfg.EVAC_PED_COUNT + base.cfg.EVAC_CAR_COUNT
+        cgs = [base.compiled(m) for m in MODES]
+        self.slots = max(int(np.diff(cg.indptr).max(initial=0)) for cg in cgs)
+        span = base.xy.max(axis=0) - base.xy.min(axis=0) if len(base.xy) else np.ones(2)
+        self.origin = base.xy.min(axis=0) if len(base.xy) else np.zeros(2)
+        self.scale = float(max(span.max(), 1.0))
+        for ep in self.episodes:
+            ep.reset()
+
+    @property
+    def obs_size(self):
+        return _SELF_FEATURES + _SLOT_FEATURES * self.slots
+
+    def _obs(self, ep):
+        eng = ep.engine
+        env = ep.env
+        n = eng.n
+        obs = np.zeros((n, self.obs_size), dtype=np.float32)
+        xy = (eng.positions() - self.origin) / self.scale
+        goal = np.maximum(eng.goal, 0)
+        gxy = (env.xy[goal] - self.origin) / self.scale
+        on_edge = eng.edge >= 0
+        ratio = np.where(on_edge, eng.edge_progress / np.maximum(eng.edge_len, 1e-9), 0.0)
+        obs[:, 0:2] = xy
+        obs[:, 2:4] = gxy - xy
+        obs[:, 4] = on_edge
+        obs[:, 5] = np.clip(ratio, 0.0, 1.0)
+        obs[:, 6] = eng.mode
+        obs[:, 7] = ep.role
+        obs[:, 8] = eng.exposure / max(1, ep.t)
+        obs[:, 9] = eng.reached
+        d = self.slots
+        for m, mode in enumerate(MODES):
+            sel = np.flatnonzero((eng.mode == m) & ~on_edge)
+            if not len(sel):
+                continue
+            cg = env.compiled(mode)
+            node = eng.node[sel].astype(np.int64)
+            lo = cg.indptr[node]
+            eids = lo[:, None] + np.arange(d)[None, :]
+            ok = eids < cg.indptr[node + 1][:, None]
+            e = np.where(ok, eids, 0)
+            believed = np.zeros(e.shape, dtype=bool)
+            for r, i in enumerate(sel.tolist()):
+                b = eng.beliefs[i]
+                if b:
+                    believed[r] = [x in b for x in e[r].tolist()]
+            dst = cg.dst[e]
+            to_goal = np.hypot(*(env.xy[dst] - env.xy[goal[sel]][:, None, :]).transpose(2, 0, 1)) / self.scale
+            slot = np.stack(
+                [ok, believed & ok, cg.snow[e], cg.slope[e], cg.cost[e] / self.scale, to_goal], axis=-1
+            ) * ok[..., None]
+            obs[sel, _SELF_FEATURES:] = slot.reshape(len(sel), -1)
+        return obs
+
+    def reset(self, ids=None):
+        ids = range(len(self.episodes)) if ids is None else ids
+        for k in ids:
+            self.episodes[k].reset()
+        return np.stack([self._obs(ep) for ep in self.episodes])
+
+    def step(self, actions):
+        k_envs = len(self.episodes)
+        obs = np.zeros((k_envs, self.n_agents, self.obs_size), dtype=np.float32)
+        rewards = np.zeros((k_envs, self.n_agents), dtype=np.float32)
+        dones = np.zeros((k_envs, self.n_agents), dtype=bool)
+        infos = [{} for _ in range(k_envs)]
+        for k, ep in enumerate(self.episodes):
+            eng = ep.engine
+            exposure = eng.exposure.copy()
+            reached = eng.reached.copy()
+            ep.env.begin_step(ep.t)
+            eng.step(actions[k])
+            ep.t += 1
+            arrived = eng.reached & ~reached
+            cfg = ep.env.cfg
+            r = (
+                -cfg.EVAC_RL_EXPOSURE_WEIGHT * (eng.exposure - exposure)
+                + cfg.EVAC_RL_ARRIVAL_REWARD * arrived
+                - cfg.EVAC_RL_STEP_PENALTY * ~reached
+            )
+            rewards[k] = r
+            ep.ret += float(r.sum())
+            done = eng.reached | (eng.goal < 0) | ~eng.alive
+            if ep.t >= cfg.EVAC_STEP_LIMIT:
+                done[:] = True
+            dones[k] = done
+            obs[k] = self._obs(ep)
+            if done.all():
+                # auto-reset; the final observation is kept in the info
+                infos[k] = {
+                    "terminal_obs": obs[k].copy(),
+                    "episode": {
+                        "return": ep.ret,
+                        "steps": ep.t,
+                        "reached_frac": float(eng.reached.mean()) if eng.n else 0.0,
+                        "avg_exposure": float(eng.exposure.mean()) if eng.n else 0.0,
+                    },
+                }
+                ep.reset()
+                obs[k] = self._obs(ep)
+        return obs, rewards, dones, infos
+
+
+def _worker(conn, seeds, spec=None, seed=0, cfg=None):
+    group = _Group(seeds, None if spec is None else attach(spec, cfg), seed, cfg)
+    conn.send((group.obs_size, group.slots))
+    while True:
+        cmd, arg = conn.recv()
+        if cmd == "reset":
+            conn.send(group.reset(arg))
+        elif cmd == "step":
+            conn.send(group.step(arg))
+        else:
+            break
+    conn.close()
+
+
+class VecEvacEnv:
+    # K independent evacuation episodes stepped in lockstep.
+    #   obs:     (K, N, obs_size) float32, N = EVAC_PED_COUNT + EVAC_CAR_COUNT
+    #   actions: (K, N) int, k-th out-edge of the current node, -1 = planner
+    #   rewards: (K, N) float32; dones: (K, N) bool
+    # Finished episodes reset in place (graph kept) and report an "episode"
+    # summary plus "terminal_obs" in their info dict. With workers > 0 the
+    # episodes are split across that many processes. cfg: settings object
+    # (config.make_config), passed on to the workers; defaults to the live
+    # config module.
+    def __init__(self, num_envs, seed=0, workers=0, cfg=None):
+        self.num_envs = num_envs
+        self.cfg = config if cfg is None else cfg
+        self.n_agents = self.cfg.EVAC_PED_COUNT + self.cfg.EVAC_CAR_COUNT
+        seeds = [[seed, k] for k in range(num_envs)]
+        self._group = None
+        self._pipes = []
+        self._procs = []
+        self._splits = []
+        self._shared = None
+        if workers and workers > 0:
+            ctx = mp.get_context()
+            # workers attach to one published copy of the static graph
+            if self.cfg.EVAC_SHARED_GRAPH:
+                random.seed(seed)
+                self._shared = SharedGraph(EvacEnv(cfg=cfg))
+            spec = None if self._shared is None else self._shared.spec
+            chunks = [c for c in np.array_split(np.arange(num_envs), min(workers, num_envs)) if len(c)]
+            for chunk in chunks:
+                parent, child = ctx.Pipe()
+                proc = ctx.Process(
+                    target=_worker, args=(child, [seeds[k] for k in chunk.tolist()], spec, seed, cfg), daemon=True
+                )
+                proc.start()
+                child.close()
+                self._pipes.append(parent)
+                self._procs.append(proc)
+                self._splits.append(chunk)
+            self.obs_size, self.slots = [p.recv() for p in self._pipes][0]
+        else:
+            self._group = _Group(seeds, seed=seed, cfg=cfg)
+            self.obs_size = self._group.obs_size
+            self.slots = self._group.slots
+
+    def reset(self, ids=None):
+        # reset all episodes, or only those in ids; returns all observations
+        if self._group is not None:
+            return self._group.reset(ids)
+        for pipe, chunk in zip(self._pipes, self._splits):
+            local = None if ids is None else [int(np.flatnonzero(chunk == k)[0]) for k in ids if k in chunk]
+            pipe.send(("reset", local))
+        return np.concatenate([p.recv() for p in self._pipes])
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs, self.n_agents)
+        if self._group is not None:
+            return self._group.step(actions)
+        for pipe, chunk in zip(self._pipes, self._splits):
+            pipe.send(("step", actions[chunk]))
+        parts = [p.recv() for p in self._pipes]
+        obs = np.concatenate([p[0] for p in parts])
+        rewards = np.concatenate([p[1] for p in parts])
+        dones = np.concatenate([p[2] for p in parts])
+        infos = [info for p in parts for info in p[3]]
+        return obs, rewards, dones, infos
+
+    def close(self):
+        for pipe in self._pipes:
+            try:
+                pipe.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+        self._pipes = []
+        self._procs = []
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None